@@ -1,11 +1,19 @@
+import hmac
 import os
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required
 
-from init_db import get_db_connection, init_db
-from models.user import User
+from cache import make_etag, not_modified, with_etag
+from init_db import get_pool, init_db, init_app as init_db_pool
+from instrumentation import instrumentation
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_TOKEN, metrics
+from models.battle_log import battle_log
+from models.catalog import catalog
+from models.leaderboard import leaderboard_cache
+from models.user import User, user_cache
+from profiler import collapsed, profiler
 from routes.auth_routes import auth_bp
 from routes.character_routes import character_bp
 from routes.game_routes import game_bp
@@ -31,6 +39,10 @@ app.config["JWT_TOKEN_LOCATION"] = ["headers", "cookies"]  # Accepter le token d
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+init_db_pool(app)  # Une connexion SQLite poolée par requête
+instrumentation.init_app(app)  # Server-Timing, durée SQL par requête
+metrics.init_app(app)  # Compteurs exposés sur /api/v1/metrics
+profiler.init_app(app)  # Profilage à la demande (en-tête X-Profile) et échantillonnage permanent
 
 
 # Enregistrer les blueprints
@@ -50,40 +62,141 @@ def home():
     })
 
 # Documentation simplifiée de l'API
+API_ENDPOINTS = [
+    {"path": "/api/v1/auth/register/", "method": "POST", "description": "Inscription d'un nouvel utilisateur"},
+    {"path": "/api/v1/auth/login/", "method": "POST", "description": "Connexion et obtention du token JWT"},
+    {"path": "/api/v1/auth/user/", "method": "GET", "description": "Obtenir les informations de l'utilisateur connecté"},
+    {"path": "/api/v1/characters/", "method": "GET", "description": "Liste des personnages de l'utilisateur (?expand=items,experience)"},
+    {"path": "/api/v1/characters/", "method": "POST", "description": "Création d'un nouveau personnage"},
+    {"path": "/api/v1/characters/{id}/", "method": "GET", "description": "Détails d'un personnage"},
+    {"path": "/api/v1/characters/{id}/select/", "method": "POST", "description": "Sélectionner un personnage actif"},
+    {"path": "/api/v1/inventory/", "method": "GET", "description": "Liste paginée des objets du personnage actif (sort_by, order, type, consumable, source, limit, cursor)"},
+    {"path": "/api/v1/inventory/", "method": "POST", "description": "Ajouter un nouvel objet"},
+    {"path": "/api/v1/inventory/{id}/", "method": "GET", "description": "Détails d'un objet"},
+    {"path": "/api/v1/inventory/{id}/", "method": "PUT", "description": "Modifier un objet"},
+    {"path": "/api/v1/inventory/{id}/", "method": "DELETE", "description": "Supprimer un objet"},
+    {"path": "/api/v1/inventory/{id}/consume/", "method": "POST", "description": "Consommer un objet"},
+    {"path": "/api/v1/inventory/batch/", "method": "POST", "description": "Appliquer un lot d'opérations (add, update, delete, consume) en une transaction"},
+    {"path": "/api/v1/inventory/types/", "method": "GET", "description": "Liste des types d'objets"},
+    {"path": "/api/v1/game/versus/", "method": "GET", "description": "Mode Versus - Liste des personnages disponibles"},
+    {"path": "/api/v1/game/versus/fight/", "method": "POST", "description": "Mode Versus - Simuler un combat"},
+    {"path": "/api/v1/game/versus/simulate/", "method": "POST", "description": "Mode Versus - Estimer les chances de victoire (Monte-Carlo)"},
+    {"path": "/api/v1/game/quests/", "method": "GET", "description": "Mode Quête - Liste des quêtes disponibles"},
+    {"path": "/api/v1/game/quests/{id}/", "method": "POST", "description": "Mode Quête - Démarrer une quête"},
+    {"path": "/api/v1/game/history/", "method": "GET", "description": "Historique des combats (kind=versus|quest, limit, before, rounds=full)"},
+    {"path": "/api/v1/game/versus/history/", "method": "GET", "description": "Historique des combats Versus (limit, before, rounds=full)"},
+    {"path": "/api/v1/game/leaderboard/", "method": "GET", "description": "Classement des personnages (sort=wins|win_rate|level, limit)"},
+    {"path": "/api/v1/game/board/", "method": "GET", "description": "Mode Plateau - Initialiser un nouveau jeu"},
+    {"path": "/api/v1/game/board/{session_id}/play/", "method": "POST", "description": "Mode Plateau - Jouer un tour"},
+    {"path": "/api/v1/game/board/{session_id}/", "method": "GET", "description": "Mode Plateau - Statut d'une session"},
+    {"path": "/api/v1/stats/", "method": "GET", "description": "Compteurs du pool de connexions, des caches et de l'historique des combats"},
+    {"path": "/api/v1/debug/timing/", "method": "GET", "description": "Durées par route (histogrammes glissants), nombre et durée des requêtes SQL"},
+    {"path": "/api/v1/debug/profiles/", "method": "GET", "description": "Profils des requêtes envoyées avec l'en-tête X-Profile (cprofile ou sample)"},
+    {"path": "/api/v1/debug/profiles/{profile_id}", "method": "GET", "description": "Contenu d'un profil (pstats ou piles agrégées)"},
+    {"path": "/api/v1/debug/flamegraph/", "method": "GET", "description": "Piles agrégées de l'échantillonneur permanent (format flamegraph)"},
+    {"path": "/api/v1/metrics", "method": "GET", "description": "Métriques au format Prometheus (requêtes, base, caches, combats, bcrypt)"},
+]
+
+API_DOCS = {
+    "title": "API RPG Documentation",
+    "version": "1.0.0",
+    "base_url": "/api/v1",
+    "auth": "JWT (Bearer Token)",
+    "endpoints": API_ENDPOINTS
+}
+API_DOCS_ETAG = make_etag(API_DOCS)
+
 @app.route('/api/v1/docs/')
 def api_docs():
-    endpoints = [
-        {"path": "/api/v1/auth/register/", "method": "POST", "description": "Inscription d'un nouvel utilisateur"},
-        {"path": "/api/v1/auth/login/", "method": "POST", "description": "Connexion et obtention du token JWT"},
-        {"path": "/api/v1/auth/user/", "method": "GET", "description": "Obtenir les informations de l'utilisateur connecté"},
-        {"path": "/api/v1/characters/", "method": "GET", "description": "Liste des personnages de l'utilisateur"},
-        {"path": "/api/v1/characters/", "method": "POST", "description": "Création d'un nouveau personnage"},
-        {"path": "/api/v1/characters/{id}/", "method": "GET", "description": "Détails d'un personnage"},
-        {"path": "/api/v1/characters/{id}/select/", "method": "POST", "description": "Sélectionner un personnage actif"},
-        {"path": "/api/v1/inventory/", "method": "GET", "description": "Liste des objets du personnage actif"},
-        {"path": "/api/v1/inventory/", "method": "POST", "description": "Ajouter un nouvel objet"},
-        {"path": "/api/v1/inventory/{id}/", "method": "GET", "description": "Détails d'un objet"},
-        {"path": "/api/v1/inventory/{id}/", "method": "PUT", "description": "Modifier un objet"},
-        {"path": "/api/v1/inventory/{id}/", "method": "DELETE", "description": "Supprimer un objet"},
-        {"path": "/api/v1/inventory/{id}/consume/", "method": "POST", "description": "Consommer un objet"},
-        {"path": "/api/v1/inventory/types/", "method": "GET", "description": "Liste des types d'objets"},
-        {"path": "/api/v1/game/versus/", "method": "GET", "description": "Mode Versus - Liste des personnages disponibles"},
-        {"path": "/api/v1/game/versus/fight/", "method": "POST", "description": "Mode Versus - Simuler un combat"},
-        {"path": "/api/v1/game/quests/", "method": "GET", "description": "Mode Quête - Liste des quêtes disponibles"},
-        {"path": "/api/v1/game/quests/{id}/", "method": "POST", "description": "Mode Quête - Démarrer une quête"},
-        {"path": "/api/v1/game/board/", "method": "GET", "description": "Mode Plateau - Initialiser un nouveau jeu"},
-        {"path": "/api/v1/game/board/{session_id}/play/", "method": "POST", "description": "Mode Plateau - Jouer un tour"},
-        {"path": "/api/v1/game/board/{session_id}/", "method": "GET", "description": "Mode Plateau - Statut d'une session"},
-    ]
-    
+    cached = not_modified(API_DOCS_ETAG)
+    if cached:
+        return cached
+    return with_etag(jsonify(API_DOCS), API_DOCS_ETAG)
+
+# Compteurs internes (pool de connexions, cache utilisateurs)
+@app.route('/api/v1/stats/')
+@jwt_required()
+def api_stats():
     return jsonify({
-        "title": "API RPG Documentation",
-        "version": "1.0.0",
-        "base_url": "/api/v1",
-        "auth": "JWT (Bearer Token)",
-        "endpoints": endpoints
+        "db_pool": get_pool().stats(),
+        "user_cache": user_cache.stats(),
+        "catalog": catalog.stats(),
+        "leaderboard_cache": leaderboard_cache.stats(),
+        "battle_log": battle_log.stats()
     })
 
+# Histogrammes glissants des durées et instructions SQL les plus lentes, par route
+# (mêmes droits que le profilage : revendication PROFILER_CLAIM ou PROFILER_TOKEN)
+@app.route('/api/v1/debug/timing/')
+def api_timing():
+    if not profiler.authorized():
+        return jsonify({"error": "Accès au profilage refusé"}), 403
+    return jsonify(instrumentation.snapshot())
+
+# Profils à la demande : réservés aux jetons portant la revendication PROFILER_CLAIM ou à PROFILER_TOKEN
+@app.route('/api/v1/debug/profiles/')
+def api_profiles():
+    if not profiler.authorized():
+        return jsonify({"error": "Accès au profilage refusé"}), 403
+    return jsonify({"stats": profiler.stats(), "profiles": profiler.list()})
+
+@app.route('/api/v1/debug/profiles/<int:profile_id>')
+def api_profile(profile_id):
+    if not profiler.authorized():
+        return jsonify({"error": "Accès au profilage refusé"}), 403
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profil introuvable"}), 404
+    return app.response_class(profile["output"], mimetype='text/plain')
+
+# Piles agrégées de l'échantillonneur permanent, à passer à flamegraph.pl ou speedscope
+@app.route('/api/v1/debug/flamegraph/')
+def api_flamegraph():
+    if not profiler.authorized():
+        return jsonify({"error": "Accès au profilage refusé"}), 403
+    since = request.args.get('since', type=float)
+    return app.response_class(collapsed(profiler.rolling.aggregate(since)), mimetype='text/plain')
+
+# Compteurs internes exportés à chaque lecture des métriques (valeurs du processus)
+metrics.define('rpg_db_pool_connections_opened_total', 'counter', 'Connexions SQLite ouvertes par le pool')
+metrics.define('rpg_db_pool_connections_reused_total', 'counter', 'Connexions SQLite réutilisées depuis le pool')
+metrics.define('rpg_db_pool_connections_discarded_total', 'counter', 'Connexions fermées, pool plein')
+metrics.define('rpg_db_pool_idle_connections', 'gauge', 'Connexions inactives dans le pool')
+metrics.define('rpg_cache_hits_total', 'counter', 'Lectures servies par un cache', ('cache',))
+metrics.define('rpg_cache_misses_total', 'counter', "Lectures absentes d'un cache", ('cache',))
+metrics.define('rpg_cache_evictions_total', 'counter', "Entrées évincées d'un cache", ('cache',))
+metrics.define('rpg_battle_log_records_total', 'counter', "Enregistrements de l'historique des combats",
+               ('outcome',))
+metrics.define('rpg_battle_log_queued', 'gauge', "Enregistrements en attente d'écriture")
+
+
+def internal_counters():
+    pool = get_pool().stats()
+    yield 'rpg_db_pool_connections_opened_total', (), pool["misses"]
+    yield 'rpg_db_pool_connections_reused_total', (), pool["hits"]
+    yield 'rpg_db_pool_connections_discarded_total', (), pool["discarded"]
+    yield 'rpg_db_pool_idle_connections', (), pool["idle"]
+    for name, cache in (('user', user_cache), ('leaderboard', leaderboard_cache)):
+        stats = cache.stats()
+        yield 'rpg_cache_hits_total', (name,), stats["hits"]
+        yield 'rpg_cache_misses_total', (name,), stats["misses"]
+        yield 'rpg_cache_evictions_total', (name,), stats["evictions"]
+    log_stats = battle_log.stats()
+    for outcome in ('written', 'dropped', 'failed'):
+        yield 'rpg_battle_log_records_total', (outcome,), log_stats[outcome]
+    yield 'rpg_battle_log_queued', (), log_stats["queued"]
+
+
+metrics.register_collector(internal_counters)
+
+# Exposition au format texte Prometheus (tous les processus si METRICS_MULTIPROC_DIR est défini)
+@app.route('/api/v1/metrics')
+def api_metrics():
+    authorization = request.headers.get('Authorization', '').encode()
+    if METRICS_TOKEN and not hmac.compare_digest(authorization, f'Bearer {METRICS_TOKEN}'.encode()):
+        return jsonify({"error": "Jeton de métriques invalide"}), 401
+    return app.response_class(metrics.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
 # Gestion globale des erreurs
 @app.errorhandler(404)
 def not_found(error):
@@ -95,22 +208,13 @@ def server_error(error):
 
 # Fonction pour obtenir l'utilisateur courant
 def get_current_user():
-    user_id = get_jwt_identity()
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM user WHERE user_id = ?', (user_id,))
-    user_data = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    # Mémo par requête, puis cache TTL/LRU partagé par le processus
+    if 'current_user' in g:
+        return g.current_user
     
-    if user_data:
-        return User(
-            user_data['user_id'], 
-            user_data['user_login'], 
-            user_data['user_mail'],
-            user_data['active_character_id']
-        )
-    return None
+    user = User.get_cached(get_jwt_identity())
+    g.current_user = user
+    return user
 
 # Exporter cette fonction pour les autres modules
 app.get_current_user = get_current_user
@@ -119,6 +223,9 @@ app.get_current_user = get_current_user
 with app.app_context():
     init_db()
     print("Base de données initialisée")
+    # Catalogue (types d'objets, quêtes) chargé une fois au démarrage
+    catalog.load()
+    catalog.install_reload_signal()
     
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,371 @@
+"""
+Banc de charge de l'API.
+
+Une base SQLite temporaire est créée par init_db puis peuplée (utilisateurs,
+personnages, inventaires) ; des utilisateurs virtuels jouent ensuite un
+mélange pondéré de scénarios via le client de test Flask ou, avec --server,
+via un serveur WSGI local. Le rapport JSON donne le débit et les latences
+p50/p95/p99 par scénario.
+
+Utilisation :
+    python -m benchmarks.load --users 20 --requests 2000 --output charge.json
+    python -m benchmarks.load --server --concurrency 8 --compare charge.json
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.report import compare_reports, environment, latency_summary, write_report
+
+BENCH_PASSWORD = 'benchmark'
+
+# Poids par défaut des scénarios (proportion des requêtes jouées)
+DEFAULT_MIX = {
+    'login': 1,
+    'characters.list': 10,
+    'characters.get': 10,
+    'inventory.list': 15,
+    'inventory.add': 8,
+    'inventory.update': 5,
+    'inventory.delete': 4,
+    'versus.fight': 8,
+    'quest': 5,
+    'board.play': 8,
+}
+
+# Objets de départ de chaque personnage : (nom, type_id, quantité)
+STARTING_ITEMS = [
+    ('Potion de soins', 1, 3),
+    ('Herbe médicinale', 2, 5),
+    ('Épée courte', 3, 1),
+    ('Clé rouillée', 4, 1),
+    ('Armure de cuir', 5, 1),
+]
+
+
+def load_app(database_path, bcrypt_rounds=None):
+    """Importe l'application sur une base dédiée (init_db est exécuté à l'import)"""
+    os.environ['DATABASE_PATH'] = database_path
+    import init_db
+    init_db.DATABASE_PATH = database_path
+    # Les messages d'initialisation ne doivent pas se mêler au rapport JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import app
+    if bcrypt_rounds:
+        from routes.auth_routes import bcrypt
+        app.config['BCRYPT_LOG_ROUNDS'] = bcrypt_rounds
+        bcrypt.init_app(app)
+    return app
+
+
+def seed_database(app, users, characters_per_user, items_per_character):
+    """
+    Crée les comptes, personnages et inventaires du banc en une transaction
+    :return: Liste de dictionnaires (email, character_ids) par utilisateur
+    """
+    from init_db import run_write_transaction
+    from models.game import Mage, Race, Warrior
+    from models.inventory import InventoryService
+    from routes.auth_routes import bcrypt
+
+    with app.app_context():
+        # Un seul hachage bcrypt pour tous les comptes : le peuplement reste rapide
+        password_hash = bcrypt.generate_password_hash(BENCH_PASSWORD).decode('utf-8')
+        races = list(Race)
+
+        def insert_accounts(cursor):
+            accounts = []
+            for index in range(users):
+                email = f'bench{index}@example.com'
+                cursor.execute(
+                    'INSERT INTO user (user_login, user_password, user_mail) VALUES (?, ?, ?)',
+                    (f'bench{index}', password_hash, email)
+                )
+                user_id = cursor.lastrowid
+                character_ids = []
+                for number in range(characters_per_user):
+                    character_class = Warrior if number % 2 == 0 else Mage
+                    character = character_class(name=f'Bench {index}-{number}', race=races[number % len(races)])
+                    cursor.execute('''
+                        INSERT INTO characters (name, race, class, health, attack, defense, user_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (character.name, character.race.name, character.type,
+                          character.health, character.attack, character.defense, user_id))
+                    character_ids.append(cursor.lastrowid)
+                    InventoryService.grant_many(cursor.lastrowid, STARTING_ITEMS[:items_per_character], cursor=cursor)
+                cursor.execute('UPDATE user SET active_character_id = ? WHERE user_id = ?',
+                               (character_ids[0] if character_ids else None, user_id))
+                accounts.append({"email": email, "character_ids": character_ids})
+            return accounts
+
+        return run_write_transaction(insert_accounts)
+
+
+class TestClientTransport:
+    """Requêtes jouées en processus par le client de test Flask"""
+
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """Requêtes HTTP vers un serveur WSGI local (werkzeug, un thread par requête)"""
+
+    name = 'server'
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        from werkzeug.serving import make_server
+        # Le journal des requêtes du serveur fausserait les mesures
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server(host, port, app, threaded=True)
+        self.host, self.port = host, self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, name='bench-server', daemon=True)
+        self._thread.start()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class VirtualUser:
+    """Compte du banc : jeton, personnages et objets créés pendant la mesure"""
+
+    def __init__(self, email, character_ids):
+        self.email = email
+        self.character_ids = character_ids
+        self.token = None
+        self.item_ids = []
+        self.counter = 0
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def login(self, transport):
+        status, body = transport.request('POST', '/api/v1/auth/login/',
+                                         {'email': self.email, 'password': BENCH_PASSWORD})
+        if status == 200:
+            self.token = json.loads(body)['token']
+        return status
+
+    def play(self, scenario, transport, rng):
+        """
+        Joue un scénario
+        :return: Couple (nom du scénario effectivement joué, code HTTP)
+        """
+        if scenario == 'login':
+            return scenario, self.login(transport)
+
+        # Sans objet créé, modification et suppression deviennent des ajouts
+        if scenario in ('inventory.update', 'inventory.delete') and not self.item_ids:
+            scenario = 'inventory.add'
+
+        if scenario == 'characters.list':
+            status, _ = transport.request('GET', '/api/v1/characters/', headers=self.headers)
+        elif scenario == 'characters.get':
+            character_id = rng.choice(self.character_ids)
+            status, _ = transport.request('GET', f'/api/v1/characters/{character_id}/', headers=self.headers)
+        elif scenario == 'inventory.list':
+            status, _ = transport.request('GET', '/api/v1/inventory/', headers=self.headers)
+        elif scenario == 'inventory.add':
+            self.counter += 1
+            status, body = transport.request('POST', '/api/v1/inventory/', {
+                'name': f'Objet {self.counter}', 'type_id': rng.randint(1, 5), 'quantity': rng.randint(1, 3)
+            }, headers=self.headers)
+            if status == 201:
+                self.item_ids.append(json.loads(body)['item']['id'])
+        elif scenario == 'inventory.update':
+            self.counter += 1
+            status, _ = transport.request('PUT', f'/api/v1/inventory/{rng.choice(self.item_ids)}/', {
+                'name': f'Objet {self.counter}', 'type_id': rng.randint(1, 5), 'quantity': rng.randint(1, 5)
+            }, headers=self.headers)
+        elif scenario == 'inventory.delete':
+            item_id = self.item_ids.pop(rng.randrange(len(self.item_ids)))
+            status, _ = transport.request('DELETE', f'/api/v1/inventory/{item_id}/', headers=self.headers)
+        elif scenario == 'versus.fight':
+            player1, player2 = rng.sample(self.character_ids, 2)
+            status, _ = transport.request('POST', '/api/v1/game/versus/fight/',
+                                          {'player1': player1, 'player2': player2}, headers=self.headers)
+        elif scenario == 'quest':
+            status, _ = transport.request('POST', f'/api/v1/game/quests/{rng.randint(1, 2)}/',
+                                          headers=self.headers)
+        elif scenario == 'board.play':
+            status, _ = transport.request('POST', '/api/v1/game/board/play/', headers=self.headers)
+        else:
+            raise ValueError(f"Scénario inconnu : {scenario}")
+        return scenario, status
+
+
+def parse_mix(spec):
+    """Convertit "nom=poids,nom=poids" en dictionnaire, à partir du mélange par défaut"""
+    mix = dict(DEFAULT_MIX)
+    if not spec:
+        return mix
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Scénario inconnu : {name}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def run_load(transport, accounts, requests, concurrency, mix, seed, warmup=0):
+    """
+    Répartit les requêtes entre concurrency threads, chacun servant ses propres comptes
+    :return: Couple (mesures par scénario, durée totale)
+    """
+    users = [VirtualUser(account['email'], account['character_ids']) for account in accounts]
+    for user in users:
+        user.login(transport)
+    # Le combat Versus demande deux personnages
+    if any(len(user.character_ids) < 2 for user in users):
+        mix.pop('versus.fight', None)
+
+    names, weights = list(mix), list(mix.values())
+    samples = {}
+    samples_lock = threading.Lock()
+
+    def worker(index, count):
+        rng = random.Random(seed + index)
+        own_users = users[index::concurrency] or users
+        local = {}
+        for number in range(warmup + count):
+            user = own_users[number % len(own_users)]
+            scenario = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            scenario, status = user.play(scenario, transport, rng)
+            duration = time.perf_counter() - started
+            if number >= warmup:
+                durations, errors = local.setdefault(scenario, ([], [0]))
+                durations.append(duration)
+                if status >= 400:
+                    errors[0] += 1
+        with samples_lock:
+            for scenario, (durations, errors) in local.items():
+                merged = samples.setdefault(scenario, ([], [0]))
+                merged[0].extend(durations)
+                merged[1][0] += errors[0]
+
+    shares = [requests // concurrency + (1 if index < requests % concurrency else 0) for index in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(index, share), name=f'bench-{index}')
+               for index, share in enumerate(shares)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def build_report(samples, elapsed, options, transport):
+    endpoints = {
+        scenario: latency_summary(durations, errors[0], elapsed)
+        for scenario, (durations, errors) in sorted(samples.items())
+    }
+    all_durations = [duration for durations, _ in samples.values() for duration in durations]
+    total = latency_summary(all_durations, sum(errors[0] for _, errors in samples.values()), elapsed)
+    total["duration_s"] = round(elapsed, 3)
+    return {
+        "benchmark": "load",
+        "environment": environment(),
+        "options": {**options, "transport": transport.name},
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API")
+    parser.add_argument('--users', type=int, default=20, help="Nombre de comptes créés")
+    parser.add_argument('--characters', type=int, default=2, help="Personnages par compte")
+    parser.add_argument('--items', type=int, default=len(STARTING_ITEMS), help="Objets de départ par personnage")
+    parser.add_argument('--requests', type=int, default=2000, help="Nombre de requêtes mesurées")
+    parser.add_argument('--warmup', type=int, default=0, help="Requêtes non mesurées par thread")
+    parser.add_argument('--concurrency', type=int, default=1, help="Nombre de threads clients")
+    parser.add_argument('--mix', help="Poids des scénarios, ex. \"quest=0,inventory.list=30\"")
+    parser.add_argument('--seed', type=int, default=0, help="Graine du choix des scénarios")
+    parser.add_argument('--server', action='store_true', help="Passer par un serveur WSGI local")
+    parser.add_argument('--bcrypt-rounds', type=int, help="Coût bcrypt (celui de l'application par défaut)")
+    parser.add_argument('--output', help="Fichier du rapport JSON (sortie standard sinon)")
+    parser.add_argument('--compare', help="Rapport de référence : signale les régressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Variation tolérée par --compare")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory(prefix='rpg-bench-') as directory:
+        app = load_app(os.path.join(directory, 'bench.db'), args.bcrypt_rounds)
+        accounts = seed_database(app, args.users, args.characters, args.items)
+        transport = ServerTransport(app) if args.server else TestClientTransport(app)
+        try:
+            samples, elapsed = run_load(transport, accounts, args.requests, max(args.concurrency, 1),
+                                        mix, args.seed, args.warmup)
+        finally:
+            transport.close()
+            # Écritures différées terminées avant la suppression de la base
+            from init_db import get_pool
+            from models.battle_log import battle_log
+            from models.board import board_sessions
+            battle_log.stop()
+            board_sessions.flush_all()
+            get_pool().close_all()
+
+    options = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    options["mix"] = mix
+    report = build_report(samples, elapsed, options, transport)
+    write_report(report, args.output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = (
+            compare_reports(baseline, report, 'endpoints', 'p95_ms', args.threshold)
+            + compare_reports(baseline, report, 'endpoints', 'throughput_rps', args.threshold,
+                              higher_is_better=True)
+        )
+        for name, reference, value, change in regressions:
+            print(f"Régression {name} : {reference} -> {value} ({change:+.1%})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Micro-bancs des moteurs de jeu (sans base de données ni HTTP).
+
+Chaque cas est joué avec une graine fixe sur plusieurs profils de
+statistiques, y compris des combats où personne ne peut blesser l'autre.
+Les résultats sont comparés à une référence enregistrée : une médiane
+plus lente que la référence au-delà du seuil est une régression.
+
+Utilisation :
+    python -m benchmarks.micro                      # compare à la référence
+    python -m benchmarks.micro --save-baseline      # enregistre la référence
+    python -m benchmarks.micro --filter fight --threshold 0.1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.report import compare_reports, environment, write_report
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'micro_baseline.json')
+BENCH_SEED = 1234
+
+
+class Fighter:
+    """Combattant minimal : les moteurs ne lisent que ces attributs"""
+    __slots__ = ('id', 'name', 'health', 'attack', 'defense')
+
+    def __init__(self, id, name, health, attack, defense=0):
+        self.id = id
+        self.name = name
+        self.health = health
+        self.attack = attack
+        self.defense = defense
+
+
+# Profils (santé, attaque, défense) des deux adversaires
+PROFILES = {
+    # Combat équilibré de quelques tours
+    'balanced': ((100, 15, 10), (100, 15, 10)),
+    # Un adversaire bien plus fort : fin au premier tour
+    'lopsided': ((200, 40, 20), (50, 5, 2)),
+    # Beaucoup de PV, peu de dégâts : le combat va jusqu'à la limite de tours
+    'long': ((1000, 12, 10), (1000, 12, 10)),
+    # Défense supérieure à l'attaque : aucun dégât de part et d'autre
+    'zero_damage': ((100, 1, 40), (100, 5, 40)),
+}
+
+
+def fighters(profile):
+    (health1, attack1, defense1), (health2, attack2, defense2) = PROFILES[profile]
+    return (Fighter(1, 'Héros', health1, attack1, defense1),
+            Fighter(2, 'Adversaire', health2, attack2, defense2))
+
+
+def bench_tableau_class():
+    """Tableau dont les effets en base (inventaire, santé) sont désactivés"""
+    from models.game import Tableau
+
+    class BenchTableau(Tableau):
+        def _add_item_to_inventory(self, item):
+            pass
+
+        def _update_hero_health(self):
+            pass
+
+    return BenchTableau
+
+
+def build_cases():
+    """
+    Cas mesurés : nom -> fonction sans argument
+    Les générateurs aléatoires sont créés avec une graine fixe, hors de la mesure.
+    """
+    from models.battle import fight_hero_vs_monster, fight_logic
+    from models.game import Monster
+    from models.game_utils import CombatManager, GameEventManager, RewardManager
+    from models.rng import make_rng
+
+    cases = {}
+    for profile in PROFILES:
+        player1, player2 = fighters(profile)
+        monster = Monster(player2.name, player2.health, player2.attack)
+        cases[f'fight_logic[{profile}]'] = lambda p1=player1, p2=player2: fight_logic(p1, p2, seed=BENCH_SEED)
+        cases[f'fight_hero_vs_monster[{profile}]'] = lambda hero=player1, m=monster: fight_hero_vs_monster(hero, m)
+        # Détail des tours reconstruit à la demande (réponses ?rounds=full)
+        cases[f'quest_rounds[{profile}]'] = lambda hero=player1, m=monster: list(
+            fight_hero_vs_monster(hero, m).iter_rounds())
+        rng = make_rng(BENCH_SEED)
+        cases[f'calculate_damage[{profile}]'] = lambda p1=player1, p2=player2, rng=rng: \
+            CombatManager.calculate_damage(p1, p2, rng=rng)
+
+    BenchTableau = bench_tableau_class()
+    hero_stats = PROFILES['balanced'][0]
+    cases['tableau.generate_board'] = lambda: BenchTableau(Fighter(1, 'Héros', *hero_stats), seed=BENCH_SEED)
+
+    def full_board_game():
+        tableau = BenchTableau(Fighter(1, 'Héros', *hero_stats), seed=BENCH_SEED)
+        while not (tableau.is_completed or tableau.is_game_over):
+            tableau.play_turn()
+        return tableau
+
+    cases['tableau.play_game'] = full_board_game
+
+    rng = make_rng(BENCH_SEED)
+    for level in (1, 10):
+        cases[f'generate_random_item[level={level}]'] = lambda level=level, rng=rng: \
+            RewardManager.generate_random_item(level=level, rng=rng)
+
+    character = Fighter(1, 'Héros', *hero_stats)
+    for event_type in (None, 'combat', 'treasure', 'trap', 'merchant', 'rest'):
+        cases[f'generate_random_event[{event_type or "random"}]'] = lambda event_type=event_type, rng=rng: \
+            GameEventManager.generate_random_event(character, event_type=event_type, difficulty=3, rng=rng)
+    return cases
+
+
+def measure(function, min_time=0.05, repeat=5):
+    """
+    Chronomètre une fonction à la manière de timeit
+    :param min_time: Durée minimale d'une série (le nombre d'appels est calibré)
+    :param repeat: Nombre de séries
+    :return: Statistiques par appel, en microsecondes
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        timings.append((time.perf_counter() - started) / loops)
+
+    return {
+        "loops": loops,
+        "rounds": repeat,
+        "min_us": round(min(timings) * 1e6, 3),
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "mean_us": round(statistics.fmean(timings) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(timings) * 1e6, 3) if repeat > 1 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-bancs des moteurs de jeu")
+    parser.add_argument('--filter', help="Ne mesurer que les cas dont le nom contient ce texte")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Durée minimale d'une série (s)")
+    parser.add_argument('--repeat', type=int, default=5, help="Nombre de séries par cas")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Fichier de référence")
+    parser.add_argument('--save-baseline', action='store_true', help="Enregistrer les résultats comme référence")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Ralentissement toléré de la médiane (0.25 = 25 %%)")
+    parser.add_argument('--output', help="Fichier du rapport JSON (sortie standard sinon)")
+    args = parser.parse_args(argv)
+
+    cases = build_cases()
+    if args.filter:
+        cases = {name: function for name, function in cases.items() if args.filter in name}
+
+    results = {}
+    for name, function in cases.items():
+        results[name] = measure(function, args.min_time, max(args.repeat, 1))
+        print(f"{name:<45} {results[name]['median_us']:>12.3f} µs", file=sys.stderr)
+
+    report = {
+        "benchmark": "micro",
+        "environment": environment(),
+        "options": {"seed": BENCH_SEED, "min_time": args.min_time, "repeat": args.repeat},
+        "benchmarks": results,
+    }
+
+    if args.save_baseline:
+        write_report(report, args.baseline)
+        print(f"Référence enregistrée : {args.baseline}", file=sys.stderr)
+        return 0
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_reports(baseline, report, 'benchmarks', 'median_us', args.threshold)
+        report["baseline"] = {
+            "path": args.baseline,
+            "threshold": args.threshold,
+            "regressions": [
+                {"name": name, "baseline_us": reference, "current_us": value, "change": change}
+                for name, reference, value, change in regressions
+            ],
+        }
+    else:
+        print(f"Aucune référence ({args.baseline}) : utiliser --save-baseline", file=sys.stderr)
+
+    write_report(report, args.output)
+    for name, reference, value, change in regressions:
+        print(f"Régression {name} : {reference} µs -> {value} µs ({change:+.1%})", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def percentile(sorted_values, pct):
+    """
+    Percentile par rang le plus proche
+    :param sorted_values: Valeurs triées
+    :param pct: Percentile entre 0 et 100
+    """
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def latency_summary(durations, errors=0, elapsed=None):
+    """
+    Statistiques d'une série de durées (en secondes), exprimées en millisecondes
+    :param errors: Nombre de réponses en erreur de la série
+    :param elapsed: Durée totale de la mesure, pour le débit
+    """
+    values = sorted(durations)
+    count = len(values)
+    summary = {
+        "count": count,
+        "errors": errors,
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else None,
+        "p50_ms": None,
+        "p95_ms": None,
+        "p99_ms": None,
+        "max_ms": round(values[-1] * 1000, 3) if count else None,
+    }
+    for pct in (50, 95, 99):
+        value = percentile(values, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 3) if value is not None else None
+    if elapsed:
+        summary["throughput_rps"] = round(count / elapsed, 2)
+    return summary
+
+
+def git_revision():
+    """Commit courant du dépôt, None hors d'un dépôt git"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """Contexte d'exécution enregistré avec chaque rapport"""
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(report, path=None):
+    """Écrit le rapport JSON dans un fichier, ou sur la sortie standard"""
+    data = json.dumps(report, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, 'w', encoding='utf-8') as report_file:
+            report_file.write(data + '\n')
+    else:
+        print(data)
+
+
+def compare_reports(baseline, current, section, metric, threshold, higher_is_better=False):
+    """
+    Compare deux rapports entrée par entrée
+    :param section: Clé des entrées comparées (ex. "endpoints")
+    :param metric: Mesure comparée (ex. "p95_ms")
+    :param threshold: Variation relative tolérée (0.2 = 20 %)
+    :param higher_is_better: Vrai pour un débit, faux pour une latence
+    :return: Liste des régressions (nom, valeur de référence, valeur courante, variation)
+    """
+    regressions = []
+    for name, entry in current.get(section, {}).items():
+        reference = baseline.get(section, {}).get(name, {}).get(metric)
+        value = entry.get(metric)
+        if not reference or value is None:
+            continue
+        change = (value - reference) / reference
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append((name, reference, value, round(change, 4)))
+    return regressions
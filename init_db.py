@@ -1,18 +1,510 @@
 import os
+import random
 import sqlite3
 import json
+import threading
+import time
+
+from flask import g, has_app_context
 
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'rpg.db')
+# Nombre maximal de connexions inactives conservées dans le pool
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+# PRAGMAs appliqués à chaque nouvelle connexion (format "nom=valeur;nom=valeur")
+DB_PRAGMAS = os.getenv('DB_PRAGMAS', '')
+# Réglages de concurrence : WAL permet aux lectures de ne pas attendre les écritures
+DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 64 * 1024 * 1024))
+DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', -16000))  # Valeur négative = taille en Kio
+DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', 5000))  # En millisecondes
+# Nouvelles tentatives des transactions d'écriture sur "database is locked"
+DB_WRITE_RETRIES = int(os.getenv('DB_WRITE_RETRIES', 5))
+DB_RETRY_BASE_DELAY = float(os.getenv('DB_RETRY_BASE_DELAY', 0.05))  # En secondes
+
+
+def parse_pragmas(spec):
+    """Convertit une chaîne "nom=valeur;nom=valeur" en liste de couples"""
+    pragmas = []
+    for part in spec.split(';'):
+        if '=' not in part:
+            continue
+        name, value = part.split('=', 1)
+        if name.strip():
+            pragmas.append((name.strip(), value.strip()))
+    return pragmas
+
+
+def connection_pragmas():
+    """PRAGMAs de performance suivis des surcharges de DB_PRAGMAS"""
+    pragmas = [
+        ('busy_timeout', DB_BUSY_TIMEOUT),
+        ('synchronous', DB_SYNCHRONOUS),
+        ('cache_size', DB_CACHE_SIZE),
+        ('mmap_size', DB_MMAP_SIZE),
+    ]
+    return pragmas + parse_pragmas(DB_PRAGMAS)
+
+
+# Fonction appelée après chaque instruction : observer(sql, durée en secondes)
+_sql_observer = None
+
+
+def set_sql_observer(observer):
+    """Installe (ou retire avec None) l'observateur des instructions SQL"""
+    global _sql_observer
+    _sql_observer = observer
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Curseur qui signale la durée de chaque instruction à l'observateur SQL"""
+
+    def execute(self, sql, parameters=()):
+        observer = _sql_observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        observer = _sql_observer
+        if observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer(sql, time.perf_counter() - started)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connexion SQLite qui retourne dans le pool au lieu d'être fermée"""
+
+    pool = None
+    request_bound = False
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        observer = _sql_observer
+        if observer is None:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            observer('COMMIT', time.perf_counter() - started)
+
+    def close(self):
+        # Les connexions liées à une requête sont libérées au teardown
+        if self.request_bound:
+            return
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def really_close(self):
+        """Ferme réellement la connexion SQLite sous-jacente"""
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Pool de connexions SQLite réutilisables"""
+
+    def __init__(self, database, size=DB_POOL_SIZE, pragmas=None):
+        """
+        Initialise le pool
+        :param database: Chemin du fichier SQLite
+        :param size: Nombre maximal de connexions inactives conservées
+        :param pragmas: Liste de couples (nom, valeur) appliqués à chaque connexion
+        """
+        self.database = database
+        self.size = size
+        self.pragmas = list(pragmas or [])
+        self._idle = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """Récupère une connexion inactive ou en ouvre une nouvelle"""
+        with self._lock:
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            self.misses += 1
+        return self._connect()
+
+    def release(self, conn):
+        """Remet une connexion dans le pool (annule toute transaction ouverte)"""
+        conn.request_bound = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.really_close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+            self.discarded += 1
+        conn.really_close()
+
+    def close_all(self):
+        """Ferme toutes les connexions inactives"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.really_close()
+
+    def stats(self):
+        """Compteurs d'utilisation du pool"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "discarded": self.discarded
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retourne le pool associé à DATABASE_PATH (recréé si le chemin change)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE_PATH:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DATABASE_PATH, DB_POOL_SIZE, connection_pragmas())
+        return _pool
+
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    Retourne une connexion à la base de données.
+    Dans un contexte Flask, une seule connexion est liée à la requête via `g`
+    et rendue au pool au teardown ; ailleurs, `close()` la rend au pool.
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = get_pool().acquire()
+            conn.request_bound = True
+            g._db_conn = conn
+        return conn
+    return get_pool().acquire()
+
+
+def release_db_connection(exception=None):
+    """Rend au pool la connexion liée au contexte courant"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None and conn.pool is not None:
+        conn.pool.release(conn)
+
+
+def is_locked_error(error):
+    """Indique si l'erreur SQLite provient d'un verrou concurrent"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _run_in_savepoint(conn, work):
+    """
+    Exécute work dans un SAVEPOINT de la transaction déjà ouverte par l'appelant.
+    En cas d'erreur, seules les écritures de work sont annulées et l'erreur est
+    propagée sans nouvelle tentative : la validation revient à l'appelant.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SAVEPOINT run_write_transaction')
+        try:
+            result = work(cursor)
+        except Exception:
+            cursor.execute('ROLLBACK TO run_write_transaction')
+            cursor.execute('RELEASE run_write_transaction')
+            raise
+        cursor.execute('RELEASE run_write_transaction')
+        return result
+    finally:
+        cursor.close()
+
+
+def run_write_transaction(work, retries=None, base_delay=None):
+    """
+    Exécute une transaction d'écriture avec nouvelles tentatives.
+    Appelée alors qu'une transaction est ouverte, work s'exécute dans un SAVEPOINT
+    de celle-ci, sans validation ni nouvelle tentative.
+    :param work: Fonction recevant un curseur, exécutée dans BEGIN IMMEDIATE
+    :param retries: Nombre maximal de nouvelles tentatives (DB_WRITE_RETRIES par défaut)
+    :param base_delay: Délai initial du backoff exponentiel en secondes
+    :return: La valeur retournée par work
+    """
+    retries = DB_WRITE_RETRIES if retries is None else retries
+    base_delay = DB_RETRY_BASE_DELAY if base_delay is None else base_delay
+
+    conn = get_db_connection()
+    attempt = 0
+    try:
+        if conn.in_transaction:
+            return _run_in_savepoint(conn, work)
+        while True:
+            cursor = conn.cursor()
+            try:
+                # Prendre le verrou d'écriture dès le début pour éviter les
+                # échecs de promotion lecture -> écriture en mode WAL
+                cursor.execute('BEGIN IMMEDIATE')
+                result = work(cursor)
+                conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if not is_locked_error(e) or attempt >= retries:
+                    raise
+                time.sleep(base_delay * (2 ** attempt) * random.uniform(0.5, 1.5))
+                attempt += 1
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+    finally:
+        conn.close()
+
+
+def configure_database(cursor):
+    """Applique les réglages persistants du fichier de base de données"""
+    cursor.execute(f'PRAGMA journal_mode = {DB_JOURNAL_MODE}')
+
+
+# Migrations du schéma, appliquées dans l'ordre selon PRAGMA user_version.
+# Chaque entrée : (version, description, liste d'instructions SQL)
+MIGRATIONS = [
+    (1, "Index des colonnes de recherche et pile d'inventaire unique", [
+        'CREATE INDEX IF NOT EXISTS idx_characters_user_id ON characters(user_id)',
+        # Fusionner les piles en double avant de poser la contrainte d'unicité
+        '''
+        UPDATE inventory SET quantity = (
+            SELECT SUM(dup.quantity) FROM inventory AS dup
+            WHERE dup.character_id IS inventory.character_id
+              AND dup.name = inventory.name
+              AND dup.type_id IS inventory.type_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM inventory
+            GROUP BY character_id, name, type_id HAVING COUNT(*) > 1
+        )
+        ''',
+        '''
+        DELETE FROM inventory WHERE id NOT IN (
+            SELECT MIN(id) FROM inventory GROUP BY character_id, name, type_id
+        )
+        ''',
+        # Sert aussi d'index sur character_id (préfixe) et permet l'UPSERT des piles
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_stack
+        ON inventory(character_id, name, type_id)
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_character_items_character_id ON character_items(character_id)',
+        'CREATE INDEX IF NOT EXISTS idx_pvp_battles_player1 ON pvp_battles(player1_id)',
+        'CREATE INDEX IF NOT EXISTS idx_pvp_battles_player2 ON pvp_battles(player2_id)',
+        'CREATE INDEX IF NOT EXISTS idx_completed_quests_character ON completed_quests(character_id, quest_id)',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_board_sessions_character
+        ON board_game_sessions(character_id, is_completed, is_game_over)
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_board_elements_session ON board_game_elements(session_id, position)',
+    ]),
+    (2, "Version des personnages pour les ETag", [
+        'ALTER TABLE characters ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+        # Toute modification du personnage incrémente sa version...
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_characters_version
+        AFTER UPDATE ON characters WHEN NEW.version = OLD.version
+        BEGIN
+            UPDATE characters SET version = OLD.version + 1 WHERE id = NEW.id;
+        END
+        ''',
+        # ... de même que toute modification de ses objets
+        *[
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE characters SET version = version + 1
+                WHERE id IN ({', '.join(f'{ref}.character_id' for ref in refs)});
+            END
+            '''
+            for table in ('inventory', 'character_items')
+            for event, refs in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',)))
+        ],
+    ]),
+    (3, "Version du catalogue (types d'objets, quêtes)", [
+        # Noms des monstres tels que renvoyés jusqu'ici par l'API
+        *[
+            f'''
+            UPDATE quests SET monster_data = json_set(monster_data, '$.name', '{new_name}')
+            WHERE id = {quest_id} AND json_extract(monster_data, '$.name') = '{old_name}'
+            '''
+            for quest_id, old_name, new_name in (
+                (1, 'Forest Monster', 'Monstre de la Forêt'),
+                (2, 'Cave Troll', 'Troll des Cavernes'),
+            )
+        ],
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1)',
+        # Toute modification du catalogue le fait recharger par les processus
+        *[
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_catalog
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END
+            '''
+            for table in ('item_types', 'quests')
+            for event in ('INSERT', 'UPDATE', 'DELETE')
+        ],
+    ]),
+    (4, "Colonnes résumées et journal compressé des combats", [
+        'ALTER TABLE pvp_battles ADD COLUMN round_count INTEGER',
+        'ALTER TABLE pvp_battles ADD COLUMN damage_to_player1 INTEGER',
+        'ALTER TABLE pvp_battles ADD COLUMN damage_to_player2 INTEGER',
+        'ALTER TABLE pvp_battles ADD COLUMN round_log BLOB',
+        'ALTER TABLE completed_quests ADD COLUMN round_count INTEGER',
+        'ALTER TABLE completed_quests ADD COLUMN damage_to_hero INTEGER',
+        'ALTER TABLE completed_quests ADD COLUMN damage_to_monster INTEGER',
+        'ALTER TABLE completed_quests ADD COLUMN round_log BLOB',
+    ]),
+    (5, "Statistiques Versus agrégées pour le classement", [
+        '''
+        CREATE TABLE IF NOT EXISTS character_stats (
+            character_id INTEGER PRIMARY KEY,
+            battles INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            last_battle_at DATETIME,
+            FOREIGN KEY (character_id) REFERENCES characters(id)
+        )
+        ''',
+        # Reprise des combats déjà enregistrés
+        '''
+        INSERT OR REPLACE INTO character_stats (character_id, battles, wins, losses, last_battle_at)
+        SELECT character_id, COUNT(*), SUM(won), COUNT(*) - SUM(won), MAX(created_at)
+        FROM (
+            SELECT player1_id AS character_id, winner_id IS player1_id AS won, created_at FROM pvp_battles
+            UNION ALL
+            SELECT player2_id, winner_id IS player2_id, created_at FROM pvp_battles
+        )
+        GROUP BY character_id
+        ''',
+        # Chaque combat enregistré met à jour les statistiques des deux adversaires
+        *[
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_pvp_battles_stats_{player}
+            AFTER INSERT ON pvp_battles
+            BEGIN
+                INSERT INTO character_stats (character_id, battles, wins, losses, last_battle_at)
+                VALUES (NEW.{player}_id, 1, NEW.winner_id IS NEW.{player}_id,
+                        NEW.winner_id IS NOT NEW.{player}_id, NEW.created_at)
+                ON CONFLICT(character_id) DO UPDATE SET
+                    battles = battles + 1,
+                    wins = wins + excluded.wins,
+                    losses = losses + excluded.losses,
+                    last_battle_at = excluded.last_battle_at;
+            END
+            '''
+            for player in ('player1', 'player2')
+        ],
+        'CREATE INDEX IF NOT EXISTS idx_character_stats_wins ON character_stats(wins DESC, battles)',
+        'CREATE INDEX IF NOT EXISTS idx_characters_level ON characters(level DESC, experience DESC)',
+    ]),
+    (6, "Graines aléatoires des sessions et des combats (rejeu)", [
+        'ALTER TABLE board_game_sessions ADD COLUMN seed INTEGER',
+        'ALTER TABLE board_game_sessions ADD COLUMN turn INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE pvp_battles ADD COLUMN seed INTEGER',
+        'ALTER TABLE completed_quests ADD COLUMN seed INTEGER',
+    ]),
+    (7, "Index de la pagination par clé de l'inventaire", [
+        # Une recherche par (character_id, colonne de tri, id) et par table : voir InventoryService.list_page
+        'CREATE INDEX IF NOT EXISTS idx_inventory_character_name ON inventory(character_id, name, id)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_character_quantity ON inventory(character_id, quantity, id)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_character_type ON inventory(character_id, type_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_item_types_name ON item_types(type_name, id)',
+        'CREATE INDEX IF NOT EXISTS idx_character_items_character_name ON character_items(character_id, name, id)',
+        'CREATE INDEX IF NOT EXISTS idx_character_items_character_type ON character_items(character_id, type, id)',
+    ]),
+]
+
+
+def run_migrations(conn):
+    """
+    Applique les migrations dont la version dépasse PRAGMA user_version.
+    Chaque migration s'exécute dans sa propre transaction.
+    :return: Liste des versions appliquées
+    """
+    current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Migration {version} appliquée : {description}")
+    return applied
+
+
+def init_app(app):
+    """Enregistre la libération de la connexion à la fin de chaque requête"""
+    app.teardown_appcontext(release_db_connection)
 
 def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    configure_database(cursor)
+
     # Table des utilisateurs
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS user (
@@ -168,9 +660,9 @@ def init_db():
         # Insérer quelques quêtes par défaut
         quests = [
             (1, 'La Forêt Sombre', 'Explorez la forêt sombre et affrontez les monstres qui s\'y cachent.', 1, 1, 50, 
-             json.dumps({"name": "Forest Monster", "health": 50, "attack": 10})),
+             json.dumps({"name": "Monstre de la Forêt", "health": 50, "attack": 10})),
             (2, 'Les Grottes Mystérieuses', 'Descendez dans les grottes mystérieuses et découvrez leurs secrets.', 2, 2, 100, 
-             json.dumps({"name": "Cave Troll", "health": 80, "attack": 15})),
+             json.dumps({"name": "Troll des Cavernes", "health": 80, "attack": 15})),
             (3, 'Le Donjon du Dragon', 'Affrontez le terrible dragon qui terrorise la région.', 3, 3, 200, 
              json.dumps({"name": "Dragon", "health": 200, "attack": 40}))
         ]
@@ -183,6 +675,7 @@ def init_db():
 
     conn.commit()
     cursor.close()
+    run_migrations(conn)
     conn.close()
     print("Base de données initialisée avec succès.")
 
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from flask import g, has_app_context, request
+
+from init_db import set_sql_observer
+from profiler import profiler
+
+# Proportion des requêtes instrumentées (0 = désactivé, 1 = toutes)
+TIMING_SAMPLE_RATE = float(os.getenv('TIMING_SAMPLE_RATE', 1.0))
+# Nombre d'instructions les plus lentes détaillées par requête
+TIMING_SLOWEST_STATEMENTS = int(os.getenv('TIMING_SLOWEST_STATEMENTS', 3))
+# Nombre de requêtes conservées par route pour les histogrammes glissants
+TIMING_WINDOW = int(os.getenv('TIMING_WINDOW', 1000))
+# Une ligne JSON par requête instrumentée sur le logger "rpg.timing"
+TIMING_LOG = os.getenv('TIMING_LOG', '0') == '1'
+
+# Bornes (ms) des classes des histogrammes de durée
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+timing_logger = logging.getLogger('rpg.timing')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Instruction SQL sur une ligne, pour regrouper les occurrences"""
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def percentile(sorted_values, pct):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return None
+    rank = max(-(-pct * len(sorted_values) // 100), 1)
+    return sorted_values[rank - 1]
+
+
+def histogram(values_ms):
+    """
+    Nombre de valeurs par classe de HISTOGRAM_BOUNDS_MS
+    :return: Liste de {"le_ms": borne supérieure (None pour la dernière classe), "count": effectif}
+    """
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for value in values_ms:
+        index = 0
+        while index < len(HISTOGRAM_BOUNDS_MS) and value > HISTOGRAM_BOUNDS_MS[index]:
+            index += 1
+        counts[index] += 1
+    return [{"le_ms": bound, "count": count} for bound, count in zip((*HISTOGRAM_BOUNDS_MS, None), counts)]
+
+
+def header_text(text, length=60):
+    """Texte ASCII sans guillemets, utilisable dans un en-tête HTTP"""
+    text = text.encode('ascii', 'replace').decode('ascii').replace('"', "'").replace('\\', '/')
+    return text if len(text) <= length else text[:length - 3] + '...'
+
+
+class RequestProfile:
+    """Mesures d'une requête : durée, nombre et durée des instructions SQL"""
+    __slots__ = ('started', 'sql_count', 'sql_time', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest = []
+
+    def record_sql(self, sql, duration):
+        self.sql_count += 1
+        self.sql_time += duration
+        if TIMING_SLOWEST_STATEMENTS <= 0:
+            return
+        if len(self.slowest) < TIMING_SLOWEST_STATEMENTS:
+            self.slowest.append((duration, sql))
+        elif duration > self.slowest[-1][0]:
+            self.slowest[-1] = (duration, sql)
+        else:
+            return
+        self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+
+
+class Instrumentation:
+    """
+    Mesure le temps passé dans chaque requête et dans SQLite.
+    Les mesures sont renvoyées dans l'en-tête Server-Timing (le détail des
+    instructions SQL seulement si profiler.authorized()), journalisées
+    et agrégées par route sur une fenêtre glissante (voir snapshot).
+    """
+
+    def __init__(self, sample_rate=TIMING_SAMPLE_RATE, window=TIMING_WINDOW):
+        """
+        :param sample_rate: Proportion des requêtes instrumentées
+        :param window: Nombre de requêtes conservées par route
+        """
+        self.sample_rate = sample_rate
+        self.window = window
+        self._routes = {}
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Branche les mesures sur l'application et sur les connexions SQLite"""
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        set_sql_observer(self._observe_sql)
+        if TIMING_LOG and not timing_logger.handlers:
+            timing_logger.addHandler(logging.StreamHandler())
+            timing_logger.setLevel(logging.INFO)
+
+    def _before_request(self):
+        if self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate):
+            g._request_profile = RequestProfile()
+
+    @staticmethod
+    def _observe_sql(sql, duration):
+        # Les threads hors requête (écriture différée, tâches) ne sont pas mesurés
+        if not has_app_context():
+            return
+        profile = g.get('_request_profile')
+        if profile is not None:
+            profile.record_sql(sql, duration)
+
+    def _after_request(self, response):
+        profile = g.pop('_request_profile', None)
+        if profile is None:
+            return response
+        duration = time.perf_counter() - profile.started
+        route = f'{request.method} {request.url_rule.rule if request.url_rule else "<inconnue>"}'
+
+        timings = [
+            f'app;dur={duration * 1000:.3f}',
+            f'sql;dur={profile.sql_time * 1000:.3f};desc="{profile.sql_count} instructions"',
+        ]
+        # Le texte des instructions révèle le schéma : réservé aux accès autorisés au profilage
+        if profile.slowest and profiler.authorized():
+            timings += [
+                f'sql-{rank};dur={statement_time * 1000:.3f};desc="{header_text(normalize_sql(sql))}"'
+                for rank, (statement_time, sql) in enumerate(profile.slowest, start=1)
+            ]
+        response.headers.add('Server-Timing', ', '.join(timings))
+
+        self._record(route, duration, profile)
+        if timing_logger.isEnabledFor(logging.INFO):
+            timing_logger.info(json.dumps({
+                "route": route,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "sql_count": profile.sql_count,
+                "sql_ms": round(profile.sql_time * 1000, 3),
+                "slowest": [
+                    {"sql": normalize_sql(sql), "ms": round(statement_time * 1000, 3)}
+                    for statement_time, sql in profile.slowest
+                ]
+            }, ensure_ascii=False))
+        return response
+
+    def _record(self, route, duration, profile):
+        with self._lock:
+            samples = self._routes.get(route)
+            if samples is None:
+                samples = self._routes[route] = deque(maxlen=self.window)
+            samples.append((duration * 1000, profile.sql_count, profile.sql_time * 1000))
+            for statement_time, sql in profile.slowest:
+                key = normalize_sql(sql)
+                count, total, slowest = self._statements.get(key, (0, 0.0, 0.0))
+                self._statements[key] = (count + 1, total + statement_time * 1000,
+                                         max(slowest, statement_time * 1000))
+
+    def snapshot(self, top=20):
+        """
+        Histogrammes glissants par route et instructions les plus lentes
+        :param top: Nombre d'instructions lentes retournées
+        """
+        with self._lock:
+            routes = {route: list(samples) for route, samples in self._routes.items()}
+            statements = sorted(self._statements.items(), key=lambda item: item[1][2], reverse=True)[:top]
+
+        result = {}
+        for route, samples in sorted(routes.items()):
+            durations = sorted(sample[0] for sample in samples)
+            sql_counts = [sample[1] for sample in samples]
+            result[route] = {
+                "count": len(samples),
+                "p50_ms": round(percentile(durations, 50), 3),
+                "p95_ms": round(percentile(durations, 95), 3),
+                "p99_ms": round(percentile(durations, 99), 3),
+                "max_ms": round(durations[-1], 3),
+                "sql_count_mean": round(sum(sql_counts) / len(samples), 2),
+                "sql_count_max": max(sql_counts),
+                "sql_ms_mean": round(sum(sample[2] for sample in samples) / len(samples), 3),
+                "histogram": histogram(durations)
+            }
+        return {
+            "sample_rate": self.sample_rate,
+            "window": self.window,
+            "routes": result,
+            "slowest_statements": [
+                {"sql": sql, "count": count, "total_ms": round(total, 3), "max_ms": round(slowest, 3)}
+                for sql, (count, total, slowest) in statements
+            ]
+        }
+
+    def reset(self):
+        """Vide les mesures agrégées"""
+        with self._lock:
+            self._routes.clear()
+            self._statements.clear()
+
+
+instrumentation = Instrumentation()
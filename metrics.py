@@ -0,0 +1,316 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+
+# Répertoire partagé par les processus d'un serveur pre-fork (vide = processus unique).
+# Chaque processus y écrit ses compteurs ; l'export additionne ceux de tous les processus.
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# Jeton attendu en "Authorization: Bearer ..." sur /api/v1/metrics (vide = accès libre)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Classes des histogrammes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+ROUND_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100, 250, 1000)
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Au-delà de ce nombre de threads suivis, les compteurs des threads terminés sont regroupés
+_MAX_SHARDS = 64
+
+
+class MetricFamily:
+    """Définition d'une métrique : type, description, noms des labels et classes"""
+    __slots__ = ('name', 'kind', 'help', 'labels', 'buckets')
+
+    def __init__(self, name, kind, help, labels=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) if buckets else None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _merge(target, key, value):
+    """Ajoute une valeur de compteur (nombre) ou d'histogramme (liste) à target"""
+    current = target.get(key)
+    if current is None:
+        target[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            current[index] += item
+    else:
+        target[key] = current + value
+
+
+def _pid_alive(pid):
+    """Le processus existe-t-il encore"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """
+    Compteurs et histogrammes au format d'exposition Prometheus.
+    Chaque thread écrit dans son propre dictionnaire (pas de verrou à
+    l'incrémentation) ; les dictionnaires sont additionnés à l'export.
+    """
+
+    def __init__(self, multiproc_dir=METRICS_MULTIPROC_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        """
+        :param multiproc_dir: Répertoire partagé entre processus (None ou vide = désactivé)
+        :param flush_interval: Délai entre deux écritures des compteurs du processus
+        """
+        self.multiproc_dir = multiproc_dir or None
+        self.flush_interval = flush_interval
+        self._families = {}
+        self._collectors = []
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._flusher = None
+
+    def define(self, name, kind, help, labels=(), buckets=None):
+        """
+        Déclare une métrique
+        :param kind: 'counter', 'gauge' ou 'histogram'
+        :param labels: Noms des labels, dans l'ordre des valeurs passées à inc/observe
+        """
+        self._families[name] = MetricFamily(name, kind, help, labels, buckets)
+
+    def register_collector(self, collector):
+        """
+        Ajoute une fonction appelée à l'export, qui renvoie des valeurs absolues
+        (compteurs internes, jauges) sous forme de triplets (nom, valeurs des labels, valeur)
+        """
+        self._collectors.append(collector)
+
+    def inc(self, name, labels=(), value=1):
+        """Incrémente un compteur"""
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        """Ajoute une observation à un histogramme"""
+        buckets = self._families[name].buckets
+        shard = self._shard()
+        key = (name, labels)
+        state = shard.get(key)
+        if state is None:
+            # Effectif par classe (dernière classe : +Inf) puis somme des observations
+            state = shard[key] = [0] * (len(buckets) + 1) + [0]
+        state[bisect_left(buckets, value)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def timer(self, name, labels=()):
+        """Observe dans un histogramme la durée du bloc (en secondes)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels)
+
+    def init_app(self, app):
+        """Compte les requêtes et leur durée par blueprint et par route"""
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        self.start_flusher()
+
+    def _before_request(self):
+        self.check_fork()
+        g._metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        # Les URL sans route sont regroupées pour borner le nombre de séries
+        route = request.url_rule.rule if request.url_rule else '<inconnue>'
+        blueprint = request.blueprint or 'app'
+        self.inc('rpg_http_requests_total', (blueprint, route, request.method, str(response.status_code)))
+        self.observe('rpg_http_request_duration_seconds', time.perf_counter() - started,
+                     (blueprint, route, request.method))
+        return response
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) > _MAX_SHARDS:
+                    self._fold_dead_shards()
+            return shard
+
+    def _fold_dead_shards(self):
+        """Regroupe les compteurs des threads terminés (appelé sous self._lock)"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    _merge(self._base, key, value)
+        self._shards = alive
+
+    def check_fork(self):
+        """
+        Après un fork, repart de zéro : les compteurs hérités du processus
+        parent sont déjà exportés par celui-ci
+        """
+        if os.getpid() == self._pid:
+            return
+        with self._lock:
+            self._pid = os.getpid()
+            self._shards = []
+            self._base = {}
+            self._local = threading.local()
+            self._flusher = None
+        self.start_flusher()
+
+    def local_samples(self):
+        """Valeurs du processus courant : {(nom, labels): nombre ou liste}"""
+        with self._lock:
+            self._fold_dead_shards()
+            merged = {key: list(value) if isinstance(value, list) else value
+                      for key, value in self._base.items()}
+            shards = [dict(shard) for _, shard in self._shards]
+        for shard in shards:
+            for key, value in shard.items():
+                _merge(merged, key, value)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                _merge(merged, (name, tuple(labels)), value)
+        return merged
+
+    def collect(self):
+        """
+        Valeurs de tous les processus (ceux du répertoire partagé en plus du courant).
+        Les compteurs des processus terminés restent acquis ; leurs jauges sont ignorées.
+        """
+        merged = self.local_samples()
+        if not self.multiproc_dir:
+            return merged
+        own_file = self._process_file()
+        for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics-*.json')):
+            if path == own_file:
+                continue
+            try:
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                with open(path, encoding='utf-8') as metrics_file:
+                    samples = json.load(metrics_file)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(pid)
+            for name, labels, value in samples:
+                family = self._families.get(name)
+                if not alive and family is not None and family.kind == 'gauge':
+                    continue
+                _merge(merged, (name, tuple(labels)), value)
+        return merged
+
+    def render(self):
+        """Texte d'exposition Prometheus"""
+        samples = {}
+        for (name, labels), value in self.collect().items():
+            samples.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, family in self._families.items():
+            lines.append(f'# HELP {name} {family.help}')
+            lines.append(f'# TYPE {name} {family.kind}')
+            for labels, value in sorted(samples.get(name, []), key=lambda sample: sample[0]):
+                if family.kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(family.labels, labels)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip((*family.buckets, '+Inf'), value[:-1]):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f'{name}_bucket{_format_labels(family.labels, labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(family.labels, labels)} {_format_value(value[-1])}')
+                lines.append(f'{name}_count{_format_labels(family.labels, labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def _process_file(self):
+        return os.path.join(self.multiproc_dir, f'metrics-{os.getpid()}.json')
+
+    def flush(self):
+        """Écrit les valeurs du processus dans le répertoire partagé (remplacement atomique)"""
+        if not self.multiproc_dir:
+            return
+        samples = [[name, list(labels), value] for (name, labels), value in self.local_samples().items()]
+        path = self._process_file()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as metrics_file:
+            json.dump(samples, metrics_file)
+        os.replace(temporary, path)
+
+    def start_flusher(self):
+        """Lance l'écriture périodique des valeurs du processus (mode multi-processus)"""
+        if not self.multiproc_dir or self._flusher is not None:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+
+        def flush_periodically():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"Métriques : écriture impossible ({e})")
+
+        self._flusher = threading.Thread(target=flush_periodically, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+
+
+metrics = MetricsRegistry()
+atexit.register(metrics.flush)
+
+metrics.define('rpg_http_requests_total', 'counter', 'Requêtes HTTP traitées',
+               ('blueprint', 'route', 'method', 'status'))
+metrics.define('rpg_http_request_duration_seconds', 'histogram', 'Durée des requêtes HTTP',
+               ('blueprint', 'route', 'method'), LATENCY_BUCKETS)
+metrics.define('rpg_battles_total', 'counter', 'Combats simulés', ('mode',))
+metrics.define('rpg_battle_rounds', 'histogram', 'Nombre de tours par combat', ('mode',), ROUND_BUCKETS)
+metrics.define('rpg_simulations_total', 'counter', 'Simulations Monte-Carlo lancées', ('mode',))
+metrics.define('rpg_simulation_samples_total', 'counter', 'Combats simulés par les simulations Monte-Carlo',
+               ('mode',))
+metrics.define('rpg_board_turns_total', 'counter', 'Tours joués sur le plateau (rate() pour les tours/s)')
+metrics.define('rpg_bcrypt_seconds', 'histogram', 'Durée des opérations bcrypt', ('operation',),
+               BCRYPT_BUCKETS)
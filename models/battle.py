@@ -0,0 +1,326 @@
+import json
+from dataclasses import dataclass, field
+
+from metrics import metrics
+from models.rng import make_rng, new_seed
+
+# Encodage JSON compact utilisé pour le streaming des longs combats
+_compact = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+def _without_none(data):
+    """Retire les clés absentes d'un tour (None) pour garder le format historique"""
+    return {key: value for key, value in data.items() if value is not None}
+
+
+@dataclass(slots=True)
+class VersusRound:
+    """Un tour de combat en mode Versus"""
+    round: int
+    player1_health: int
+    player2_health: int
+    initiative: str = None
+    damage_to_player2: int = None
+    damage_to_player1: int = None
+    winner: str = None
+    # Camps (1 ou 2) de l'initiative et du vainqueur, enregistrés dans le journal des tours
+    initiative_side: int = None
+    winner_side: int = None
+
+    def to_dict(self):
+        return _without_none({
+            "round": self.round,
+            "player1_health": self.player1_health,
+            "player2_health": self.player2_health,
+            "initiative": self.initiative,
+            "damage_to_player2": self.damage_to_player2,
+            "damage_to_player1": self.damage_to_player1,
+            "winner": self.winner,
+            "initiative_side": self.initiative_side,
+            "winner_side": self.winner_side
+        })
+
+
+@dataclass(slots=True)
+class QuestRound:
+    """Un tour de combat en mode Quête"""
+    round: int
+    hero_health: int
+    monster_health: int
+    damage_to_monster: int
+    damage_to_hero: int = None
+    winner: str = None
+    # Camp du vainqueur : 1 pour le héros, 2 pour le monstre
+    winner_side: int = None
+
+    def to_dict(self):
+        return _without_none({
+            "round": self.round,
+            "hero_health": self.hero_health,
+            "monster_health": self.monster_health,
+            "damage_to_monster": self.damage_to_monster,
+            "damage_to_hero": self.damage_to_hero,
+            "winner": self.winner,
+            "winner_side": self.winner_side
+        })
+
+
+@dataclass(slots=True)
+class VersusResult:
+    """Résultat d'un combat entre deux personnages"""
+    player1: object
+    player2: object
+    rounds: list = field(default_factory=list)
+    winner: str = None
+    # Camp du vainqueur (1 ou 2) : deux personnages peuvent porter le même nom
+    winner_side: int = None
+    seed: int = None
+
+    @property
+    def winner_id(self):
+        if self.winner_side is None:
+            return None
+        return (self.player1 if self.winner_side == 1 else self.player2).id
+
+    def header(self):
+        """Données du combat hors détail des tours"""
+        return {
+            "mode": "PVP",
+            "players": {
+                "player1": {
+                    "name": self.player1.name,
+                    "original_health": self.player1.health,
+                    "id": self.player1.id
+                },
+                "player2": {
+                    "name": self.player2.name,
+                    "original_health": self.player2.health,
+                    "id": self.player2.id
+                }
+            },
+            "winner": self.winner,
+            "winner_id": self.winner_id,
+            "seed": self.seed
+        }
+
+    def iter_rounds(self):
+        return iter(self.rounds)
+
+    def to_dict(self):
+        data = self.header()
+        data["rounds"] = [round_data.to_dict() for round_data in self.rounds]
+        return data
+
+
+@dataclass(slots=True)
+class QuestResult:
+    """Résultat d'un combat de quête, calculé sans simuler les tours"""
+    hero: object
+    monster: object
+    damage_to_monster: int
+    damage_to_hero: int
+    round_count: int = 0
+    hero_final_health: int = 0
+    monster_final_health: int = 0
+    winner: str = None
+    stalemate: bool = False
+
+    def header(self):
+        """Données du combat hors détail des tours"""
+        data = {
+            "mode": "Quest",
+            "hero": {
+                "name": self.hero.name,
+                "original_health": self.hero.health,
+                "final_health": self.hero_final_health
+            },
+            "monster": {
+                "name": self.monster.name,
+                "original_health": self.monster.health,
+                "final_health": self.monster_final_health
+            },
+            "winner": self.winner,
+            "round_count": self.round_count
+        }
+        if self.stalemate:
+            data["stalemate"] = True
+        return data
+
+    def iter_rounds(self):
+        """Reconstruit à la demande le détail des tours d'un combat déjà résolu"""
+        for round in range(1, self.round_count + 1):
+            hero_health = self.hero.health - (round - 1) * self.damage_to_hero
+            monster_health = self.monster.health - (round - 1) * self.damage_to_monster
+            round_data = QuestRound(round, hero_health, monster_health, self.damage_to_monster)
+
+            if monster_health - self.damage_to_monster <= 0:
+                round_data.winner = self.hero.name  # Monstre vaincu
+                round_data.winner_side = 1
+            else:
+                # Le monstre riposte
+                round_data.damage_to_hero = self.damage_to_hero
+                if hero_health - self.damage_to_hero <= 0:
+                    round_data.winner = self.monster.name  # Héros vaincu
+                    round_data.winner_side = 2
+
+            yield round_data
+
+    def to_dict(self, rounds="summary"):
+        data = self.header()
+        if rounds == "full":
+            data["rounds"] = [round_data.to_dict() for round_data in self.iter_rounds()]
+        return data
+
+
+def stream_json(data, rounds=None):
+    """
+    Encode une réponse en JSON compact morceau par morceau.
+    :param data: Dictionnaire sans le détail des tours
+    :param rounds: Itérable de tours (dataclasses) ajouté sous la clé "rounds"
+    """
+    if rounds is None:
+        yield _compact(data)
+        return
+    head = _compact(data)
+    yield head[:-1] + (',' if data else '') + '"rounds":['
+    for index, round_data in enumerate(rounds):
+        yield (',' if index else '') + _compact(round_data.to_dict())
+    yield ']}'
+
+
+def count_battle(mode, rounds):
+    """
+    Compte un combat et son nombre de tours (métriques).
+    Appelé par les routes et QuestEngine, pas par les moteurs : ils restent sans effet de bord.
+    """
+    metrics.inc('rpg_battles_total', (mode,))
+    metrics.observe('rpg_battle_rounds', rounds, (mode,))
+
+
+def ceil_div(a, b):
+    """Division entière arrondie au supérieur"""
+    return -(-a // b)
+
+
+def fight_hero_vs_monster(hero, monster):
+    """
+    Simule un combat entre un héros et un monstre.
+    Les dégâts étant fixes, l'issue est calculée directement (O(1)) ;
+    le détail des tours est reconstruit par QuestResult.iter_rounds().
+    """
+    # Calcul amélioré des dégâts en tenant compte de la défense (minimum 0)
+    result = QuestResult(
+        hero=hero,
+        monster=monster,
+        damage_to_monster=max(hero.attack - monster.attack // 4, 0),
+        damage_to_hero=max(monster.attack - hero.defense, 0),
+        hero_final_health=hero.health,
+        monster_final_health=monster.health
+    )
+
+    if hero.health <= 0 or monster.health <= 0:
+        return result
+
+    if result.damage_to_monster == 0 and result.damage_to_hero == 0:
+        # Aucun des deux ne peut blesser l'autre : combat sans issue
+        result.stalemate = True
+        return result
+
+    # Nombre d'attaques nécessaires à chacun pour vaincre l'autre
+    hero_hits = ceil_div(monster.health, result.damage_to_monster) if result.damage_to_monster else None
+    monster_hits = ceil_div(hero.health, result.damage_to_hero) if result.damage_to_hero else None
+
+    # Le héros frappe en premier à chaque tour
+    if monster_hits is None or (hero_hits is not None and hero_hits <= monster_hits):
+        result.round_count = hero_hits
+        result.winner = hero.name
+        result.hero_final_health -= (hero_hits - 1) * result.damage_to_hero
+    else:
+        result.round_count = monster_hits
+        result.winner = monster.name
+        result.hero_final_health -= monster_hits * result.damage_to_hero
+    result.monster_final_health -= result.round_count * result.damage_to_monster
+
+    return result
+
+
+def fight_logic(player1, player2, seed=None):
+    """
+    Logique de combat améliorée entre deux personnages.
+    :param seed: Graine du combat, pour le rejouer à l'identique (tirée si absente)
+    """
+    round = 1
+    result = VersusResult(player1, player2, seed=new_seed() if seed is None else seed)
+    rng = make_rng(result.seed)
+
+    # Copier les attributs pour éviter de modifier les objets originaux
+    player1_health = player1.health
+    player2_health = player2.health
+
+    while player1_health > 0 and player2_health > 0:
+        round_data = VersusRound(round, player1_health, player2_health)
+
+        # Déterminer l'initiative: qui attaque en premier
+        # Ajout d'un élément de hasard pour plus de variété
+        initiative_modifier = rng.randint(-2, 2)
+        player1_initiative = player1.attack + initiative_modifier
+        player2_initiative = player2.attack + initiative_modifier
+
+        if player1_initiative >= player2_initiative:
+            round_data.initiative = player1.name
+            round_data.initiative_side = 1
+
+            # Player 1 attaque Player 2
+            damage_to_player2 = max(player1.attack - player2.defense // 2, 0)
+            player2_health -= damage_to_player2
+            round_data.damage_to_player2 = damage_to_player2
+
+            if player2_health <= 0:
+                round_data.winner = result.winner = player1.name
+                round_data.winner_side = result.winner_side = 1
+                result.rounds.append(round_data)
+                break
+
+            # Player 2 riposte
+            damage_to_player1 = max(player2.attack - player1.defense // 2, 0)
+            player1_health -= damage_to_player1
+            round_data.damage_to_player1 = damage_to_player1
+
+        else:
+            round_data.initiative = player2.name
+            round_data.initiative_side = 2
+
+            # Player 2 attaque Player 1
+            damage_to_player1 = max(player2.attack - player1.defense // 2, 0)
+            player1_health -= damage_to_player1
+            round_data.damage_to_player1 = damage_to_player1
+
+            if player1_health <= 0:
+                round_data.winner = result.winner = player2.name
+                round_data.winner_side = result.winner_side = 2
+                result.rounds.append(round_data)
+                break
+
+            # Player 1 riposte
+            damage_to_player2 = max(player1.attack - player2.defense // 2, 0)
+            player2_health -= damage_to_player2
+            round_data.damage_to_player2 = damage_to_player2
+
+        result.rounds.append(round_data)
+        round += 1
+
+        # Limiter le nombre de tours pour éviter les combats sans fin
+        if round > 20:
+            # Déterminer un gagnant basé sur les PV restants en pourcentage
+            p1_health_percent = player1_health / player1.health
+            p2_health_percent = player2_health / player2.health
+
+            result.winner_side = 1 if p1_health_percent > p2_health_percent else 2
+            break
+
+    # S'assurer qu'un gagnant est déterminé
+    if result.winner_side is None:
+        result.winner_side = 2 if player1_health <= 0 else 1
+    result.winner = (player1 if result.winner_side == 1 else player2).name
+
+    return result
@@ -0,0 +1,195 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+from init_db import run_write_transaction
+from models.round_log import versus_summary
+
+# File d'attente bornée et regroupement des écritures de l'historique des combats
+BATTLE_LOG_QUEUE_SIZE = int(os.getenv('BATTLE_LOG_QUEUE_SIZE', 10000))
+BATTLE_LOG_BATCH_SIZE = int(os.getenv('BATTLE_LOG_BATCH_SIZE', 500))
+BATTLE_LOG_FLUSH_INTERVAL = float(os.getenv('BATTLE_LOG_FLUSH_INTERVAL', 0.5))
+# File pleine : 'drop' abandonne l'enregistrement, 'block' attend au plus BATTLE_LOG_BLOCK_TIMEOUT
+BATTLE_LOG_OVERFLOW = os.getenv('BATTLE_LOG_OVERFLOW', 'drop')
+BATTLE_LOG_BLOCK_TIMEOUT = float(os.getenv('BATTLE_LOG_BLOCK_TIMEOUT', 0.05))
+
+# Requêtes d'insertion par table d'historique : en-tête JSON, colonnes résumées
+# journal des tours encodé (voir models.round_log) et graine du combat
+INSERTS = {
+    'pvp_battles': '''
+        INSERT INTO pvp_battles (player1_id, player2_id, winner_id, battle_data,
+                                 round_count, damage_to_player1, damage_to_player2, round_log, seed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'completed_quests': '''
+        INSERT INTO completed_quests (character_id, quest_id, success, quest_data,
+                                      round_count, damage_to_hero, damage_to_monster, round_log, seed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+}
+
+# Marqueur d'arrêt du thread d'écriture
+_STOP = object()
+
+
+def versus_row(result):
+    """Ligne de pvp_battles pour un VersusResult (winner_id alimente aussi character_stats)"""
+    return (result.player1.id, result.player2.id, result.winner_id,
+            json.dumps(result.header()), *versus_summary(result), result.seed)
+
+
+class BattleLogWriter:
+    """
+    Écriture différée de l'historique des combats : les routes déposent les
+    enregistrements dans une file bornée, un thread les insère par lots
+    (executemany). La construction des lignes (JSON, encodage des tours)
+    est faite par ce thread.
+    """
+
+    def __init__(self, maxsize=BATTLE_LOG_QUEUE_SIZE, batch_size=BATTLE_LOG_BATCH_SIZE,
+                 flush_interval=BATTLE_LOG_FLUSH_INTERVAL, overflow=BATTLE_LOG_OVERFLOW,
+                 block_timeout=BATTLE_LOG_BLOCK_TIMEOUT):
+        """
+        :param maxsize: Nombre maximal d'enregistrements en attente
+        :param batch_size: Nombre maximal d'enregistrements par transaction
+        :param flush_interval: Attente maximale avant l'écriture d'un lot incomplet
+        :param overflow: Politique quand la file est pleine ('drop' ou 'block')
+        :param block_timeout: Attente maximale en mode 'block' avant abandon
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def submit(self, table, row):
+        """
+        Dépose un enregistrement sans attendre son écriture
+        :param table: 'pvp_battles' ou 'completed_quests'
+        :param row: Valeurs de INSERTS[table], ou fonction sans argument qui les construit
+        :return: False si l'enregistrement a été abandonné (file pleine)
+        """
+        self._ensure_started()
+        record = (table, row, time.monotonic())
+        try:
+            if self.overflow == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def log_versus(self, result):
+        """Enregistre un combat Versus (VersusResult)"""
+        return self.submit('pvp_battles', lambda: versus_row(result))
+
+    def flush(self, timeout=5):
+        """Attend que la file soit vide (au plus timeout secondes)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def stop(self, timeout=5):
+        """Écrit les enregistrements restants puis arrête le thread (arrêt du processus)"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "maxsize": self._queue.maxsize,
+                "overflow": self.overflow,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "lag_seconds": {"last": round(self.last_lag, 4), "max": round(self.max_lag, 4)}
+            }
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='battle-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            taken = 0
+            # Attendre un premier enregistrement, puis compléter le lot pendant flush_interval
+            record = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                taken += 1
+                if record is _STOP:
+                    stopping = True
+                else:
+                    batch.append(record)
+                try:
+                    if stopping:
+                        # Vider la file avant de s'arrêter
+                        record = self._queue.get_nowait()
+                    elif len(batch) < self.batch_size:
+                        record = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    else:
+                        break
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+
+    def _write(self, batch):
+        def insert_batch(cursor):
+            rows = {}
+            for table, row, _ in batch:
+                rows.setdefault(table, []).append(row() if callable(row) else row)
+            for table, table_rows in rows.items():
+                cursor.executemany(INSERTS[table], table_rows)
+
+        try:
+            run_write_transaction(insert_batch)
+        except Exception as e:
+            # Le thread d'écriture ne doit jamais s'arrêter sur une erreur
+            with self._lock:
+                self.failed += len(batch)
+            print(f"Historique des combats : {len(batch)} enregistrements perdus ({e})")
+            return
+
+        lag = time.monotonic() - min(enqueued_at for _, _, enqueued_at in batch)
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+
+battle_log = BattleLogWriter()
+atexit.register(battle_log.stop)
@@ -0,0 +1,252 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from init_db import get_db_connection, run_write_transaction
+from metrics import metrics
+from models.game import Item, Monster, Tableau
+from models.game_utils import GameStatus
+
+# Nombre de sessions gardées en mémoire et délai maximal avant écriture en base
+BOARD_CACHE_SIZE = int(os.getenv('BOARD_CACHE_SIZE', 1024))
+BOARD_FLUSH_INTERVAL = float(os.getenv('BOARD_FLUSH_INTERVAL', 5))
+
+
+def element_to_row(element):
+    """Convertit un élément du plateau en couple (element_type, element_data)"""
+    if isinstance(element, Item):
+        return 'item', json.dumps(element.to_dict())
+    if isinstance(element, Monster):
+        return 'enemy', json.dumps(element.to_dict())
+    return 'empty', None
+
+
+def element_from_row(element_type, element_data):
+    """Reconstruit un élément du plateau à partir de sa ligne en base"""
+    data = json.loads(element_data) if element_data else {}
+    if element_type == 'item':
+        return Item(data["name"], data["type"], data.get("effect"))
+    if element_type == 'enemy':
+        return Monster(data["name"], data["health"], data["attack"])
+    return None
+
+
+def board_status(tableau):
+    """Statut de la partie sous forme de chaîne"""
+    if tableau.is_completed:
+        return GameStatus.COMPLETED.value
+    if tableau.is_game_over:
+        return GameStatus.GAME_OVER.value
+    return GameStatus.IN_PROGRESS.value
+
+
+class BoardSessionStore:
+    """
+    Sessions de plateau persistées dans board_game_sessions / board_game_elements.
+    Les sessions actives restent en mémoire ; un tour sans effet en base
+    (déplacement seul) est écrit de manière différée. Un tour qui modifie
+    l'inventaire ou la santé est écrit aussitôt, avec la position et les cases
+    consommées, pour qu'un rechargement ne rejoue pas les objets ramassés.
+    """
+
+    def __init__(self, maxsize=BOARD_CACHE_SIZE, flush_interval=BOARD_FLUSH_INTERVAL):
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # Un seul chargement à la fois : deux requêtes ne créent pas deux Tableau d'une session
+        self._load_lock = threading.Lock()
+
+    def create(self, hero, length=20):
+        """Génère un plateau, le persiste une seule fois et le met en cache"""
+        tableau = Tableau(hero, length=length)
+
+        def insert_session(cursor):
+            cursor.execute('''
+                INSERT INTO board_game_sessions (character_id, current_position, board_length, seed, turn)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (hero.id, tableau.current_position, tableau.length, tableau.seed, tableau.turn))
+            session_id = cursor.lastrowid
+            # Seules les cases non vides sont stockées
+            elements = []
+            for position, element in enumerate(tableau.board):
+                element_type, element_data = element_to_row(element)
+                if element_type != 'empty':
+                    elements.append((session_id, position, element_type, element_data))
+            cursor.executemany('''
+                INSERT INTO board_game_elements (session_id, position, element_type, element_data)
+                VALUES (?, ?, ?, ?)
+            ''', elements)
+            return session_id
+
+        self._track(tableau, run_write_transaction(insert_session), hero.id)
+        self._remember(tableau)
+        return tableau
+
+    def get(self, session_id, hero):
+        """Retourne la session depuis le cache ou la base, None si introuvable ou non autorisée"""
+        with self._lock:
+            tableau = self._sessions.get(session_id)
+            if tableau is not None:
+                self._sessions.move_to_end(session_id)
+        if tableau is None:
+            with self._load_lock:
+                with self._lock:
+                    tableau = self._sessions.get(session_id)
+                if tableau is None:
+                    tableau = self._load(session_id, hero)
+                    if tableau is None:
+                        return None
+                    self._remember(tableau)
+        if tableau.character_id != hero.id:
+            return None
+        # Toujours jouer avec les statistiques à jour du héros
+        tableau.hero = hero
+        return tableau
+
+    def latest_in_progress(self, character_id):
+        """Identifiant de la dernière session en cours du personnage"""
+        with self._lock:
+            for tableau in reversed(self._sessions.values()):
+                if tableau.character_id == character_id and board_status(tableau) == GameStatus.IN_PROGRESS.value:
+                    return tableau.session_id
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id FROM board_game_sessions
+            WHERE character_id = ? AND is_completed = 0 AND is_game_over = 0
+            ORDER BY id DESC LIMIT 1
+        ''', (character_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        return row['id'] if row else None
+
+    def play(self, tableau):
+        """Joue un tour et planifie l'écriture des changements"""
+        with tableau.lock:
+            turn_result = tableau.play_turn()
+            metrics.inc('rpg_board_turns_total')
+            tableau.dirty = True
+            # Les fins de partie et les tours qui écrivent en base sont enregistrés immédiatement
+            force = tableau.is_completed or tableau.is_game_over or bool(tableau.pending_writes)
+            try:
+                self.save(tableau, force=force)
+            except Exception:
+                # La session en mémoire est en avance sur la base : elle sera rechargée
+                self._forget(tableau)
+                raise
+        self.flush_stale()
+        return turn_result
+
+    def save(self, tableau, force=False):
+        """Écrit la session si elle est modifiée et que le délai est écoulé (ou si forcé)"""
+        if not tableau.dirty:
+            return
+        if not force and time.monotonic() - tableau.last_flush < self.flush_interval:
+            return
+        changed_positions = list(tableau.changed_positions)
+        pending_writes = list(tableau.pending_writes)
+
+        def write_session(cursor):
+            for write in pending_writes:
+                write(cursor)
+            cursor.execute('''
+                UPDATE board_game_sessions
+                SET current_position = ?, is_completed = ?, is_game_over = ?,
+                    seed = ?, turn = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (tableau.current_position, int(tableau.is_completed),
+                  int(tableau.is_game_over), tableau.seed, tableau.turn, tableau.session_id))
+            cursor.executemany('''
+                UPDATE board_game_elements SET is_consumed = 1
+                WHERE session_id = ? AND position = ?
+            ''', [(tableau.session_id, position) for position in changed_positions])
+
+        run_write_transaction(write_session)
+        del tableau.changed_positions[:len(changed_positions)]
+        del tableau.pending_writes[:len(pending_writes)]
+        tableau.dirty = False
+        tableau.last_flush = time.monotonic()
+
+    def flush_stale(self):
+        """Écrit les sessions modifiées dont le délai d'écriture différée est écoulé"""
+        with self._lock:
+            sessions = [t for t in self._sessions.values() if t.dirty]
+        for tableau in sessions:
+            if tableau.lock.acquire(blocking=False):
+                try:
+                    self.save(tableau)
+                finally:
+                    tableau.lock.release()
+
+    def flush_all(self):
+        """Écrit toutes les sessions modifiées (arrêt du processus)"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for tableau in sessions:
+            with tableau.lock:
+                self.save(tableau, force=True)
+
+    def _remember(self, tableau):
+        evicted = []
+        with self._lock:
+            self._sessions[tableau.session_id] = tableau
+            self._sessions.move_to_end(tableau.session_id)
+            while len(self._sessions) > self.maxsize:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            with old.lock:
+                self.save(old, force=True)
+
+    def _forget(self, tableau):
+        with self._lock:
+            if self._sessions.get(tableau.session_id) is tableau:
+                del self._sessions[tableau.session_id]
+
+    def _load(self, session_id, hero):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM board_game_sessions WHERE id = ?', (session_id,))
+        session = cursor.fetchone()
+        if not session:
+            cursor.close()
+            conn.close()
+            return None
+        cursor.execute('''
+            SELECT position, element_type, element_data FROM board_game_elements
+            WHERE session_id = ? AND is_consumed = 0
+        ''', (session_id,))
+        elements = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        board = [None] * session['board_length']
+        for element in elements:
+            if 0 <= element['position'] < len(board):
+                board[element['position']] = element_from_row(element['element_type'], element['element_data'])
+
+        # Les sessions créées avant l'enregistrement des graines en reçoivent une
+        tableau = Tableau(hero, length=session['board_length'], board=board,
+                          seed=session['seed'], turn=session['turn'])
+        tableau.current_position = session['current_position']
+        tableau.is_completed = bool(session['is_completed'])
+        tableau.is_game_over = bool(session['is_game_over'])
+        self._track(tableau, session['id'], session['character_id'])
+        return tableau
+
+    @staticmethod
+    def _track(tableau, session_id, character_id):
+        """Attache au plateau les informations de suivi de la session"""
+        tableau.session_id = session_id
+        tableau.character_id = character_id
+        tableau.last_flush = time.monotonic()
+        tableau.dirty = False
+        tableau.lock = threading.Lock()
+
+
+board_sessions = BoardSessionStore()
+atexit.register(board_sessions.flush_all)
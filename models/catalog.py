@@ -0,0 +1,161 @@
+import json
+import os
+import signal
+import threading
+import time
+
+from cache import make_etag
+from init_db import get_db_connection
+
+# Délai entre deux vérifications de la version du catalogue en base
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', 5))
+
+# Types des objets du plateau -> noms des types d'objets en base
+BOARD_ITEM_TYPES = {
+    "healing": "potion",
+    "weapon": "arme",
+    "armor": "armure",
+}
+DEFAULT_ITEM_TYPE = "potion"
+
+# Champs d'une quête exposés par l'API
+QUEST_FIELDS = ('id', 'name', 'difficulty', 'description', 'recommended_level')
+
+
+class CatalogSnapshot:
+    """Contenu du catalogue à un instant donné (jamais modifié après construction)"""
+
+    __slots__ = ('version', 'item_types', 'type_names', 'type_ids', 'item_types_etag',
+                 'quests', 'quest_list', 'quests_etag')
+
+    def __init__(self, version, item_types, quests):
+        self.version = version
+        self.item_types = [{"id": row['id'], "name": row['type_name']} for row in item_types]
+        self.type_names = {row['id']: row['type_name'] for row in item_types}
+        self.type_ids = {row['type_name']: row['id'] for row in item_types}
+        self.item_types_etag = make_etag('item_types', self.item_types)
+
+        self.quests = {}
+        for row in quests:
+            quest = dict(row)
+            # monster_data est décodé une seule fois au chargement
+            quest['monster'] = json.loads(row['monster_data']) if row['monster_data'] else None
+            del quest['monster_data']
+            self.quests[quest['id']] = quest
+        self.quest_list = [{field: quest[field] for field in QUEST_FIELDS} for quest in self.quests.values()]
+        self.quests_etag = make_etag('quests', self.quest_list)
+
+
+class Catalog:
+    """
+    Catalogue en lecture seule des types d'objets et des quêtes, gardé en mémoire.
+    Il est rechargé quand la version en base change (voir la migration 3),
+    ou à la demande (invalidate, signal SIGHUP).
+    """
+
+    def __init__(self, check_interval=CATALOG_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._stale = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def load(self):
+        """Charge (ou recharge) le catalogue depuis la base"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+        row = cursor.fetchone()
+        cursor.execute('SELECT id, type_name FROM item_types ORDER BY id')
+        item_types = cursor.fetchall()
+        cursor.execute('SELECT * FROM quests ORDER BY id')
+        quests = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        snapshot = CatalogSnapshot(row['version'] if row else 0, item_types, quests)
+        with self._lock:
+            self._snapshot = snapshot
+            self._stale = False
+            self._checked_at = time.monotonic()
+            self.reloads += 1
+        return snapshot
+
+    def invalidate(self):
+        """Force le rechargement au prochain accès"""
+        self._stale = True
+
+    def snapshot(self):
+        """Catalogue courant, rechargé si nécessaire"""
+        snapshot = self._snapshot
+        if snapshot is None or self._stale:
+            return self.load()
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self._checked_at = time.monotonic()
+            if self._database_version() != snapshot.version:
+                return self.load()
+        return snapshot
+
+    def _database_version(self):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        return row['version'] if row else 0
+
+    # Types d'objets
+
+    def item_types(self):
+        return self.snapshot().item_types
+
+    def type_name(self, type_id):
+        """Nom d'un type d'objet (identifiant entier ou texte numérique), None s'il n'existe pas"""
+        try:
+            type_id = int(type_id)
+        except (TypeError, ValueError):
+            return None
+        return self.snapshot().type_names.get(type_id)
+
+    def type_id(self, type_name):
+        """Identifiant d'un type d'objet à partir de son nom, None s'il n'existe pas"""
+        return self.snapshot().type_ids.get(type_name)
+
+    def board_item_type_id(self, item_type):
+        """Type d'objet en base correspondant au type d'un objet du plateau"""
+        type_ids = self.snapshot().type_ids
+        return type_ids.get(BOARD_ITEM_TYPES.get(item_type), type_ids.get(DEFAULT_ITEM_TYPE))
+
+    # Quêtes
+
+    def quest(self, quest_id):
+        """Définition complète d'une quête (monstre décodé inclus), None si inconnue"""
+        return self.snapshot().quests.get(quest_id)
+
+    def quest_list(self):
+        return self.snapshot().quest_list
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "item_types": len(snapshot.item_types) if snapshot else 0,
+            "quests": len(snapshot.quests) if snapshot else 0,
+            "reloads": self.reloads
+        }
+
+    def install_reload_signal(self, signum=getattr(signal, 'SIGHUP', None)):
+        """Recharge le catalogue à la réception du signal (SIGHUP par défaut)"""
+        if signum is None:
+            return False
+        try:
+            signal.signal(signum, lambda *args: self.invalidate())
+        except ValueError:
+            # Hors du thread principal : pas de gestionnaire de signal possible
+            return False
+        return True
+
+
+catalog = Catalog()
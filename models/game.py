@@ -1,7 +1,9 @@
 from enum import Enum
-import random
 
 from init_db import get_db_connection
+from models.catalog import catalog
+from models.inventory import InventoryService
+from models.rng import derive_rng, new_seed
 
 
 class Race(Enum):
@@ -10,8 +12,59 @@ class Race(Enum):
     WEREWOLF = "Loup-Garou"
 
 
+class RowMapper:
+    """
+    Construit un modèle à partir d'une ligne SQL par accès positionnel.
+    Les colonnes sont sélectionnées dans l'ordre des arguments du constructeur
+    et les conversions (ex. nom de race -> Race) sont résolues une seule fois.
+    """
+
+    def __init__(self, model, columns, converters=None):
+        """
+        :param model: Classe à instancier
+        :param columns: Colonnes SQL, dans l'ordre des arguments du constructeur
+        :param converters: Dictionnaire colonne -> fonction de conversion
+        """
+        self.model = model
+        self.columns = tuple(columns)
+        self.select = ', '.join(self.columns)
+        self._conversions = tuple(
+            (self.columns.index(column), convert) for column, convert in (converters or {}).items()
+        )
+
+    def __call__(self, row):
+        if row is None:
+            return None
+        if not self._conversions:
+            return self.model(*row)
+        values = list(row)
+        for index, convert in self._conversions:
+            values[index] = convert(values[index])
+        return self.model(*values)
+
+    def all(self, rows):
+        return [self(row) for row in rows]
+
+
+# Registre des mappers ligne -> objet, indexé par classe
+ROW_MAPPERS = {}
+
+
+def register_row_mapper(model, columns, **converters):
+    """Déclare le mapper d'un modèle et l'attache à la classe (model.ROW)"""
+    mapper = ROW_MAPPERS[model] = model.ROW = RowMapper(model, columns, converters)
+    return mapper
+
+
 class Character:
-    def __init__(self, id, name, race, character_type, health, attack, defense, level=1):
+    __slots__ = ('id', 'name', 'race', 'type', 'health', 'attack', 'defense', 'level', 'experience', 'version')
+
+    # Sous-ensembles de champs de to_dict utilisés par les routes
+    STATS_FIELDS = ('id', 'name', 'level', 'health', 'attack', 'defense')
+    PROFILE_FIELDS = STATS_FIELDS + ('race', 'class')
+
+    def __init__(self, id, name, race, character_type, health, attack, defense, level=1, experience=0,
+                 version=1):
         self.id = id
         self.name = name
         self.race = race
@@ -20,51 +73,56 @@ class Character:
         self.attack = attack
         self.defense = defense
         self.level = level
+        self.experience = experience
+        # Incrémentée en base à chaque modification (voir la migration 2)
+        self.version = version
+
+    def to_dict(self, fields=None):
+        """
+        Représentation JSON du personnage
+        :param fields: Champs à conserver (tous par défaut)
+        """
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "race": self.race.value,
+            "class": self.type,
+            "level": self.level,
+            "health": self.health,
+            "attack": self.attack,
+            "defense": self.defense,
+            "experience": self.experience
+        }
+        if fields is None:
+            return data
+        return {field: data[field] for field in fields}
 
     @staticmethod
     def get_all_by_user(user_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM characters WHERE user_id = ?', (user_id,))
+        cursor.execute(f'SELECT {Character.ROW.select} FROM characters WHERE user_id = ?', (user_id,))
         characters = cursor.fetchall()
         cursor.close()
         conn.close()
 
-        return [Character(
-            id=char['id'],
-            name=char['name'],
-            race=Race[char['race']],
-            character_type=char['class'],
-            health=char['health'],
-            attack=char['attack'],
-            defense=char['defense'],
-            level=char['level']
-        ) for char in characters]
+        return Character.ROW.all(characters)
 
     @staticmethod
     def get_by_id(character_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM characters WHERE id = ?', (character_id,))
+        cursor.execute(f'SELECT {Character.ROW.select} FROM characters WHERE id = ?', (character_id,))
         char = cursor.fetchone()
         cursor.close()
         conn.close()
 
-        if char:
-            return Character(
-                id=char['id'],
-                name=char['name'],
-                race=Race[char['race']],
-                character_type=char['class'],
-                health=char['health'],
-                attack=char['attack'],
-                defense=char['defense'],
-                level=char['level']
-            )
-        return None
+        return Character.ROW(char)
 
 
 class Warrior(Character):
+    __slots__ = ()
+
     def __init__(self, name, race, id=None):
         # Stats de base
         base_health = 100
@@ -110,6 +168,8 @@ class Warrior(Character):
 
 
 class Mage(Character):
+    __slots__ = ()
+
     def __init__(self, name, race, id=None):
         # Stats de base
         base_health = 100
@@ -155,47 +215,71 @@ class Mage(Character):
 
 
 class Item:
+    __slots__ = ('name', 'type', 'effect')
+
     def __init__(self, name, item_type, effect=None):
         self.name = name
         self.type = item_type
         self.effect = effect
 
+    def to_dict(self):
+        return {"name": self.name, "type": self.type, "effect": self.effect}
+
     @staticmethod
     def get_by_character(character_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM character_items WHERE character_id = ?', (character_id,))
+        cursor.execute(f'SELECT {Item.ROW.select} FROM character_items WHERE character_id = ?', (character_id,))
         items = cursor.fetchall()
         cursor.close()
         conn.close()
 
-        return [Item(
-            name=item['name'],
-            item_type=item['type'],
-            effect=item['effect']
-        ) for item in items]
+        return Item.ROW.all(items)
 
 
 class Monster:
+    __slots__ = ('name', 'health', 'attack')
+
     def __init__(self, name, health, attack):
         self.name = name
         self.health = health
         self.attack = attack
 
+    def to_dict(self):
+        return {"name": self.name, "health": self.health, "attack": self.attack}
+
+
+register_row_mapper(
+    Character,
+    ('id', 'name', 'race', 'class', 'health', 'attack', 'defense', 'level', 'experience', 'version'),
+    race=Race.__members__.__getitem__
+)
+register_row_mapper(Item, ('name', 'type', 'effect'))
+
 
 class Tableau:
-    def __init__(self, hero, length=20):
+    def __init__(self, hero, length=20, board=None, seed=None, turn=0):
         """
         Initialise le jeu de plateau
         :param hero: Le héros qui joue
         :param length: Longueur du plateau (par défaut 20)
+        :param board: Plateau existant à restaurer (généré si absent)
+        :param seed: Graine de la session : plateau et lancers de dé en dépendent (tirée si absente)
+        :param turn: Nombre de tours déjà joués (session restaurée)
         """
         self.hero = hero
         self.length = length
-        self.board = self._generate_board()
+        self.seed = new_seed() if seed is None else seed
+        self.turn = turn
+        self.board = board if board is not None else self._generate_board()
         self.current_position = 1
         self.is_completed = False
         self.is_game_over = False
+        # Positions dont l'élément a été consommé depuis la dernière sauvegarde
+        self.changed_positions = []
+        # Écritures du tour en cours (inventaire, santé), appliquées par BoardSessionStore.play
+        # dans la même transaction que la position et les cases consommées
+        self.pending_writes = []
 
     def _generate_board(self):
         """
@@ -205,9 +289,10 @@ class Tableau:
         - Item (objet)
         - Enemy (ennemi)
         """
+        rng = derive_rng(self.seed, 'board')
         board = []
         for _ in range(self.length):
-            element_type = random.choices(
+            element_type = rng.choices(
                 ['empty', 'item', 'enemy'],
                 weights=[0.5, 0.25, 0.25]
             )[0]
@@ -220,14 +305,14 @@ class Tableau:
                 epee = Item("Épée rouillée", "weapon", "+5 att")
                 bouclier = Item("Bouclier en bois", "armor", "+5 def")
                 possible_items = [potion, epee, bouclier]
-                board.append(random.choice(possible_items))
+                board.append(rng.choice(possible_items))
             elif element_type == 'enemy':
                 # Générer un ennemi aléatoire
                 enemy_races = ["Gobelin", "Squelette", "Zombie", "Bandit"]
                 enemy = Monster(
-                    random.choice(enemy_races),
-                    random.randint(30, 50),
-                    random.randint(5, 15)
+                    rng.choice(enemy_races),
+                    rng.randint(30, 50),
+                    rng.randint(5, 15)
                 )
                 board.append(enemy)
 
@@ -236,7 +321,9 @@ class Tableau:
     def play_turn(self):
         """Joue un tour sur le plateau"""
         output = ""
-        dice_roll = random.randint(1, 6)
+        # Chaque tour a son propre générateur : une session restaurée rejoue les mêmes lancers
+        dice_roll = derive_rng(self.seed, 'turn', self.turn).randint(1, 6)
+        self.turn += 1
         output += f"{self.hero.name} lance {dice_roll}\n"
 
         # Déplacer le héros sans dépasser la longueur du plateau
@@ -266,6 +353,7 @@ class Tableau:
             
             # Supprimer l'objet du plateau après l'avoir ramassé
             self.board[self.current_position] = None
+            self.changed_positions.append(self.current_position)
         elif isinstance(current_element, Monster):
             output += f"Ennemi rencontré : {current_element.name}\n"
             # Logique de combat
@@ -281,47 +369,15 @@ class Tableau:
     
     def _add_item_to_inventory(self, item):
         """
-        Ajoute un objet à l'inventaire du personnage
+        Ajoute un objet à l'inventaire du personnage (écriture en attente, voir pending_writes)
         """
-        from init_db import get_db_connection
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Déterminer le type_id basé sur le type d'objet
-        type_mapping = {
-            "healing": 1,  # Potion
-            "weapon": 3,   # Arme
-            "armor": 5,    # Armure
-        }
-        
-        type_id = type_mapping.get(item.type, 1)
-        
-        # Vérifier si l'objet existe déjà dans l'inventaire
-        cursor.execute('''
-            SELECT * FROM inventory 
-            WHERE character_id = ? AND name = ? AND type_id = ?
-        ''', (self.hero.id, item.name, type_id))
-        
-        existing_item = cursor.fetchone()
+        type_id = catalog.board_item_type_id(item.type)
+        hero_id = self.hero.id
         
-        if existing_item:
-            # Mettre à jour la quantité
-            cursor.execute('''
-                UPDATE inventory 
-                SET quantity = quantity + 1 
-                WHERE id = ?
-            ''', (existing_item['id'],))
-        else:
-            # Ajouter un nouvel objet
-            cursor.execute('''
-                INSERT INTO inventory (character_id, name, type_id, quantity) 
-                VALUES (?, ?, ?, ?)
-            ''', (self.hero.id, item.name, type_id, 1))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Empiler l'objet en une seule requête (INSERT ... ON CONFLICT)
+        self.pending_writes.append(
+            lambda cursor: InventoryService.grant_many(hero_id, [(item.name, type_id, 1)], cursor=cursor))
 
     def battle(self, monster):
         """
@@ -368,19 +424,11 @@ class Tableau:
     
     def _update_hero_health(self):
         """
-        Met à jour la santé du héros dans la base de données
+        Met à jour la santé du héros dans la base de données (écriture en attente, voir pending_writes)
         """
-        from init_db import get_db_connection
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        health, hero_id = self.hero.health, self.hero.id
+        self.pending_writes.append(lambda cursor: cursor.execute('''
             UPDATE characters 
             SET health = ? 
             WHERE id = ?
-        ''', (self.hero.health, self.hero.id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        ''', (health, hero_id)))
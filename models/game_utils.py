@@ -1,7 +1,8 @@
 import json
-import random
 from enum import Enum
-from init_db import get_db_connection
+from models.battle_log import battle_log
+from models.rng import thread_rng
+from models.round_log import QUEST, VERSUS, summary_from_dicts
 
 class GameStatus(Enum):
     """Statut possible pour une session de jeu"""
@@ -49,19 +50,23 @@ class CombatManager:
     """Gère les mécaniques de combat"""
     
     @staticmethod
-    def calculate_damage(attacker, defender):
-        """Calcule les dégâts infligés par l'attaquant au défenseur"""
+    def calculate_damage(attacker, defender, rng=None):
+        """
+        Calcule les dégâts infligés par l'attaquant au défenseur
+        :param rng: Générateur aléatoire (random.Random) ; celui du thread si absent
+        """
+        rng = rng or thread_rng()
         base_damage = max(attacker.attack - defender.defense, 0)
         
         # 10% de chance de coup critique (dégâts doublés)
-        if random.random() < 0.1:
+        if rng.random() < 0.1:
             base_damage *= 2
             critical = True
         else:
             critical = False
             
         # Variation aléatoire des dégâts (+/- 20%)
-        damage_variation = random.uniform(0.8, 1.2)
+        damage_variation = rng.uniform(0.8, 1.2)
         final_damage = round(base_damage * damage_variation)
         
         return {
@@ -71,43 +76,53 @@ class CombatManager:
     
     @staticmethod
     def log_battle(battle_data, character_id=None, battle_type="pvp"):
-        """Enregistre les détails d'un combat dans la base de données"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
+        """
+        Enregistre les détails d'un combat dans la base de données.
+        L'écriture est différée (voir models.battle_log) : aucune latence pour l'appelant.
+        """
         if battle_type == "pvp":
             player1_id = battle_data.get("players", {}).get("player1", {}).get("id")
             player2_id = battle_data.get("players", {}).get("player2", {}).get("id")
-            winner_id = player1_id if battle_data.get("winner") == battle_data.get("players", {}).get("player1", {}).get("name") else player2_id
+            winner_id = battle_data.get("winner_id")
+            if winner_id is None:
+                # Anciens en-têtes sans winner_id : le vainqueur n'est connu que par son nom
+                winner_id = player1_id if battle_data.get("winner") == battle_data.get("players", {}).get("player1", {}).get("name") else player2_id
             
-            cursor.execute('''
-                INSERT INTO pvp_battles (player1_id, player2_id, winner_id, battle_data)
-                VALUES (?, ?, ?, ?)
-            ''', (player1_id, player2_id, winner_id, json.dumps(battle_data)))
+            names = tuple(battle_data.get("players", {}).get(player, {}).get("name") for player in ("player1", "player2"))
+            return battle_log.submit('pvp_battles', lambda: (
+                player1_id, player2_id, winner_id, *CombatManager._encode_battle(battle_data, VERSUS, names),
+                battle_data.get("seed")))
         elif battle_type == "quest" and character_id:
             quest_id = battle_data.get("quest_id")
             success = 1 if battle_data.get("winner") == battle_data.get("hero", {}).get("name") else 0
             
-            cursor.execute('''
-                INSERT INTO completed_quests (character_id, quest_id, success, quest_data)
-                VALUES (?, ?, ?, ?)
-            ''', (character_id, quest_id, success, json.dumps(battle_data)))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            names = (battle_data.get("hero", {}).get("name"), battle_data.get("monster", {}).get("name"))
+            return battle_log.submit('completed_quests', lambda: (
+                character_id, quest_id, success, *CombatManager._encode_battle(battle_data, QUEST, names),
+                battle_data.get("seed")))
+        return False
+    
+    @staticmethod
+    def _encode_battle(battle_data, kind, names):
+        """En-tête JSON sans les tours, colonnes résumées et journal des tours encodé"""
+        header = {key: value for key, value in battle_data.items() if key != "rounds"}
+        return (json.dumps(header), *summary_from_dicts(kind, battle_data.get("rounds"), names))
 
 class RewardManager:
     """Gère les récompenses de quêtes et d'événements"""
     
     @staticmethod
-    def generate_random_item(level=1, item_type=None):
-        """Génère un objet aléatoire basé sur le niveau"""
+    def generate_random_item(level=1, item_type=None, rng=None):
+        """
+        Génère un objet aléatoire basé sur le niveau
+        :param rng: Générateur aléatoire (random.Random) ; celui du thread si absent
+        """
+        rng = rng or thread_rng()
         # Types d'objets possibles
         possible_types = ["weapon", "armor", "potion", "accessory"]
         
         if not item_type:
-            item_type = random.choice(possible_types)
+            item_type = rng.choice(possible_types)
         
         # Préfixes et suffixes pour la génération de noms
         prefixes = {
@@ -122,16 +137,16 @@ class RewardManager:
         
         # Effets basés sur le type
         effects = {
-            "weapon": [f"+{level * 2 + random.randint(1, 5)} atk", f"+{level + random.randint(1, 3)} def"],
-            "armor": [f"+{level + random.randint(1, 5)} def", f"+{level * 2} hp"],
-            "potion": [f"+{level * 10 + random.randint(5, 15)} hp", f"+{level * 2} atk temporaire"],
+            "weapon": [f"+{level * 2 + rng.randint(1, 5)} atk", f"+{level + rng.randint(1, 3)} def"],
+            "armor": [f"+{level + rng.randint(1, 5)} def", f"+{level * 2} hp"],
+            "potion": [f"+{level * 10 + rng.randint(5, 15)} hp", f"+{level * 2} atk temporaire"],
             "accessory": [f"+{level} à toutes les stats", f"+{level * 3} chance", f"+{level * 2} vitesse"]
         }
         
         # Générer le nom
-        prefix = random.choice(prefixes.get(item_type, ["Objet"]))
-        quality = random.choice(qualities) if random.random() < 0.7 else ""
-        material = random.choice(materials) if random.random() < 0.5 else ""
+        prefix = rng.choice(prefixes.get(item_type, ["Objet"]))
+        quality = rng.choice(qualities) if rng.random() < 0.7 else ""
+        material = rng.choice(materials) if rng.random() < 0.5 else ""
         
         parts = [prefix]
         if quality:
@@ -140,7 +155,7 @@ class RewardManager:
             parts.append(material)
             
         name = " ".join(parts)
-        effect = random.choice(effects.get(item_type, [f"+{level} à une stat aléatoire"]))
+        effect = rng.choice(effects.get(item_type, [f"+{level} à une stat aléatoire"]))
         
         return {
             "name": name,
@@ -150,28 +165,46 @@ class RewardManager:
         }
     
     @staticmethod
-    def award_quest_completion(character, quest_difficulty, quest_xp):
-        """Attribue les récompenses pour la complétion d'une quête"""
-        # Ajouter de l'XP
-        character.add_experience(quest_xp)
-        
-        # Générer un objet aléatoire comme récompense
-        item = RewardManager.generate_random_item(level=quest_difficulty)
-        
-        # Ajouter l'objet à l'inventaire du personnage
-        from models.game import Item
-        item_id = Item.add_to_character(
-            character.id,
-            item["name"],
-            item["type"],
-            item["effect"]
-        )
+    def award_quest_completion(cursor, character, quest_difficulty, quest_xp, rng=None):
+        """
+        Attribue les récompenses pour la complétion d'une quête
+        :param cursor: Curseur d'une transaction en cours
+        :param character: Personnage récompensé
+        :param quest_difficulty: Difficulté de la quête (niveau de l'objet généré)
+        :param quest_xp: Expérience gagnée
+        :param rng: Générateur de l'objet offert (random.Random)
+        """
+        # Ajouter de l'XP à partir des valeurs lues dans la transaction
+        cursor.execute('SELECT experience, level FROM characters WHERE id = ?', (character.id,))
+        char_data = cursor.fetchone()
+        new_xp = (char_data['experience'] or 0) + quest_xp
         
         # Déterminer si le personnage a monté de niveau
-        level_before = LevelManager.level_from_xp(character.experience - quest_xp)
-        level_after = LevelManager.level_from_xp(character.experience)
+        level_before = char_data['level']
+        level_after = max(LevelManager.level_from_xp(new_xp), level_before)
         leveled_up = level_after > level_before
         
+        if leveled_up:
+            # Augmenter les statistiques en fonction de la classe
+            bonus = LevelManager.stats_increase_for_level(character.type, level_after - level_before)
+            cursor.execute('''
+                UPDATE characters
+                SET level = ?, experience = ?,
+                    attack = attack + ?, defense = defense + ?,
+                    health = MIN(health + ?, 100)
+                WHERE id = ?
+            ''', (level_after, new_xp, bonus['attack'], bonus['defense'], bonus['health'], character.id))
+        else:
+            cursor.execute('UPDATE characters SET experience = ? WHERE id = ?', (new_xp, character.id))
+        
+        # Générer un objet aléatoire comme récompense et l'ajouter aux objets du personnage
+        item = RewardManager.generate_random_item(level=quest_difficulty, rng=rng)
+        cursor.execute('''
+            INSERT INTO character_items (character_id, name, type, effect)
+            VALUES (?, ?, ?, ?)
+        ''', (character.id, item["name"], item["type"], item["effect"]))
+        item_id = cursor.lastrowid
+        
         return {
             "xp_gained": quest_xp,
             "level_up": leveled_up,
@@ -188,34 +221,38 @@ class GameEventManager:
     """Gère les événements aléatoires du jeu"""
     
     @staticmethod
-    def generate_random_event(character, event_type=None, difficulty=1):
-        """Génère un événement aléatoire"""
+    def generate_random_event(character, event_type=None, difficulty=1, rng=None):
+        """
+        Génère un événement aléatoire
+        :param rng: Générateur aléatoire (random.Random) ; celui du thread si absent
+        """
+        rng = rng or thread_rng()
         possible_events = ["combat", "treasure", "trap", "merchant", "rest"]
         
         if not event_type:
-            event_type = random.choice(possible_events)
+            event_type = rng.choice(possible_events)
         
         if event_type == "combat":
-            return GameEventManager._generate_combat_event(character, difficulty)
+            return GameEventManager._generate_combat_event(character, difficulty, rng)
         elif event_type == "treasure":
-            return GameEventManager._generate_treasure_event(character, difficulty)
+            return GameEventManager._generate_treasure_event(character, difficulty, rng)
         elif event_type == "trap":
-            return GameEventManager._generate_trap_event(character, difficulty)
+            return GameEventManager._generate_trap_event(character, difficulty, rng)
         elif event_type == "merchant":
-            return GameEventManager._generate_merchant_event(character, difficulty)
+            return GameEventManager._generate_merchant_event(character, difficulty, rng)
         elif event_type == "rest":
-            return GameEventManager._generate_rest_event(character, difficulty)
+            return GameEventManager._generate_rest_event(character, difficulty, rng)
         else:
             return {"type": "unknown", "description": "Un événement mystérieux se produit..."}
     
     @staticmethod
-    def _generate_combat_event(character, difficulty):
+    def _generate_combat_event(character, difficulty, rng):
         """Génère un événement de combat"""
         enemy_types = ["bandit", "gobelin", "squelette", "loup", "troll"]
-        enemy_type = random.choice(enemy_types)
+        enemy_type = rng.choice(enemy_types)
         
-        enemy_health = 20 + (difficulty * 10) + random.randint(-5, 10)
-        enemy_attack = 5 + (difficulty * 2) + random.randint(-2, 4)
+        enemy_health = 20 + (difficulty * 10) + rng.randint(-5, 10)
+        enemy_attack = 5 + (difficulty * 2) + rng.randint(-2, 4)
         
         return {
             "type": "combat",
@@ -228,10 +265,10 @@ class GameEventManager:
         }
     
     @staticmethod
-    def _generate_treasure_event(character, difficulty):
+    def _generate_treasure_event(character, difficulty, rng):
         """Génère un événement de trésor"""
-        item = RewardManager.generate_random_item(level=difficulty)
-        gold = 10 * difficulty + random.randint(1, 20)
+        item = RewardManager.generate_random_item(level=difficulty, rng=rng)
+        gold = 10 * difficulty + rng.randint(1, 20)
         
         return {
             "type": "treasure",
@@ -243,12 +280,12 @@ class GameEventManager:
         }
     
     @staticmethod
-    def _generate_trap_event(character, difficulty):
+    def _generate_trap_event(character, difficulty, rng):
         """Génère un événement de piège"""
         trap_types = ["fosse", "fléchettes", "gaz toxique", "explosion", "filet"]
-        trap_type = random.choice(trap_types)
+        trap_type = rng.choice(trap_types)
         
-        damage = 5 + (difficulty * 3) + random.randint(0, 5)
+        damage = 5 + (difficulty * 3) + rng.randint(0, 5)
         
         return {
             "type": "trap",
@@ -260,14 +297,14 @@ class GameEventManager:
         }
     
     @staticmethod
-    def _generate_merchant_event(character, difficulty):
+    def _generate_merchant_event(character, difficulty, rng):
         """Génère un événement de marchand"""
         items_for_sale = []
         
         # Générer 3 objets à vendre
         for _ in range(3):
-            item = RewardManager.generate_random_item(level=difficulty)
-            item["price"] = 20 * difficulty + random.randint(5, 20)
+            item = RewardManager.generate_random_item(level=difficulty, rng=rng)
+            item["price"] = 20 * difficulty + rng.randint(5, 20)
             items_for_sale.append(item)
         
         return {
@@ -280,7 +317,7 @@ class GameEventManager:
         }
     
     @staticmethod
-    def _generate_rest_event(character, difficulty):
+    def _generate_rest_event(character, difficulty, rng):
         """Génère un événement de repos"""
         health_recovery = 10 + (difficulty * 2)
         
@@ -0,0 +1,87 @@
+import json
+
+from init_db import get_db_connection
+from models.round_log import RoundLogError, decode_rounds
+
+# Taille maximale d'une page d'historique
+HISTORY_MAX_PAGE_SIZE = 100
+
+# Requêtes par type de combat : combats impliquant un des personnages de l'utilisateur
+HISTORY_QUERIES = {
+    'versus': '''
+        SELECT id, player1_id, player2_id, winner_id, battle_data AS data,
+               round_count, damage_to_player1, damage_to_player2, round_log, seed, created_at
+        FROM pvp_battles
+        WHERE (player1_id IN (SELECT id FROM characters WHERE user_id = :user_id)
+               OR player2_id IN (SELECT id FROM characters WHERE user_id = :user_id))
+          AND id < :before
+        ORDER BY id DESC
+        LIMIT :limit
+    ''',
+    'quest': '''
+        SELECT id, character_id, quest_id, success, quest_data AS data,
+               round_count, damage_to_hero, damage_to_monster, round_log, seed, created_at
+        FROM completed_quests
+        WHERE character_id IN (SELECT id FROM characters WHERE user_id = :user_id)
+          AND id < :before
+        ORDER BY id DESC
+        LIMIT :limit
+    ''',
+}
+
+
+def combatant_names(kind, header):
+    """Noms des deux combattants, dans l'ordre utilisé par le journal des tours"""
+    if kind == 'versus':
+        players = header.get("players", {})
+        return players.get("player1", {}).get("name"), players.get("player2", {}).get("name")
+    return header.get("hero", {}).get("name"), header.get("monster", {}).get("name")
+
+
+class BattleHistory:
+    """Lecture de l'historique des combats (pvp_battles, completed_quests)"""
+
+    @staticmethod
+    def list(user_id, kind='versus', limit=20, before=None, rounds=False):
+        """
+        Page d'historique, du plus récent au plus ancien
+        :param kind: 'versus' ou 'quest'
+        :param before: Ne renvoyer que les combats d'identifiant inférieur (pagination)
+        :param rounds: Décoder le détail des tours (sinon seules les colonnes résumées sont lues) ;
+                       un journal illisible donne "rounds": None et un message dans "rounds_error"
+        :return: Couple (combats, identifiant à passer en before pour la page suivante ou None)
+        """
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(HISTORY_QUERIES[kind], {
+            "user_id": user_id,
+            "before": before if before is not None else 2 ** 63 - 1,
+            "limit": limit + 1
+        })
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        next_before = rows[limit - 1]['id'] if len(rows) > limit else None
+        battles = []
+        for row in rows[:limit]:
+            battle = {key: row[key] for key in row.keys() if key not in ('data', 'round_log')}
+            header = json.loads(row['data']) if row['data'] else {}
+            # Les anciens enregistrements gardent leurs tours dans le JSON
+            legacy_rounds = header.pop("rounds", None)
+            battle["battle"] = header
+            if rounds:
+                if row['round_log'] is not None:
+                    names = combatant_names(kind, header)
+                    try:
+                        battle["rounds"] = [round_data.to_dict()
+                                            for round_data in decode_rounds(row['round_log'], names)]
+                    except RoundLogError as e:
+                        # Un journal illisible ne doit pas faire échouer toute la page
+                        battle["rounds"] = None
+                        battle["rounds_error"] = str(e)
+                else:
+                    battle["rounds"] = legacy_rounds or []
+            battles.append(battle)
+        return battles, next_before
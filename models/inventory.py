@@ -0,0 +1,567 @@
+import base64
+import binascii
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+
+from init_db import run_write_transaction
+from models.catalog import catalog
+
+# Types consommables selon la source de l'objet
+CONSUMABLE_TYPES = ['potion', 'plante']
+CONSUMABLE_SPECIAL_TYPES = ['healing', 'potion', 'plante']
+
+# Taille des pages de l'inventaire (par défaut et maximale)
+INVENTORY_PAGE_SIZE = int(os.getenv('INVENTORY_PAGE_SIZE', 50))
+INVENTORY_MAX_PAGE_SIZE = int(os.getenv('INVENTORY_MAX_PAGE_SIZE', 200))
+
+# Colonnes de tri autorisées pour la liste de l'inventaire
+SORT_COLUMNS = {'item_name', 'item_type', 'item_quantity'}
+SORT_ORDERS = {'asc', 'desc'}
+
+
+class InventoryError(Exception):
+    """Erreur métier sur une opération d'inventaire (message et code HTTP)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class InventoryService:
+    """Opérations atomiques sur les piles d'objets de l'inventaire"""
+
+    # Une pile par (character_id, name, type_id) : voir l'index idx_inventory_stack
+    UPSERT_STACK = '''
+        INSERT INTO inventory (character_id, name, type_id, quantity)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(character_id, name, type_id)
+        DO UPDATE SET quantity = quantity + excluded.quantity
+        RETURNING id, quantity
+    '''
+
+    @staticmethod
+    def grant(cursor, character_id, name, type_id, quantity=1):
+        """
+        Ajoute des objets à une pile (créée si besoin) en une seule requête
+        :param cursor: Curseur d'une transaction en cours
+        :return: Couple (id de la pile, nouvelle quantité)
+        """
+        cursor.execute(InventoryService.UPSERT_STACK, (character_id, name, type_id, quantity))
+        row = cursor.fetchone()
+        return row['id'], row['quantity']
+
+    @staticmethod
+    def grant_many(character_id, grants, cursor=None):
+        """
+        Crédite plusieurs objets dans une même transaction
+        :param character_id: Personnage qui reçoit les objets
+        :param grants: Liste de triplets (name, type_id, quantity)
+        :param cursor: Curseur d'une transaction existante (sinon une transaction est ouverte)
+        :return: Liste de couples (id de la pile, nouvelle quantité), dans l'ordre des grants
+        """
+        def apply_grants(cursor):
+            return [
+                InventoryService.grant(cursor, character_id, name, type_id, quantity)
+                for name, type_id, quantity in grants
+            ]
+
+        if cursor is not None:
+            return apply_grants(cursor)
+        return run_write_transaction(apply_grants)
+
+    # Inventaire et objets spéciaux réunis dans une seule liste (statistiques) ;
+    # un objet spécial compte comme une pile de quantité 1
+    ITEMS_CTE = '''
+        WITH items AS (
+            SELECT inventory.id AS item_id, inventory.name AS item_name,
+                   item_types.type_name AS item_type, inventory.quantity AS item_quantity,
+                   NULL AS item_effect, 'inventory' AS source,
+                   item_types.type_name IN ({consumable}) AS consumable
+            FROM inventory
+            JOIN item_types ON inventory.type_id = item_types.id
+            WHERE inventory.character_id = ?
+            UNION ALL
+            SELECT id, name, type, 1, effect, 'character_items',
+                   type IN ({consumable_special})
+            FROM character_items
+            WHERE character_id = ?
+        )
+    '''.format(
+        consumable=', '.join('?' * len(CONSUMABLE_TYPES)),
+        consumable_special=', '.join('?' * len(CONSUMABLE_SPECIAL_TYPES))
+    )
+
+    @staticmethod
+    def _items_params(character_id):
+        # Dans l'ordre des paramètres de ITEMS_CTE
+        return [*CONSUMABLE_TYPES, character_id, *CONSUMABLE_SPECIAL_TYPES, character_id]
+
+    @staticmethod
+    def encode_cursor(sort_by, order, item):
+        """Curseur opaque pointant après la dernière ligne d'une page"""
+        payload = [sort_by, order, item['sort_value'], item['source'], item['item_id']]
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(token, sort_by, order):
+        """
+        Décode un curseur de pagination
+        :return: Triplet (valeur de tri, source, id) de la dernière ligne vue
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            cursor_sort, cursor_order, sort_value, source, item_id = payload
+        except (ValueError, TypeError, binascii.Error):
+            raise InventoryError("Curseur de pagination invalide")
+        if (cursor_sort, cursor_order) != (sort_by, order):
+            raise InventoryError("Le curseur ne correspond pas au tri demandé")
+        return sort_value, source, item_id
+
+    # Requêtes de pagination, une par source : chacune est limitée à la page
+    # et parcourt l'index (character_id, <colonne de tri>, id) de sa table
+    PAGE_QUERIES = {
+        'inventory': '''
+            SELECT inventory.id AS item_id, inventory.name AS item_name,
+                   item_types.type_name AS item_type, inventory.quantity AS item_quantity,
+                   NULL AS item_effect, 'inventory' AS source,
+                   item_types.type_name IN ({consumable}) AS consumable,
+                   {{sort_value}} AS sort_value
+            FROM item_types
+            {{join}} inventory ON inventory.type_id = item_types.id
+            WHERE inventory.character_id = ?
+        '''.format(consumable=', '.join('?' * len(CONSUMABLE_TYPES))),
+        'character_items': '''
+            SELECT id AS item_id, name AS item_name, type AS item_type, 1 AS item_quantity,
+                   effect AS item_effect, 'character_items' AS source,
+                   type IN ({consumable_special}) AS consumable,
+                   {{sort_value}} AS sort_value
+            FROM character_items
+            WHERE character_id = ?
+        '''.format(consumable_special=', '.join('?' * len(CONSUMABLE_SPECIAL_TYPES))),
+    }
+
+    # Clés de tri par source : valeur de tri puis départage par id.
+    # Les noms de types sont uniques (voir catalog.type_ids) : item_types.id ne change
+    # pas l'ordre, il permet de suivre item_types puis l'index (character_id, type_id, id) sans tri.
+    # Un objet spécial a une quantité constante (None : seul l'id ordonne les lignes).
+    SORT_KEYS = {
+        'inventory': {
+            'item_name': ('inventory.name', 'inventory.id'),
+            'item_type': ('item_types.type_name', 'item_types.id', 'inventory.id'),
+            'item_quantity': ('inventory.quantity', 'inventory.id'),
+        },
+        'character_items': {
+            'item_name': ('name', 'id'),
+            'item_type': ('type', 'id'),
+            'item_quantity': (None, 'id'),
+        },
+    }
+    CHARACTER_ITEM_QUANTITY = 1
+
+    @staticmethod
+    def _keyset_condition(source, sort_by, order, after):
+        """
+        Condition SQL des lignes d'une source situées après le curseur, dans
+        l'ordre (valeur de tri, source, id) de la liste fusionnée
+        :return: Couple (condition SQL, paramètres) ; condition vide si toutes les lignes
+                 suivent le curseur, None si aucune
+        """
+        sort_value, cursor_source, item_id = after
+        keys = InventoryService.SORT_KEYS[source][sort_by]
+        comparison = '>' if order == 'asc' else '<'
+        # À valeur de tri égale, la source départage les deux tables
+        ties_after = source > cursor_source if order == 'asc' else source < cursor_source
+
+        if keys[0] is None:
+            constant = InventoryService.CHARACTER_ITEM_QUANTITY
+            if not isinstance(sort_value, int):
+                raise InventoryError("Curseur de pagination invalide")
+            if constant != sort_value:
+                after_cursor = constant > sort_value if order == 'asc' else constant < sort_value
+                return ('', []) if after_cursor else (None, [])
+            if source == cursor_source:
+                return f'{keys[1]} {comparison} ?', [item_id]
+            return ('', []) if ties_after else (None, [])
+
+        if source != cursor_source:
+            return f"{keys[0]} {comparison}{'=' if ties_after else ''} ?", [sort_value]
+        values = [sort_value, item_id]
+        if len(keys) == 3:
+            # Identifiant du type de la dernière ligne vue (0 si le type a disparu)
+            values.insert(1, catalog.type_id(sort_value) or 0)
+        return f"({', '.join(keys)}) {comparison} ({', '.join('?' * len(keys))})", values
+
+    @staticmethod
+    def _source_page(cursor, source, character_id, sort_by, order, item_type, consumable, after, size):
+        """Au plus size lignes d'une source, dans l'ordre de tri, après le curseur"""
+        keys = InventoryService.SORT_KEYS[source][sort_by]
+        sort_value = keys[0] or str(InventoryService.CHARACTER_ITEM_QUANTITY)
+        type_column, consumable_types = (
+            ('item_types.type_name', CONSUMABLE_TYPES) if source == 'inventory'
+            else ('type', CONSUMABLE_SPECIAL_TYPES)
+        )
+
+        conditions = []
+        params = [*consumable_types, character_id]
+        if item_type:
+            conditions.append(f"{type_column} IN ({', '.join('?' * len(item_type))})")
+            params.extend(item_type)
+        if consumable is not None:
+            conditions.append(f"({type_column} IN ({', '.join('?' * len(consumable_types))})) = ?")
+            params.extend([*consumable_types, int(consumable)])
+        if after:
+            condition, values = InventoryService._keyset_condition(source, sort_by, order, after)
+            if condition is None:
+                return []
+            if condition:
+                conditions.append(condition)
+                params.extend(values)
+
+        where = ''.join(f' AND {condition}' for condition in conditions)
+        # CROSS JOIN impose à SQLite de parcourir item_types (par nom) avant l'inventaire
+        join = 'CROSS JOIN' if sort_by == 'item_type' else 'JOIN'
+        order_by = ', '.join(f'{key} {order}' for key in keys if key)
+        cursor.execute(InventoryService.PAGE_QUERIES[source].format(sort_value=sort_value, join=join) + f'''
+            {where}
+            ORDER BY {order_by}
+            LIMIT ?
+        ''', (*params, size))
+        return cursor.fetchall()
+
+    @staticmethod
+    def list_page(cursor, character_id, sort_by='item_name', order='asc', item_type=None,
+                  consumable=None, source=None, after=None, limit=INVENTORY_PAGE_SIZE):
+        """
+        Page de l'inventaire triée par sort_by, paginée par clé (keyset).
+        Chaque source est lue séparément, limitée à la page, puis les deux
+        résultats sont fusionnés selon (valeur de tri, source, id).
+        :param item_type: Liste de types à conserver
+        :param consumable: Ne garder que les objets consommables (True) ou non (False)
+        :param source: 'inventory' ou 'character_items'
+        :param after: Curseur renvoyé par la page précédente
+        :return: Couple (lignes de la page, curseur de la page suivante ou None)
+        """
+        if after:
+            after = InventoryService.decode_cursor(after, sort_by, order)
+        sources = [source] if source else ['character_items', 'inventory']
+
+        # Une ligne de plus que la page pour savoir s'il en reste
+        pages = [
+            InventoryService._source_page(cursor, name, character_id, sort_by, order,
+                                          item_type, consumable, after, limit + 1)
+            for name in sources
+        ]
+        merged = heapq.merge(*pages, key=lambda row: (row['sort_value'], row['source'], row['item_id']),
+                             reverse=order == 'desc')
+        rows = list(itertools.islice(merged, limit + 1))
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = InventoryService.encode_cursor(sort_by, order, rows[-1])
+        return rows, next_cursor
+
+    @staticmethod
+    def items_for_characters(cursor, character_ids):
+        """
+        Objets (inventaire et objets spéciaux) de plusieurs personnages en une requête
+        :return: Dictionnaire character_id -> liste d'objets
+        """
+        items = {character_id: [] for character_id in character_ids}
+        if not items:
+            return items
+
+        placeholders = ', '.join('?' * len(items))
+        cursor.execute(f'''
+            SELECT inventory.character_id, inventory.id, inventory.name,
+                   item_types.type_name AS type, inventory.quantity, NULL AS effect,
+                   'inventory' AS source
+            FROM inventory
+            JOIN item_types ON inventory.type_id = item_types.id
+            WHERE inventory.character_id IN ({placeholders})
+            UNION ALL
+            SELECT character_id, id, name, type, NULL, effect, 'character_items'
+            FROM character_items
+            WHERE character_id IN ({placeholders})
+        ''', (*items, *items))
+
+        for row in cursor.fetchall():
+            item = {"id": row['id'], "name": row['name'], "type": row['type'], "source": row['source']}
+            if row['source'] == 'inventory':
+                item["quantity"] = row['quantity']
+            else:
+                item["effect"] = row['effect']
+            items[row['character_id']].append(item)
+        return items
+
+    @staticmethod
+    def stats(cursor, character_id):
+        """Statistiques de tout l'inventaire, agrégées en une requête"""
+        cursor.execute(InventoryService.ITEMS_CTE + '''
+            SELECT item_type, COUNT(*) AS items, SUM(consumable) AS consumables
+            FROM items
+            GROUP BY item_type
+        ''', InventoryService._items_params(character_id))
+        by_type = {row['item_type']: (row['items'], row['consumables']) for row in cursor.fetchall()}
+
+        return {
+            "total_items": sum(items for items, _ in by_type.values()),
+            "consumables": sum(consumables for _, consumables in by_type.values()),
+            "weapons": sum(by_type.get(name, (0, 0))[0] for name in ('weapon', 'arme')),
+            "armor": sum(by_type.get(name, (0, 0))[0] for name in ('armor', 'armure')),
+            "by_type": {name: items for name, (items, _) in by_type.items()}
+        }
+
+    @staticmethod
+    def _item_type(type_id):
+        """
+        Valide un type d'objet reçu en JSON (entier ou texte numérique, comme "1")
+        :return: Couple (identifiant entier, nom du type)
+        """
+        try:
+            type_id = int(type_id)
+        except (TypeError, ValueError):
+            raise InventoryError("Type d'objet invalide")
+        type_name = catalog.type_name(type_id)
+        if type_name is None:
+            raise InventoryError("Type d'objet invalide")
+        return type_id, type_name
+
+    @staticmethod
+    def add(cursor, character_id, data):
+        """Ajoute un objet à l'inventaire (empilé avec la pile existante)"""
+        name = data.get('name')
+        type_id = data.get('type_id')
+        quantity = data.get('quantity', 1)
+
+        if not name or not type_id:
+            raise InventoryError("Nom et type de l'objet requis")
+
+        type_id, type_name = InventoryService._item_type(type_id)
+        item_id, new_quantity = InventoryService.grant(cursor, character_id, name, type_id, quantity)
+
+        return {
+            "id": item_id,
+            "name": name,
+            "type": type_name,
+            "quantity": new_quantity,
+            "consumable": type_name in CONSUMABLE_TYPES
+        }
+
+    @staticmethod
+    def update(cursor, character_id, item_id, data):
+        """Modifie un objet de l'inventaire ou un objet spécial selon data['source']"""
+        source = data.get('source', 'inventory')
+
+        if source == 'inventory':
+            name = data.get('name')
+            type_id = data.get('type_id')
+            quantity = data.get('quantity')
+
+            if not name or not type_id or not quantity:
+                raise InventoryError("Tous les champs sont obligatoires")
+
+            # Vérifier que l'objet appartient au personnage actif
+            cursor.execute('''
+                SELECT id FROM inventory
+                WHERE id = ? AND character_id = ?
+            ''', (item_id, character_id))
+            if not cursor.fetchone():
+                raise InventoryError("Objet non trouvé ou non autorisé", 404)
+
+            type_id, type_name = InventoryService._item_type(type_id)
+
+            # Mettre à jour l'objet (une seule pile par nom et type)
+            try:
+                cursor.execute('''
+                    UPDATE inventory
+                    SET name = ?, type_id = ?, quantity = ?
+                    WHERE id = ?
+                ''', (name, type_id, quantity, item_id))
+            except sqlite3.IntegrityError:
+                raise InventoryError("Un objet de même nom et type existe déjà", 409)
+
+            return {
+                "id": item_id,
+                "name": name,
+                "type": type_name,
+                "quantity": quantity,
+                "source": "inventory",
+                "consumable": type_name in CONSUMABLE_TYPES
+            }
+
+        if source == 'character_items':
+            name = data.get('name')
+            item_type = data.get('type')
+            effect = data.get('effect')
+
+            if not name or not item_type:
+                raise InventoryError("Nom et type sont obligatoires")
+
+            # Vérifier que l'objet appartient au personnage actif
+            cursor.execute('''
+                SELECT id FROM character_items
+                WHERE id = ? AND character_id = ?
+            ''', (item_id, character_id))
+            if not cursor.fetchone():
+                raise InventoryError("Objet non trouvé ou non autorisé", 404)
+
+            cursor.execute('''
+                UPDATE character_items
+                SET name = ?, type = ?, effect = ?
+                WHERE id = ?
+            ''', (name, item_type, effect, item_id))
+
+            return {
+                "id": item_id,
+                "name": name,
+                "type": item_type,
+                "effect": effect,
+                "source": "character_items",
+                "consumable": item_type in CONSUMABLE_SPECIAL_TYPES
+            }
+
+        raise InventoryError("Source d'objet invalide")
+
+    @staticmethod
+    def delete(cursor, character_id, item_id, source='inventory'):
+        """Supprime un objet de l'inventaire ou un objet spécial"""
+        if source == 'inventory':
+            table = 'inventory'
+        elif source == 'character_items':
+            table = 'character_items'
+        else:
+            raise InventoryError("Source d'objet invalide")
+
+        cursor.execute(f'DELETE FROM {table} WHERE id = ? AND character_id = ?', (item_id, character_id))
+        if cursor.rowcount == 0:
+            raise InventoryError("Objet non trouvé ou non autorisé", 404)
+
+    @staticmethod
+    def consume(cursor, character_id, item_id, source='inventory'):
+        """Consomme un objet et applique son effet au personnage"""
+        if source == 'inventory':
+            # Récupérer l'objet et vérifier qu'il appartient au personnage actif
+            cursor.execute('''
+                SELECT inventory.id, inventory.quantity, item_types.type_name
+                FROM inventory
+                JOIN item_types ON inventory.type_id = item_types.id
+                WHERE inventory.id = ? AND inventory.character_id = ?
+            ''', (item_id, character_id))
+            item = cursor.fetchone()
+
+            if not item:
+                raise InventoryError("Objet non trouvé ou non autorisé", 404)
+
+            if item['type_name'] not in CONSUMABLE_TYPES:
+                raise InventoryError("Cet objet ne peut pas être consommé")
+
+            # Appliquer les effets de l'objet
+            if item['type_name'] == 'potion':
+                # Augmenter les points de vie du personnage
+                cursor.execute('''
+                    UPDATE characters
+                    SET health = MIN(health + 20, 100)
+                    WHERE id = ?
+                ''', (character_id,))
+                effect_message = "Vous avez récupéré 20 points de vie !"
+            else:
+                # Augmenter temporairement l'attaque
+                cursor.execute('''
+                    UPDATE characters
+                    SET attack = attack + 5
+                    WHERE id = ?
+                ''', (character_id,))
+                effect_message = "Votre attaque a augmenté de 5 points !"
+
+            # Réduire la quantité de l'objet
+            if item['quantity'] > 1:
+                cursor.execute('''
+                    UPDATE inventory
+                    SET quantity = quantity - 1
+                    WHERE id = ?
+                ''', (item_id,))
+                return effect_message, False, item['quantity'] - 1
+
+            cursor.execute('DELETE FROM inventory WHERE id = ?', (item_id,))
+            return effect_message, True, 0
+
+        if source == 'character_items':
+            # Récupérer l'objet spécial
+            cursor.execute('''
+                SELECT type, effect FROM character_items
+                WHERE id = ? AND character_id = ?
+            ''', (item_id, character_id))
+            item = cursor.fetchone()
+
+            if not item:
+                raise InventoryError("Objet non trouvé ou non autorisé", 404)
+
+            if item['type'] not in CONSUMABLE_SPECIAL_TYPES:
+                raise InventoryError("Cet objet ne peut pas être consommé")
+
+            # Appliquer les effets de l'objet
+            effect_message = "Objet utilisé !"
+            if item['type'] == 'healing' or item['type'] == 'potion':
+                # Récupérer l'effet de l'objet (format "+X hp")
+                effect = item['effect']
+                heal_amount = 20  # Valeur par défaut
+
+                if effect and '+' in effect and 'hp' in effect:
+                    try:
+                        heal_amount = int(effect.split('+')[1].split('hp')[0].strip())
+                    except (ValueError, IndexError):
+                        pass
+
+                # Augmenter les points de vie du personnage
+                cursor.execute('''
+                    UPDATE characters
+                    SET health = MIN(health + ?, 100)
+                    WHERE id = ?
+                ''', (heal_amount, character_id))
+                effect_message = f"Vous avez récupéré {heal_amount} points de vie !"
+
+            # Supprimer l'objet après utilisation
+            cursor.execute('DELETE FROM character_items WHERE id = ?', (item_id,))
+            return effect_message, True, 0
+
+        raise InventoryError("Source d'objet invalide")
+
+    @staticmethod
+    def apply(cursor, character_id, operation):
+        """
+        Applique une opération d'un lot : {"op": "add" | "update" | "delete" | "consume", ...}
+        :return: Dictionnaire décrivant le résultat de l'opération
+        """
+        if not isinstance(operation, dict):
+            raise InventoryError("Opération invalide")
+
+        op = operation.get('op')
+        if op == 'add':
+            return {"item": InventoryService.add(cursor, character_id, operation)}
+
+        if op not in ('update', 'delete', 'consume'):
+            raise InventoryError("Opération inconnue")
+
+        item_id = operation.get('id')
+        if not isinstance(item_id, int):
+            raise InventoryError("Identifiant d'objet requis")
+        source = operation.get('source', 'inventory')
+
+        if op == 'update':
+            return {"item": InventoryService.update(cursor, character_id, item_id, operation)}
+        if op == 'delete':
+            InventoryService.delete(cursor, character_id, item_id, source)
+            return {}
+
+        effect_message, item_consumed, remaining_quantity = InventoryService.consume(
+            cursor, character_id, item_id, source)
+        return {
+            "message": f"Objet consommé ! {effect_message}",
+            "item_consumed": item_consumed,
+            "remaining_quantity": remaining_quantity
+        }
@@ -0,0 +1,77 @@
+import os
+
+from cache import TTLCache, make_etag
+from init_db import get_db_connection
+from models.game import Race
+
+# Nombre de personnages classés conservés en cache, par critère de tri
+LEADERBOARD_TOP_K = int(os.getenv('LEADERBOARD_TOP_K', 100))
+LEADERBOARD_CACHE_TTL = float(os.getenv('LEADERBOARD_CACHE_TTL', 10))
+# Nombre minimal de combats pour figurer au classement par taux de victoire
+LEADERBOARD_MIN_BATTLES = int(os.getenv('LEADERBOARD_MIN_BATTLES', 5))
+
+_LEADERBOARD_COLUMNS = '''
+    c.id, c.name, c.race, c.class, c.level, c.experience,
+    COALESCE(s.battles, 0) AS battles, COALESCE(s.wins, 0) AS wins,
+    COALESCE(s.losses, 0) AS losses,
+    ROUND(CAST(s.wins AS REAL) / s.battles, 4) AS win_rate
+'''
+
+# Requêtes de classement, lues dans les agrégats de character_stats (voir migration 5)
+LEADERBOARD_QUERIES = {
+    'wins': f'''
+        SELECT {_LEADERBOARD_COLUMNS}
+        FROM character_stats AS s JOIN characters AS c ON c.id = s.character_id
+        WHERE s.wins > 0
+        ORDER BY s.wins DESC, s.battles, c.id
+        LIMIT :limit
+    ''',
+    'win_rate': f'''
+        SELECT {_LEADERBOARD_COLUMNS}
+        FROM character_stats AS s JOIN characters AS c ON c.id = s.character_id
+        WHERE s.battles >= :min_battles
+        ORDER BY CAST(s.wins AS REAL) / s.battles DESC, s.battles DESC, c.id
+        LIMIT :limit
+    ''',
+    'level': f'''
+        SELECT {_LEADERBOARD_COLUMNS}
+        FROM characters AS c LEFT JOIN character_stats AS s ON s.character_id = c.id
+        ORDER BY c.level DESC, c.experience DESC, c.id
+        LIMIT :limit
+    ''',
+}
+
+leaderboard_cache = TTLCache(maxsize=len(LEADERBOARD_QUERIES), ttl=LEADERBOARD_CACHE_TTL)
+
+
+class Leaderboard:
+    """Classement des personnages (victoires Versus, taux de victoire, niveau)"""
+
+    @staticmethod
+    def top(sort='wins'):
+        """
+        Les LEADERBOARD_TOP_K premiers personnages pour un critère, mis en cache
+        :param sort: 'wins', 'win_rate' ou 'level'
+        :return: Couple (classement, ETag)
+        """
+        cached = leaderboard_cache.get(sort)
+        if cached is not None:
+            return cached
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(LEADERBOARD_QUERIES[sort], {
+            "limit": LEADERBOARD_TOP_K,
+            "min_battles": LEADERBOARD_MIN_BATTLES
+        })
+        ranking = [
+            # Race affichée comme dans les autres routes ('Humain' et non 'HUMAN')
+            {"rank": rank, **{key: row[key] for key in row.keys()}, "race": Race[row['race']].value}
+            for rank, row in enumerate(cursor.fetchall(), start=1)
+        ]
+        cursor.close()
+        conn.close()
+
+        cached = (ranking, make_etag('leaderboard', sort, ranking))
+        leaderboard_cache.set(sort, cached)
+        return cached
@@ -0,0 +1,170 @@
+import json
+import sys
+
+from init_db import run_write_transaction
+from models.battle import count_battle, fight_hero_vs_monster
+from models.battle_log import INSERTS
+from models.catalog import catalog
+from models.game import Monster
+from models.game_utils import RewardManager
+from models.inventory import InventoryService
+from models.rng import make_rng, new_seed
+from models.round_log import quest_summary
+
+# Champs d'une quête attendus dans un fichier de quêtes
+QUEST_COLUMNS = ('id', 'name', 'description', 'difficulty', 'recommended_level',
+                 'reward_experience', 'reward_item_id', 'monster_data')
+
+
+class QuestError(Exception):
+    """Erreur sur une quête (message et code HTTP)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class QuestEngine:
+    """Déroulement des quêtes à partir de leurs définitions en base (via le catalogue)"""
+
+    UPSERT_QUEST = f'''
+        INSERT INTO quests ({', '.join(QUEST_COLUMNS)})
+        VALUES ({', '.join('?' * len(QUEST_COLUMNS))})
+        ON CONFLICT(id) DO UPDATE SET
+            {', '.join(f'{column} = excluded.{column}' for column in QUEST_COLUMNS[1:])}
+    '''
+
+    @staticmethod
+    def get(quest_id):
+        """Définition d'une quête jouable"""
+        quest = catalog.quest(quest_id)
+        if quest is None or not quest['monster']:
+            raise QuestError("Quête non trouvée", 404)
+        return quest
+
+    @staticmethod
+    def opponent(quest):
+        """Monstre à affronter pour une quête"""
+        monster = quest['monster']
+        return Monster(name=monster['name'], health=monster['health'], attack=monster['attack'])
+
+    @staticmethod
+    def run(character, quest_id, seed=None):
+        """
+        Joue une quête : combat, récompenses et historique en une seule transaction
+        :param seed: Graine des récompenses, enregistrée avec la quête (tirée si absente)
+        :return: Triplet (quête, résultat du combat, récompenses ou None en cas de défaite)
+        """
+        seed = new_seed() if seed is None else seed
+        quest = QuestEngine.get(quest_id)
+        result = fight_hero_vs_monster(character, QuestEngine.opponent(quest))
+        count_battle('quest', result.round_count)
+        success = result.winner == character.name
+
+        def apply_quest_result(cursor):
+            rewards = None
+            if success:
+                rewards = RewardManager.award_quest_completion(
+                    cursor, character, quest['difficulty'], quest['reward_experience'], rng=make_rng(seed))
+                # Objet propre à la quête (reward_item_id), crédité à l'inventaire sous le nom de son type
+                type_name = catalog.type_name(quest['reward_item_id'])
+                if type_name is not None:
+                    stack_id, quantity = InventoryService.grant(
+                        cursor, character.id, type_name, quest['reward_item_id'])
+                    rewards["quest_item"] = {
+                        "id": stack_id,
+                        "name": type_name,
+                        "type": type_name,
+                        "quantity": quantity
+                    }
+                if not rewards['level_up']:
+                    # Récupération partielle des PV, plus forte pour les quêtes difficiles
+                    cursor.execute('UPDATE characters SET health = MIN(health + ?, 100) WHERE id = ?',
+                                   (10 + quest['difficulty'] * 5, character.id))
+            else:
+                # Le personnage a perdu, récupère un peu de santé mais pas d'XP
+                recovery = min(20, 100 - character.health // 2)
+                new_health = max(character.health // 2, 20) + recovery
+                cursor.execute('UPDATE characters SET health = ? WHERE id = ?',
+                               (min(new_health, 100), character.id))
+
+            quest_data = result.header()
+            quest_data["quest_id"] = quest['id']
+            quest_data["rewards"] = rewards
+            quest_data["seed"] = seed
+            cursor.execute(INSERTS['completed_quests'], (
+                character.id, quest['id'], int(success), json.dumps(quest_data), *quest_summary(result), seed))
+            return rewards
+
+        rewards = run_write_transaction(apply_quest_result)
+        return quest, result, rewards
+
+    @staticmethod
+    def quest_row(data):
+        """Convertit une quête d'un fichier en ligne de la table quests"""
+        monster = data.get('monster')
+        if not data.get('name') or not isinstance(monster, dict):
+            raise QuestError("Chaque quête doit avoir un nom et un monstre")
+        try:
+            monster = {
+                "name": monster['name'],
+                "health": int(monster['health']),
+                "attack": int(monster['attack'])
+            }
+        except (KeyError, TypeError, ValueError):
+            raise QuestError(f"Monstre invalide pour la quête {data['name']}")
+
+        try:
+            quest_id = data.get('id')
+            reward_item_id = data.get('reward_item_id')
+            row = (
+                None if quest_id is None else int(quest_id),
+                data['name'],
+                data.get('description'),
+                int(data.get('difficulty', 1)),
+                int(data.get('recommended_level', 1)),
+                int(data.get('reward_experience', 10)),
+                None if reward_item_id is None else int(reward_item_id),
+                json.dumps(monster)
+            )
+        except (TypeError, ValueError):
+            raise QuestError(f"Champ numérique invalide pour la quête {data['name']}")
+        # L'objet de récompense est crédité par QuestEngine.run : son type doit exister
+        if row[6] is not None and catalog.type_name(row[6]) is None:
+            raise QuestError(f"Objet de récompense inconnu pour la quête {data['name']}")
+        return row
+
+    @staticmethod
+    def load_quests(quests):
+        """
+        Insère ou met à jour des quêtes en une transaction (par id quand il est fourni)
+        :param quests: Liste de dictionnaires (champs de la table, monstre sous "monster")
+        :return: Nombre de quêtes chargées
+        """
+        rows = [QuestEngine.quest_row(quest) for quest in quests]
+        run_write_transaction(lambda cursor: cursor.executemany(QuestEngine.UPSERT_QUEST, rows))
+        catalog.invalidate()
+        return len(rows)
+
+    @staticmethod
+    def load_quests_file(path):
+        """Charge un fichier JSON : liste de quêtes ou objet {"quests": [...]}"""
+        with open(path, encoding='utf-8') as quest_file:
+            data = json.load(quest_file)
+        if isinstance(data, dict):
+            data = data.get('quests', [])
+        return QuestEngine.load_quests(data)
+
+
+if __name__ == '__main__':
+    # Utilisation : python -m models.quest quetes.json
+    if len(sys.argv) != 2:
+        print("Utilisation : python -m models.quest <fichier.json>")
+        sys.exit(1)
+    try:
+        count = QuestEngine.load_quests_file(sys.argv[1])
+    except QuestError as e:
+        print(f"Erreur : {e.message}")
+        sys.exit(1)
+    print(f"{count} quêtes chargées.")
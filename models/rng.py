@@ -0,0 +1,37 @@
+import random
+import secrets
+import threading
+
+# Graines sur 63 bits : elles tiennent dans un INTEGER SQLite
+SEED_BITS = 63
+
+_local = threading.local()
+
+
+def new_seed():
+    """Nouvelle graine, à enregistrer avec la session ou le combat qu'elle produit"""
+    return secrets.randbits(SEED_BITS)
+
+
+def make_rng(seed=None):
+    """
+    Générateur indépendant, sans état partagé entre threads
+    :param seed: Graine (une nouvelle graine est tirée si absente)
+    """
+    return random.Random(new_seed() if seed is None else seed)
+
+
+def derive_rng(seed, *parts):
+    """
+    Générateur déterministe dérivé d'une graine et d'une étape (ex. 'turn', 3) :
+    une étape peut être rejouée sans rejouer les précédentes
+    """
+    return random.Random(':'.join(str(part) for part in (seed, *parts)))
+
+
+def thread_rng():
+    """Générateur propre au thread courant, pour les appels sans générateur explicite"""
+    rng = getattr(_local, 'rng', None)
+    if rng is None:
+        rng = _local.rng = make_rng()
+    return rng
@@ -0,0 +1,158 @@
+import struct
+import zlib
+
+from models.battle import QuestRound, VersusRound
+
+# Octet de version placé en tête de chaque journal encodé
+FORMAT_VERSION = 1
+
+# Types de combat
+VERSUS = 1
+QUEST = 2
+
+# Colonnes enregistrées par type de combat : (champ du tour, format struct).
+# 'i' : entier signé 32 bits (-1 = absent), 'B' : camp du combattant (0 = absent, 1 ou 2),
+# lu dans le champ <champ>_side du tour : deux combattants peuvent porter le même nom
+SCHEMAS = {
+    VERSUS: (VersusRound, (
+        ('player1_health', 'i'),
+        ('player2_health', 'i'),
+        ('initiative', 'B'),
+        ('damage_to_player2', 'i'),
+        ('damage_to_player1', 'i'),
+        ('winner', 'B'),
+    )),
+    QUEST: (QuestRound, (
+        ('hero_health', 'i'),
+        ('monster_health', 'i'),
+        ('damage_to_monster', 'i'),
+        ('damage_to_hero', 'i'),
+        ('winner', 'B'),
+    )),
+}
+
+_HEADER = struct.Struct('<BB')
+_COUNT = struct.Struct('<I')
+
+
+class RoundLogError(ValueError):
+    """Journal de tours illisible (version inconnue ou données corrompues)"""
+
+
+def _encode_value(round_data, field, code, names):
+    value = getattr(round_data, field)
+    if code == 'B':
+        side = getattr(round_data, f'{field}_side')
+        if side is not None:
+            return side
+        # Tours reconstruits depuis un ancien JSON : seul le nom est connu
+        return names.index(value) + 1 if value in names else 0
+    return -1 if value is None else value
+
+
+def _decode_value(value, code, names):
+    if code == 'B':
+        return names[value - 1] if value else None
+    return None if value == -1 else value
+
+
+def encode_rounds(kind, rounds, names):
+    """
+    Encode des tours en colonnes de largeur fixe compressées par zlib
+    :param kind: VERSUS ou QUEST
+    :param rounds: Itérable de VersusRound / QuestRound
+    :param names: Noms des deux combattants, si un tour ne précise pas le camp (<champ>_side)
+    :return: bytes (version, type, puis données compressées)
+    """
+    _, columns = SCHEMAS[kind]
+    rounds = list(rounds)
+    count = len(rounds)
+    payload = [_COUNT.pack(count)]
+    for field, code in columns:
+        values = [_encode_value(round_data, field, code, names) for round_data in rounds]
+        payload.append(struct.pack(f'<{count}{code}', *values))
+    return _HEADER.pack(FORMAT_VERSION, kind) + zlib.compress(b''.join(payload))
+
+
+def decode_rounds(blob, names):
+    """
+    Décode un journal produit par encode_rounds
+    :return: Liste de VersusRound / QuestRound
+    """
+    try:
+        version, kind = _HEADER.unpack_from(blob)
+    except struct.error:
+        raise RoundLogError("Journal de tours tronqué")
+    if version != FORMAT_VERSION or kind not in SCHEMAS:
+        raise RoundLogError(f"Format de journal inconnu (version {version}, type {kind})")
+    round_class, columns = SCHEMAS[kind]
+
+    try:
+        payload = zlib.decompress(blob[_HEADER.size:])
+        count, = _COUNT.unpack_from(payload)
+        offset = _COUNT.size
+        fields = []
+        decoded = []
+        for field, code in columns:
+            values = struct.unpack_from(f'<{count}{code}', payload, offset)
+            offset += struct.calcsize(f'<{count}{code}')
+            fields.append(field)
+            decoded.append([_decode_value(value, code, names) for value in values])
+            if code == 'B':
+                # Conserver le camp : le nom seul ne distingue pas deux homonymes
+                fields.append(f'{field}_side')
+                decoded.append([value or None for value in values])
+    except (zlib.error, struct.error, IndexError):
+        raise RoundLogError("Journal de tours corrompu")
+
+    return [
+        round_class(round=index + 1, **dict(zip(fields, values)))
+        for index, values in enumerate(zip(*decoded))
+    ]
+
+
+def versus_summary(result):
+    """
+    Colonnes résumées et journal encodé d'un combat Versus
+    :return: (round_count, damage_to_player1, damage_to_player2, round_log)
+    """
+    names = (result.player1.name, result.player2.name)
+    return (
+        len(result.rounds),
+        sum(round_data.damage_to_player1 or 0 for round_data in result.rounds),
+        sum(round_data.damage_to_player2 or 0 for round_data in result.rounds),
+        encode_rounds(VERSUS, result.rounds, names)
+    )
+
+
+def quest_summary(result):
+    """
+    Colonnes résumées et journal encodé d'un combat de quête
+    :return: (round_count, damage_to_hero, damage_to_monster, round_log)
+    """
+    names = (result.hero.name, result.monster.name)
+    return (
+        result.round_count,
+        result.hero.health - result.hero_final_health,
+        result.monster.health - result.monster_final_health,
+        encode_rounds(QUEST, result.iter_rounds(), names)
+    )
+
+
+def summary_from_dicts(kind, rounds, names):
+    """
+    Comme versus_summary / quest_summary, pour des tours déjà sérialisés en dictionnaires
+    :return: (round_count, dégâts subis par le premier combattant, par le second, round_log)
+    """
+    round_class, _ = SCHEMAS[kind]
+    rounds = [round_class(**round_data) for round_data in rounds or []]
+    if kind == VERSUS:
+        damage = ('damage_to_player1', 'damage_to_player2')
+    else:
+        damage = ('damage_to_hero', 'damage_to_monster')
+    return (
+        len(rounds),
+        sum(getattr(round_data, damage[0]) or 0 for round_data in rounds),
+        sum(getattr(round_data, damage[1]) or 0 for round_data in rounds),
+        encode_rounds(kind, rounds, names)
+    )
@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+
+from metrics import metrics
+
+# Plafonds pour protéger le serveur des simulations trop coûteuses
+MAX_SIMULATION_SAMPLES = int(os.getenv('MAX_SIMULATION_SAMPLES', 200000))
+QUEST_MAX_ROUNDS = int(os.getenv('QUEST_MAX_ROUNDS', 1000))
+VERSUS_MAX_ROUNDS = 20
+
+# Aléa de CombatManager.calculate_damage : coups critiques et variation des dégâts.
+# fight_logic et fight_hero_vs_monster n'en ont pas : ce modèle n'est appliqué que sur demande.
+CRITICAL_CHANCE = 0.1
+DAMAGE_VARIATION = 0.2
+
+
+def stat_block(entity):
+    """Extrait (health, attack, defense) d'un personnage, d'un monstre ou d'un dict"""
+    if isinstance(entity, dict):
+        return int(entity["health"]), int(entity["attack"]), int(entity.get("defense", 0))
+    return int(entity.health), int(entity.attack), int(getattr(entity, "defense", 0))
+
+
+class BattleSimulator:
+    """
+    Simulation Monte-Carlo vectorisée : chaque tour est calculé pour
+    tous les combats simultanément avec des tableaux NumPy.
+    Par défaut (critical_chance=0, variation=0), les résultats sont identiques
+    à ceux de fight_logic / fight_hero_vs_monster. Les coups critiques et la
+    variation des dégâts de CombatManager.calculate_damage (CRITICAL_CHANCE,
+    DAMAGE_VARIATION) s'activent explicitement ; les combats simulés ne suivent
+    alors plus les règles des moteurs de combat.
+    """
+
+    def __init__(self, samples=10000, critical_chance=0, variation=0,
+                 seed=None, histogram_bins=20):
+        """
+        :param samples: Nombre de combats simulés
+        :param critical_chance: Probabilité d'un coup critique (dégâts doublés), 0 comme fight_logic
+        :param variation: Variation relative des dégâts (0.2 = +/- 20%), 0 comme fight_logic
+        :param seed: Graine du générateur aléatoire
+        :param histogram_bins: Nombre maximal de classes des histogrammes de dégâts
+        """
+        self.samples = max(1, min(int(samples), MAX_SIMULATION_SAMPLES))
+        self.critical_chance = critical_chance
+        self.variation = variation
+        self.histogram_bins = histogram_bins
+        self.rng = np.random.default_rng(seed)
+
+    def versus(self, player1, player2):
+        """Simule des combats selon les règles de fight_logic"""
+        self._count('versus')
+        p1_health, p1_attack, p1_defense = stat_block(player1)
+        p2_health, p2_attack, p2_defense = stat_block(player2)
+
+        # Le modificateur d'initiative est commun aux deux joueurs :
+        # l'ordre d'attaque ne dépend donc que de l'attaque
+        player1_first = p1_attack >= p2_attack
+        return self._run(
+            health_a=p1_health,
+            health_b=p2_health,
+            damage_a=max(p1_attack - p2_defense // 2, 0),
+            damage_b=max(p2_attack - p1_defense // 2, 0),
+            a_first=player1_first,
+            max_rounds=VERSUS_MAX_ROUNDS,
+            tiebreak=True,
+            labels=("player1", "player2")
+        )
+
+    def quest(self, hero, monster):
+        """Simule des combats selon les règles de fight_hero_vs_monster"""
+        self._count('quest')
+        hero_health, hero_attack, hero_defense = stat_block(hero)
+        monster_health, monster_attack, _ = stat_block(monster)
+        return self._run(
+            health_a=hero_health,
+            health_b=monster_health,
+            damage_a=max(hero_attack - monster_attack // 4, 0),
+            damage_b=max(monster_attack - hero_defense, 0),
+            a_first=True,
+            max_rounds=QUEST_MAX_ROUNDS,
+            tiebreak=False,
+            labels=("hero", "monster")
+        )
+
+    def _count(self, mode):
+        metrics.inc('rpg_simulations_total', (mode,))
+        metrics.inc('rpg_simulation_samples_total', (mode,), self.samples)
+
+    def _roll(self, base_damage):
+        """Tire les dégâts d'une attaque pour tous les combats"""
+        if base_damage == 0:
+            return np.zeros(self.samples, dtype=np.int64)
+        damage = np.full(self.samples, float(base_damage))
+        if self.critical_chance:
+            damage[self.rng.random(self.samples) < self.critical_chance] *= 2
+        if self.variation:
+            damage *= self.rng.uniform(1 - self.variation, 1 + self.variation, self.samples)
+        return np.rint(damage).astype(np.int64)
+
+    def _run(self, health_a, health_b, damage_a, damage_b, a_first, max_rounds, tiebreak, labels):
+        n = self.samples
+        hp_a = np.full(n, health_a, dtype=np.int64)
+        hp_b = np.full(n, health_b, dtype=np.int64)
+        dealt_a = np.zeros(n, dtype=np.int64)
+        dealt_b = np.zeros(n, dtype=np.int64)
+        # 0 = en cours / indécis, 1 = victoire de A, 2 = victoire de B
+        winner = np.zeros(n, dtype=np.int8)
+        rounds = np.full(n, max_rounds, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+
+        if a_first:
+            order = ((hp_b, dealt_a, damage_a, 1), (hp_a, dealt_b, damage_b, 2))
+        else:
+            order = ((hp_a, dealt_b, damage_b, 2), (hp_b, dealt_a, damage_a, 1))
+
+        # Sans dégâts d'un côté comme de l'autre, le combat ne peut pas se terminer
+        if damage_a or damage_b:
+            for current_round in range(1, max_rounds + 1):
+                for defender_hp, dealt, base_damage, side in order:
+                    damage = np.where(active, self._roll(base_damage), 0)
+                    defender_hp -= damage
+                    dealt += damage
+                    defeated = active & (defender_hp <= 0)
+                    winner[defeated] = side
+                    rounds[defeated] = current_round
+                    active &= ~defeated
+                if not active.any():
+                    break
+
+        if tiebreak and active.any():
+            # Même règle que fight_logic : PV restants en pourcentage
+            a_ahead = hp_a / health_a > hp_b / health_b
+            winner[active & a_ahead] = 1
+            winner[active & ~a_ahead] = 2
+
+        return self._summarize(winner, rounds, dealt_a, dealt_b, labels)
+
+    def _histogram(self, values):
+        bins = max(1, min(self.histogram_bins, int(values.max() - values.min()) + 1))
+        counts, edges = np.histogram(values, bins=bins)
+        return {"bins": [round(float(edge), 2) for edge in edges], "counts": counts.tolist()}
+
+    def _summarize(self, winner, rounds, dealt_a, dealt_b, labels):
+        n = self.samples
+        wins_a = int(np.count_nonzero(winner == 1))
+        wins_b = int(np.count_nonzero(winner == 2))
+        round_counts = np.bincount(rounds)
+        return {
+            "samples": n,
+            "win_rate": round(wins_a / n, 4),
+            "loss_rate": round(wins_b / n, 4),
+            "undecided_rate": round((n - wins_a - wins_b) / n, 4),
+            "rounds": {
+                "mean": round(float(rounds.mean()), 2),
+                "min": int(rounds.min()),
+                "max": int(rounds.max()),
+                "p50": int(np.percentile(rounds, 50)),
+                "p95": int(np.percentile(rounds, 95)),
+                "distribution": {int(r): int(c) for r, c in enumerate(round_counts) if c}
+            },
+            "damage_dealt": {
+                label: {
+                    "mean": round(float(dealt.mean()), 2),
+                    "histogram": self._histogram(dealt)
+                }
+                for label, dealt in zip(labels, (dealt_a, dealt_b))
+            }
+        }
+
+
+def simulate_versus(player1, player2, samples=10000, seed=None, **options):
+    """Estime les chances de victoire de player1 contre player2"""
+    return BattleSimulator(samples, seed=seed, **options).versus(player1, player2)
+
+
+def simulate_quest(hero, monster, samples=10000, seed=None, **options):
+    """Estime les chances de victoire d'un héros contre un monstre de quête"""
+    return BattleSimulator(samples, seed=seed, **options).quest(hero, monster)
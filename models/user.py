@@ -1,10 +1,36 @@
+import os
+
+from flask import g, has_app_context
+
+from cache import TTLCache
+from init_db import get_db_connection
+from models.game import register_row_mapper
+
+# Cache de l'identité (login, e-mail) des utilisateurs authentifiés, indexé par identité JWT.
+# Propre à chaque processus : active_character_id n'y est pas conservé, il est relu à chaque requête
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 4096))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
 class User:
+    __slots__ = ('id', 'username', 'email', 'active_character_id')
+
     def __init__(self, id, username, email, active_character_id=None):
         self.id = id
         self.username = username
         self.email = email
         self.active_character_id = active_character_id
 
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "username": self.username,
+            "email": self.email,
+            "active_character_id": self.active_character_id
+        }
+
     def get_id(self):
         return str(self.id)
     
@@ -15,4 +41,51 @@ class User:
         return True
     
     def is_anonymous(self):
-        return False
\ No newline at end of file
+        return False
+
+    @staticmethod
+    def get_by_id(user_id):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {User.ROW.select} FROM user WHERE user_id = ?', (user_id,))
+        user_data = cursor.fetchone()
+        cursor.close()
+        conn.close()
+
+        return User.ROW(user_data)
+
+    @staticmethod
+    def get_cached(user_id):
+        """
+        Retourne l'utilisateur avec son identité depuis le cache. Le personnage actif
+        est toujours relu en base : il peut avoir été changé par un autre worker,
+        dont l'invalidation n'atteint pas le cache de ce processus.
+        """
+        identity = user_cache.get(str(user_id))
+        if identity is None:
+            user = User.get_by_id(user_id)
+            if user is not None:
+                user_cache.set(str(user_id), (user.username, user.email))
+            return user
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT user_id, active_character_id FROM user WHERE user_id = ?', (user_id,))
+        user_data = cursor.fetchone()
+        cursor.close()
+        conn.close()
+
+        if user_data is None:
+            user_cache.invalidate(str(user_id))
+            return None
+        return User(user_data['user_id'], *identity, user_data['active_character_id'])
+
+    @staticmethod
+    def invalidate_cache(user_id):
+        """À appeler après toute modification de la ligne user (cache du processus et mémo de la requête)"""
+        user_cache.invalidate(str(user_id))
+        if has_app_context():
+            g.pop('current_user', None)
+
+
+register_row_mapper(User, ('user_id', 'user_login', 'user_mail', 'active_character_id'))
@@ -0,0 +1,299 @@
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from flask import g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+
+# Profilage d'une requête : en-tête "X-Profile: cprofile" ou "X-Profile: sample",
+# accordé si le JWT porte la revendication PROFILER_CLAIM ou si "X-Profile-Token" vaut PROFILER_TOKEN
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')
+PROFILER_CLAIM = os.getenv('PROFILER_CLAIM', 'profiler')
+# Intervalle d'échantillonnage d'une requête profilée en mode "sample" (secondes)
+PROFILER_REQUEST_INTERVAL = float(os.getenv('PROFILER_REQUEST_INTERVAL', 0.001))
+# Nombre de profils conservés en mémoire, et répertoire où les écrire (vide = aucun)
+PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', 20))
+PROFILER_DIR = os.getenv('PROFILER_DIR', '')
+# Échantillonneur permanent : fréquence (Hz, 0 = désactivé), durée et nombre des fenêtres
+PROFILER_SAMPLE_HZ = float(os.getenv('PROFILER_SAMPLE_HZ', 0))
+PROFILER_WINDOW_SECONDS = float(os.getenv('PROFILER_WINDOW_SECONDS', 60))
+PROFILER_WINDOWS = int(os.getenv('PROFILER_WINDOWS', 10))
+# Profondeur maximale des piles et nombre maximal de piles distinctes par fenêtre
+PROFILER_MAX_DEPTH = int(os.getenv('PROFILER_MAX_DEPTH', 64))
+PROFILER_MAX_STACKS = int(os.getenv('PROFILER_MAX_STACKS', 5000))
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+def frame_stack(frame, max_depth=PROFILER_MAX_DEPTH):
+    """Pile d'appels de la racine vers la feuille, au format "module.fonction" """
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def collapsed(stacks):
+    """Texte "pile nombre" par ligne (flamegraph.pl, speedscope)"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class StackSampler:
+    """Échantillonne la pile d'un thread à intervalle régulier"""
+
+    def __init__(self, thread_id, interval=PROFILER_REQUEST_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[frame_stack(frame)] += 1
+
+
+class RollingSampler:
+    """
+    Échantillonneur permanent à basse fréquence des threads qui traitent une
+    requête ; les piles sont agrégées par fenêtres de temps glissantes
+    """
+
+    def __init__(self, hz=PROFILER_SAMPLE_HZ, window_seconds=PROFILER_WINDOW_SECONDS,
+                 windows=PROFILER_WINDOWS, max_stacks=PROFILER_MAX_STACKS):
+        self.hz = hz
+        self.window_seconds = window_seconds
+        self.max_stacks = max_stacks
+        self._windows = deque(maxlen=max(windows, 1))
+        self._active = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self.samples = 0
+        self.dropped = 0
+
+    def ensure_started(self):
+        """
+        Lance le thread d'échantillonnage dans le processus courant. Démarré à la
+        première requête, et de nouveau après un fork : le thread du processus
+        parent n'existe pas dans les workers d'un serveur pre-fork.
+        """
+        if self.hz <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Les piles héritées du processus parent sont exposées par celui-ci
+            self._pid = os.getpid()
+            self._windows.clear()
+            self._active = {}
+            self.samples = 0
+            self.dropped = 0
+            threading.Thread(target=self._run, name='profiler-rolling-sampler', daemon=True).start()
+
+    def enter(self, route):
+        """Marque le thread courant comme traitant une requête"""
+        if self.hz <= 0:
+            return
+        self.ensure_started()
+        self._active[threading.get_ident()] = route
+
+    def leave(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        interval = 1 / self.hz
+        while True:
+            time.sleep(interval)
+            active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            now = time.time()
+            with self._lock:
+                if not self._windows or now - self._windows[-1][0] >= self.window_seconds:
+                    self._windows.append((now, Counter()))
+                stacks = self._windows[-1][1]
+                for thread_id, route in active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = f'{route};{frame_stack(frame)}'
+                    # Nombre de piles distinctes borné par fenêtre
+                    if stack in stacks or len(stacks) < self.max_stacks:
+                        stacks[stack] += 1
+                        self.samples += 1
+                    else:
+                        self.dropped += 1
+
+    def aggregate(self, since=None):
+        """
+        Piles agrégées sur les fenêtres conservées
+        :param since: Ne garder que les fenêtres ouvertes depuis ce nombre de secondes
+        """
+        limit = time.time() - since if since else None
+        total = Counter()
+        with self._lock:
+            for started, stacks in self._windows:
+                if limit is None or started >= limit:
+                    total.update(stacks)
+        return total
+
+
+class Profiler:
+    """Profilage à la demande d'une requête et échantillonnage permanent"""
+
+    def __init__(self, keep=PROFILER_KEEP, directory=PROFILER_DIR):
+        """
+        :param keep: Nombre de profils conservés en mémoire
+        :param directory: Répertoire où écrire les profils (vide = mémoire seulement)
+        """
+        self.keep = keep
+        self.directory = directory or None
+        self.rolling = RollingSampler()
+        self._profiles = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def authorized(self):
+        """
+        La requête courante peut-elle demander ou consulter un profil. Vérifié une
+        seule fois par requête, le résultat est conservé dans g (profilage,
+        Server-Timing et routes de débogage)
+        """
+        if '_profile_authorized' not in g:
+            g._profile_authorized = self._check_authorization()
+        return g._profile_authorized
+
+    @staticmethod
+    def _check_authorization():
+        token = request.headers.get('X-Profile-Token', '').encode()
+        if PROFILER_TOKEN and hmac.compare_digest(token, PROFILER_TOKEN.encode()):
+            return True
+        try:
+            # JWT déjà vérifié par la route (jwt_required) : ne pas le décoder une seconde fois
+            claims = get_jwt()
+        except RuntimeError:
+            try:
+                verify_jwt_in_request(optional=True)
+                claims = get_jwt()
+            except (JWTExtendedException, PyJWTError):
+                return False
+        return bool(claims.get(PROFILER_CLAIM))
+
+    def _before_request(self):
+        route = request.url_rule.rule if request.url_rule else request.path
+        self.rolling.enter(f'{request.method} {route}')
+
+        mode = request.headers.get('X-Profile', '').lower()
+        if mode not in PROFILE_MODES or not self.authorized():
+            return
+        g._profile_mode = mode
+        g._profile_started = time.perf_counter()
+        if mode == 'cprofile':
+            g._profile = cProfile.Profile()
+            g._profile.enable()
+        else:
+            g._profile = StackSampler(threading.get_ident())
+            g._profile.start()
+
+    def _after_request(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        duration = time.perf_counter() - g.pop('_profile_started')
+        mode = g.pop('_profile_mode')
+
+        if mode == 'cprofile':
+            profile.disable()
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(40)
+            text, raw = output.getvalue(), profile
+        else:
+            text, raw = collapsed(profile.stop()), None
+
+        profile_id = self._store({
+            "mode": mode,
+            "method": request.method,
+            "path": request.full_path.rstrip('?'),
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "output": text
+        }, raw)
+        response.headers['X-Profile-Id'] = str(profile_id)
+        return response
+
+    def _teardown_request(self, exception=None):
+        self.rolling.leave()
+        # Requête interrompue par une exception : arrêter le profilage sans le conserver
+        profile = g.pop('_profile', None)
+        if isinstance(profile, cProfile.Profile):
+            profile.disable()
+        elif profile is not None:
+            profile.stop()
+
+    def _store(self, entry, raw=None):
+        with self._lock:
+            profile_id = next(self._ids)
+            self._profiles[profile_id] = entry
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, f'profile-{os.getpid()}-{profile_id}')
+            extension = 'txt' if entry["mode"] == 'cprofile' else 'collapsed'
+            with open(f'{base}.{extension}', 'w', encoding='utf-8') as profile_file:
+                profile_file.write(entry["output"])
+            if raw is not None:
+                # Fichier pstats lisible par snakeviz / python -m pstats
+                raw.dump_stats(f'{base}.prof')
+        return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        """Profils conservés, sans leur contenu"""
+        with self._lock:
+            return [
+                {"id": profile_id, **{key: value for key, value in entry.items() if key != "output"}}
+                for profile_id, entry in reversed(self._profiles.items())
+            ]
+
+    def stats(self):
+        return {
+            "profiles": len(self._profiles),
+            "rolling_hz": self.rolling.hz,
+            "rolling_samples": self.rolling.samples,
+            "rolling_dropped": self.rolling.dropped
+        }
+
+
+profiler = Profiler()
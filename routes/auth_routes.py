@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from init_db import get_db_connection
+from metrics import metrics
 from models.user import User
 
 auth_bp = Blueprint('auth', __name__)
@@ -33,7 +34,8 @@ def register():
         return jsonify({"error": "Cet email est déjà utilisé"}), 409
     
     # Hacher le mot de passe
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    with metrics.timer('rpg_bcrypt_seconds', ('hash',)):
+        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
     
     # Insérer le nouvel utilisateur
     cursor.execute(
@@ -79,7 +81,12 @@ def login():
     cursor.execute('SELECT * FROM user WHERE user_mail = ?', (email,))
     user_data = cursor.fetchone()
     
-    if not user_data or not bcrypt.check_password_hash(user_data['user_password'], password):
+    password_ok = False
+    if user_data:
+        with metrics.timer('rpg_bcrypt_seconds', ('check',)):
+            password_ok = bcrypt.check_password_hash(user_data['user_password'], password)
+    
+    if not password_ok:
         cursor.close()
         conn.close()
         return jsonify({"error": "Email ou mot de passe incorrect"}), 401
@@ -1,7 +1,10 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from cache import make_etag, not_modified, with_etag
 from init_db import get_db_connection
 from models.game import Character, Race, Warrior, Mage
+from models.inventory import InventoryService
+from models.user import User
 
 character_bp = Blueprint('characters', __name__)
 
@@ -10,21 +13,30 @@ character_bp = Blueprint('characters', __name__)
 def get_characters():
     user_id = get_jwt_identity()
     
+    # Données supplémentaires chargées en lot : ?expand=items,experience
+    expand = set(request.args.get('expand', '').split(','))
+    
     characters = Character.get_all_by_user(user_id)
+    user = current_app.get_current_user()
+    active_character_id = user.active_character_id if user else None
+    
+    items = {}
+    if 'items' in expand:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        items = InventoryService.items_for_characters(cursor, [char.id for char in characters])
+        cursor.close()
+        conn.close()
     
     character_list = []
     for char in characters:
-        character_list.append({
-            "id": char.id,
-            "name": char.name,
-            "race": char.race.value,
-            "class": char.type,
-            "level": char.level,
-            "health": char.health,
-            "attack": char.attack,
-            "defense": char.defense,
-            "is_active": user_id and char.id == current_app.get_current_user().active_character_id
-        })
+        character_data = char.to_dict(Character.PROFILE_FIELDS)
+        character_data["is_active"] = char.id == active_character_id
+        if 'experience' in expand:
+            character_data["experience"] = char.experience
+        if 'items' in expand:
+            character_data["items"] = items[char.id]
+        character_list.append(character_data)
     
     return jsonify({"characters": character_list}), 200
 
@@ -36,90 +48,37 @@ def get_character(character_id):
     # Vérifier que le personnage appartient à l'utilisateur
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM characters 
+    cursor.execute(f'''
+        SELECT {Character.ROW.select} FROM characters 
         WHERE id = ? AND user_id = ?
     ''', (character_id, user_id))
-    char_data = cursor.fetchone()
+    character = Character.ROW(cursor.fetchone())
     
-    if not char_data:
+    if not character:
         cursor.close()
         conn.close()
         return jsonify({"error": "Personnage non trouvé ou non autorisé"}), 404
     
-    character = Character(
-        id=char_data['id'],
-        name=char_data['name'],
-        race=Race[char_data['race']],
-        character_type=char_data['class'],
-        health=char_data['health'],
-        attack=char_data['attack'],
-        defense=char_data['defense'],
-        level=char_data['level']
-    )
+    # La version du personnage suffit à savoir si le client est à jour
+    is_active = character.id == current_app.get_current_user().active_character_id
+    etag = make_etag('character', character.id, character.version, is_active)
+    cached = not_modified(etag)
+    if cached:
+        cursor.close()
+        conn.close()
+        return cached
     
     # Récupérer les objets du personnage - à la fois de l'inventaire et des objets spéciaux
-    # 1. Objets de l'inventaire régulier
-    cursor.execute('''
-        SELECT inventory.id, inventory.name, item_types.type_name as type, inventory.quantity 
-        FROM inventory 
-        JOIN item_types ON inventory.type_id = item_types.id
-        WHERE inventory.character_id = ?
-    ''', (character_id,))
-    inventory_items = cursor.fetchall()
-    
-    # 2. Objets spéciaux du personnage
-    cursor.execute('''
-        SELECT id, name, type, effect 
-        FROM character_items 
-        WHERE character_id = ?
-    ''', (character_id,))
-    special_items = cursor.fetchall()
+    item_list = InventoryService.items_for_characters(cursor, [character_id])[character_id]
     
     cursor.close()
     conn.close()
     
-    # Combiner les deux types d'objets
-    item_list = []
-    for item in inventory_items:
-        item_list.append({
-            "id": item['id'],
-            "name": item['name'],
-            "type": item['type'],
-            "quantity": item['quantity'],
-            "source": "inventory"
-        })
-    
-    for item in special_items:
-        item_list.append({
-            "id": item['id'],
-            "name": item['name'],
-            "type": item['type'],
-            "effect": item['effect'],
-            "source": "character_items"
-        })
-    
-    # Récupérer l'expérience de manière sécurisée
-    try:
-        experience = char_data['experience']
-    except (KeyError, IndexError):
-        experience = 0
+    character_data = character.to_dict()
+    character_data["is_active"] = is_active
+    character_data["items"] = item_list
     
-    return jsonify({
-        "character": {
-            "id": character.id,
-            "name": character.name,
-            "race": character.race.value,
-            "class": character.type,
-            "level": character.level,
-            "health": character.health,
-            "attack": character.attack,
-            "defense": character.defense,
-            "experience": experience,  # Expérience sécurisée
-            "is_active": user_id and character.id == current_app.get_current_user().active_character_id,
-            "items": item_list
-        }
-    }), 200
+    return with_etag(jsonify({"character": character_data}), etag), 200
 
 @character_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -174,19 +133,11 @@ def create_character():
     conn.commit()
     cursor.close()
     conn.close()
+    User.invalidate_cache(user_id)
     
     return jsonify({
         "message": "Personnage créé avec succès",
-        "character": {
-            "id": character.id,
-            "name": character.name,
-            "race": character.race.value,
-            "class": character.type,
-            "health": character.health,
-            "attack": character.attack,
-            "defense": character.defense,
-            "level": character.level
-        }
+        "character": character.to_dict(Character.PROFILE_FIELDS)
     }), 201
 
 @character_bp.route('/<int:character_id>/select/', methods=['POST'])
@@ -217,6 +168,7 @@ def select_character(character_id):
     
     cursor.close()
     conn.close()
+    User.invalidate_cache(user_id)
     
     return jsonify({"message": "Personnage sélectionné avec succès"}), 200
 
@@ -263,5 +215,6 @@ def delete_character(character_id):
     
     cursor.close()
     conn.close()
+    User.invalidate_cache(user_id)
     
     return jsonify({"message": "Personnage supprimé avec succès"}), 200
\ No newline at end of file
@@ -1,10 +1,17 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import json
-import random
 
-from init_db import get_db_connection
-from models.game import Character, Monster, Tableau
+from cache import make_etag, not_modified, with_etag
+from init_db import run_write_transaction
+from models.battle import count_battle, fight_logic, stream_json
+from models.battle_log import battle_log
+from models.board import board_sessions, board_status
+from models.catalog import catalog
+from models.game import Character
+from models.history import HISTORY_QUERIES, BattleHistory
+from models.leaderboard import LEADERBOARD_QUERIES, LEADERBOARD_TOP_K, Leaderboard
+from models.quest import QuestEngine, QuestError
+from models.simulation import simulate_versus
 
 game_bp = Blueprint('game', __name__)
 
@@ -14,18 +21,7 @@ def versus_mode():
     user_id = get_jwt_identity()
     characters = Character.get_all_by_user(user_id)
     
-    character_list = []
-    for char in characters:
-        character_list.append({
-            "id": char.id,
-            "name": char.name,
-            "race": char.race.value,
-            "class": char.type,
-            "level": char.level,
-            "health": char.health,
-            "attack": char.attack,
-            "defense": char.defense
-        })
+    character_list = [char.to_dict(Character.PROFILE_FIELDS) for char in characters]
     
     return jsonify({"characters": character_list}), 200
 
@@ -56,17 +52,74 @@ def fight():
     original_health_p1 = player1.health
     original_health_p2 = player2.health
     
-    # Simuler le combat
-    result_json = fight_logic(player1, player2)
-    result = json.loads(result_json)
+    # Simuler le combat et l'ajouter à l'historique (écriture différée)
+    result = fight_logic(player1, player2)
+    count_battle('versus', len(result.rounds))
+    battle_log.log_versus(result)
     
     # Ajouter les données originales de santé au résultat
-    result["original_health"] = {
+    response = result.header()
+    response["original_health"] = {
         "player1": original_health_p1,
         "player2": original_health_p2
     }
     
     # En mode Versus, nous ne modifions pas la santé réelle des personnages
+    return battle_response(response, result.iter_rounds())
+
+@game_bp.route('/versus/simulate/', methods=['POST'])
+@jwt_required()
+def simulate_fight():
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({"error": "Aucune donnée fournie"}), 400
+    
+    player1 = data.get('player1')
+    player2 = data.get('player2')
+    
+    if not player1 or not player2:
+        return jsonify({"error": "Deux personnages sont requis pour le combat"}), 400
+    
+    # Chaque joueur est soit l'ID d'un personnage, soit un bloc de stats
+    # (entiers, booléens exclus : au moins 1 PV, attaque et défense positives ou nulles)
+    characters = None
+    fighters = []
+    for player in (player1, player2):
+        if isinstance(player, dict):
+            stats = [player.get(stat) for stat in ('health', 'attack', 'defense')]
+            if any(isinstance(value, bool) or not isinstance(value, int) for value in stats) \
+                    or stats[0] < 1 or min(stats[1:]) < 0:
+                return jsonify({"error": "Bloc de statistiques invalide"}), 400
+            fighters.append(player)
+        else:
+            if characters is None:
+                characters = Character.get_all_by_user(user_id)
+            fighter = next((c for c in characters if c.id == player), None)
+            if not fighter:
+                return jsonify({"error": "Personnages invalides"}), 400
+            fighters.append(fighter)
+    
+    try:
+        samples = int(data.get('samples', 10000))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Nombre de simulations invalide"}), 400
+    
+    seed = data.get('seed')
+    if seed is not None and not isinstance(seed, int):
+        return jsonify({"error": "Graine invalide"}), 400
+    
+    # Modèle aléatoire de CombatManager.calculate_damage, uniquement sur demande :
+    # par défaut la simulation suit exactement les règles de fight_logic
+    options = {}
+    for option in ('critical_chance', 'variation'):
+        value = data.get(option, 0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+            return jsonify({"error": f"Paramètre {option} invalide (entre 0 et 1)"}), 400
+        options[option] = value
+    
+    result = simulate_versus(fighters[0], fighters[1], samples=samples, seed=seed, **options)
     return jsonify(result), 200
 
 @game_bp.route('/quests/', methods=['GET'])
@@ -79,41 +132,17 @@ def quest_mode():
     
     character = Character.get_by_id(user.active_character_id)
     
-    quests = [
-        {
-            "id": 1,
-            "name": "La Forêt Sombre",
-            "difficulty": 1,
-            "description": "Explorez la forêt sombre et affrontez les monstres qui s'y cachent.",
-            "recommended_level": 1
-        },
-        {
-            "id": 2,
-            "name": "Les Grottes Mystérieuses",
-            "difficulty": 2,
-            "description": "Descendez dans les grottes mystérieuses et découvrez leurs secrets.",
-            "recommended_level": 2
-        },
-        {
-            "id": 3,
-            "name": "Le Donjon du Dragon",
-            "difficulty": 3,
-            "description": "Affrontez le terrible dragon qui terrorise la région.",
-            "recommended_level": 3
-        }
-    ]
+    # La réponse ne dépend que du catalogue et de la version du personnage
+    snapshot = catalog.snapshot()
+    etag = make_etag('quests', snapshot.quests_etag, character.id, character.version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
     
-    return jsonify({
-        "character": {
-            "id": character.id,
-            "name": character.name,
-            "level": character.level,
-            "health": character.health,
-            "attack": character.attack,
-            "defense": character.defense
-        },
-        "quests": quests
-    }), 200
+    return with_etag(jsonify({
+        "character": character.to_dict(Character.STATS_FIELDS),
+        "quests": snapshot.quest_list
+    }), etag), 200
 
 @game_bp.route('/quests/<int:quest_id>/', methods=['POST'])
 @jwt_required()
@@ -124,87 +153,71 @@ def start_quest(quest_id):
         return jsonify({"error": "Aucun personnage actif sélectionné"}), 400
     
     character = Character.get_by_id(user.active_character_id)
-    opponent = get_opponent_for_quest(quest_id)
     
-    # Simuler le combat pour la quête
-    result_json = fight_hero_vs_monster(character, opponent)
-    result = json.loads(result_json)
+    # Combat, récompenses et historique selon la définition de la quête
+    try:
+        quest, result, rewards = QuestEngine.run(character, quest_id)
+    except QuestError as e:
+        return jsonify({"error": e.message}), e.status
     
-    # Mettre à jour les statistiques du personnage après la quête
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Ajouter les informations du personnage mis à jour
+    character = Character.get_by_id(character.id)
+    response = result.header()
+    response["quest"] = {"id": quest['id'], "name": quest['name']}
+    response["rewards"] = rewards
+    response["character"] = character.to_dict(Character.STATS_FIELDS)
     
-    if result.get("winner") == character.name:
-        # Le personnage a gagné, augmenter l'expérience et éventuellement le niveau
-        xp_gain = 20 * quest_id  # Plus la quête est difficile, plus on gagne d'XP
-        
-        # Récupérer l'expérience actuelle
-        cursor.execute('SELECT experience, level FROM characters WHERE id = ?', (character.id,))
-        char_data = cursor.fetchone()
-        
-        current_xp = char_data["experience"] or 0
-        current_level = char_data["level"]
-        
-        new_xp = current_xp + xp_gain
-        new_level = current_level
-        
-        # Vérifier si le personnage monte de niveau (100 XP par niveau)
-        if new_xp >= current_level * 100:
-            new_level = new_xp // 100 + 1
-            
-            # Augmenter les statistiques en fonction de la classe
-            if character.type == 'warrior':
-                # Guerrier: plus de défense et de santé
-                cursor.execute('''
-                    UPDATE characters 
-                    SET level = ?, experience = ?, 
-                        attack = attack + ?, defense = defense + ?,
-                        health = ?
-                    WHERE id = ?
-                ''', (new_level, new_xp, 3, 2, min(character.health + 10, 100), character.id))
-            else:
-                # Mage: plus d'attaque
-                cursor.execute('''
-                    UPDATE characters 
-                    SET level = ?, experience = ?, 
-                        attack = attack + ?, defense = defense + ?,
-                        health = ?
-                    WHERE id = ?
-                ''', (new_level, new_xp, 5, 1, min(character.health + 5, 100), character.id))
-        else:
-            # Mise à jour de l'XP et récupération partielle des PV
-            health_recovery = 10 + quest_id * 5
-            new_health = min(character.health + health_recovery, 100)
-            
-            cursor.execute('''
-                UPDATE characters 
-                SET experience = ?, health = ? 
-                WHERE id = ?
-            ''', (new_xp, new_health, character.id))
-    else:
-        # Le personnage a perdu, récupère un peu de santé mais pas d'XP
-        recovery = min(20, 100 - character.health // 2)
-        new_health = max(character.health // 2, 20) + recovery
-        
-        cursor.execute('UPDATE characters SET health = ? WHERE id = ?', 
-                      (min(new_health, 100), character.id))
+    # Le détail des tours n'est construit que sur demande (?rounds=full)
+    rounds = result.iter_rounds() if request.args.get('rounds') == 'full' else None
+    return battle_response(response, rounds)
+
+@game_bp.route('/history/', methods=['GET'])
+@game_bp.route('/versus/history/', methods=['GET'], defaults={'kind': 'versus'})
+@jwt_required()
+def battle_history(kind=None):
+    user_id = get_jwt_identity()
     
-    conn.commit()
-    cursor.close()
-    conn.close()
+    kind = kind or request.args.get('kind', 'versus')
+    if kind not in HISTORY_QUERIES:
+        return jsonify({"error": "Type d'historique invalide"}), 400
     
-    # Ajouter les informations du personnage mis à jour
-    character = Character.get_by_id(character.id)
-    result["character"] = {
-        "id": character.id,
-        "name": character.name,
-        "level": character.level,
-        "health": character.health,
-        "attack": character.attack,
-        "defense": character.defense
-    }
+    try:
+        limit = int(request.args.get('limit', 20))
+        before = request.args.get('before')
+        before = int(before) if before is not None else None
+    except ValueError:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
     
-    return jsonify(result), 200
+    # Le détail des tours n'est décodé que sur demande (?rounds=full)
+    battles, next_before = BattleHistory.list(
+        user_id, kind, limit=limit, before=before, rounds=request.args.get('rounds') == 'full')
+    
+    return jsonify({
+        "kind": kind,
+        "battles": battles,
+        "next_before": next_before,
+        "has_more": next_before is not None
+    }), 200
+
+@game_bp.route('/leaderboard/', methods=['GET'])
+@jwt_required()
+def leaderboard():
+    sort = request.args.get('sort', 'wins')
+    if sort not in LEADERBOARD_QUERIES:
+        return jsonify({"error": "Critère de classement invalide"}), 400
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), LEADERBOARD_TOP_K))
+    except ValueError:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
+    
+    ranking, ranking_etag = Leaderboard.top(sort)
+    etag = make_etag(ranking_etag, limit)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    return with_etag(jsonify({"sort": sort, "leaderboard": ranking[:limit]}), etag), 200
 
 @game_bp.route('/board/', methods=['GET'])
 @jwt_required()
@@ -216,19 +229,21 @@ def board_game():
     
     hero = Character.get_by_id(user.active_character_id)
     
-    # Créer une nouvelle instance de jeu de plateau avec 20 cases
-    tableau_game = Tableau(hero, length=20)
+    # Reprendre la partie en cours, sauf si une nouvelle partie est demandée
+    tableau_game = None
+    if request.args.get('new', 'false').lower() not in ('1', 'true'):
+        session_id = board_sessions.latest_in_progress(hero.id)
+        if session_id:
+            tableau_game = board_sessions.get(session_id, hero)
+    
+    # Sinon créer et persister un nouveau plateau de 20 cases
+    if tableau_game is None:
+        tableau_game = board_sessions.create(hero, length=20)
     
     return jsonify({
-        "character": {
-            "id": hero.id,
-            "name": hero.name,
-            "level": hero.level,
-            "health": hero.health,
-            "attack": hero.attack,
-            "defense": hero.defense
-        },
+        "character": hero.to_dict(Character.STATS_FIELDS),
         "board": {
+            "session_id": tableau_game.session_id,
             "length": tableau_game.length,
             "current_position": tableau_game.current_position,
             "status": "ready"
@@ -236,24 +251,83 @@ def board_game():
         "message": "Jeu de plateau prêt à commencer"
     }), 200
 
+@game_bp.route('/board/<int:session_id>/', methods=['GET'])
+@jwt_required()
+def board_session_status(session_id):
+    user = current_app.get_current_user()
+    
+    if not user or not user.active_character_id:
+        return jsonify({"error": "Aucun personnage actif sélectionné"}), 400
+    
+    hero = Character.get_by_id(user.active_character_id)
+    tableau_game = board_sessions.get(session_id, hero)
+    
+    if not tableau_game:
+        return jsonify({"error": "Session de jeu non trouvée ou non autorisée"}), 404
+    
+    return jsonify({
+        "board": {
+            "session_id": tableau_game.session_id,
+            "length": tableau_game.length,
+            "current_position": tableau_game.current_position,
+            "status": board_status(tableau_game)
+        }
+    }), 200
+
+@game_bp.route('/board/<int:session_id>/play/', methods=['POST'])
+@jwt_required()
+def play_board_session(session_id):
+    user = current_app.get_current_user()
+    
+    if not user or not user.active_character_id:
+        return jsonify({"error": "Aucun personnage actif sélectionné"}), 400
+    
+    hero = Character.get_by_id(user.active_character_id)
+    tableau_game = board_sessions.get(session_id, hero)
+    
+    if not tableau_game:
+        return jsonify({"error": "Session de jeu non trouvée ou non autorisée"}), 404
+    
+    if tableau_game.is_completed or tableau_game.is_game_over:
+        return jsonify({"error": "Cette partie est terminée"}), 400
+    
+    return play_turn_response(hero, tableau_game)
+
 @game_bp.route('/board/play/', methods=['POST'])
 @jwt_required()
 def play_board_turn():
+    """Ancienne route : joue sur la dernière partie en cours du personnage actif"""
     user = current_app.get_current_user()
     
     if not user or not user.active_character_id:
         return jsonify({"error": "Aucun personnage actif sélectionné"}), 400
     
     hero = Character.get_by_id(user.active_character_id)
-    data = request.get_json() or {}
     
-    # Récupérer l'état actuel du jeu ou en créer un nouveau
-    current_position = data.get('current_position', 0)
-    tableau_game = Tableau(hero)
-    tableau_game.current_position = current_position
+    # La position est celle de la session persistée, plus celle envoyée par le client
+    session_id = board_sessions.latest_in_progress(hero.id)
+    tableau_game = board_sessions.get(session_id, hero) if session_id else None
+    if tableau_game is None:
+        tableau_game = board_sessions.create(hero)
     
+    return play_turn_response(hero, tableau_game)
+
+# Fonctions utilitaires
+def battle_response(data, rounds=None):
+    """
+    Sérialise un résultat de combat une seule fois, à la sortie.
+    Avec ?stream=1, les tours sont envoyés en JSON compact au fil de l'eau.
+    """
+    if request.args.get('stream', 'false').lower() in ('1', 'true'):
+        return Response(stream_json(data, rounds), mimetype='application/json')
+    if rounds is not None:
+        data["rounds"] = [round_data.to_dict() for round_data in rounds]
+    return jsonify(data), 200
+
+def play_turn_response(hero, tableau_game):
+    """Joue un tour sur une session et applique les conséquences au personnage"""
     # Jouer un tour
-    turn_result = tableau_game.play_turn()
+    turn_result = board_sessions.play(tableau_game)
     
     # Vérifier l'état du jeu
     game_status = "in_progress"
@@ -262,59 +336,58 @@ def play_board_turn():
     if tableau_game.is_completed:
         game_status = "completed"
         # Augmenter le niveau du personnage et rafraîchir ses statistiques
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        def apply_completion(cursor):
+            level_up = False
         
-        # Récupérer les données actuelles
-        cursor.execute('SELECT level, experience FROM characters WHERE id = ?', (hero.id,))
-        char_data = cursor.fetchone()
+            # Récupérer les données actuelles
+            cursor.execute('SELECT level, experience FROM characters WHERE id = ?', (hero.id,))
+            char_data = cursor.fetchone()
         
-        current_level = char_data["level"]
-        current_xp = char_data["experience"] or 0
+            current_level = char_data["level"]
+            current_xp = char_data["experience"] or 0
         
-        # Attribuer de l'XP pour avoir complété le plateau
-        xp_gain = 50
-        new_xp = current_xp + xp_gain
-        new_level = current_level
+            # Attribuer de l'XP pour avoir complété le plateau
+            xp_gain = 50
+            new_xp = current_xp + xp_gain
+            new_level = current_level
         
-        # Vérifier si le personnage monte de niveau
-        if new_xp >= current_level * 100:
-            new_level = new_xp // 100 + 1
-            level_up = True  # Le personnage monte de niveau
+            # Vérifier si le personnage monte de niveau
+            if new_xp >= current_level * 100:
+                new_level = new_xp // 100 + 1
+                level_up = True  # Le personnage monte de niveau
         
-        # Augmenter le niveau et les stats en fonction de la classe
-        if level_up:
-            # Si le personnage monte de niveau, restauration complète des PV + bonus de stats
-            if hero.type == 'warrior':
-                cursor.execute('''
-                    UPDATE characters 
-                    SET level = ?, experience = ?, health = 100,
-                        attack = attack + ?, defense = defense + ?
-                    WHERE id = ?
-                ''', (new_level, new_xp, 3 * (new_level - current_level), 
-                      2 * (new_level - current_level), hero.id))
-            else:  # mage
+            # Augmenter le niveau et les stats en fonction de la classe
+            if level_up:
+                # Si le personnage monte de niveau, restauration complète des PV + bonus de stats
+                if hero.type == 'warrior':
+                    cursor.execute('''
+                        UPDATE characters 
+                        SET level = ?, experience = ?, health = 100,
+                            attack = attack + ?, defense = defense + ?
+                        WHERE id = ?
+                    ''', (new_level, new_xp, 3 * (new_level - current_level), 
+                          2 * (new_level - current_level), hero.id))
+                else:  # mage
+                    cursor.execute('''
+                        UPDATE characters 
+                        SET level = ?, experience = ?, health = 100,
+                            attack = attack + ?, defense = defense + ?
+                        WHERE id = ?
+                    ''', (new_level, new_xp, 5 * (new_level - current_level), 
+                          1 * (new_level - current_level), hero.id))
+            else:
+                # Pas de montée de niveau, restauration partielle des PV (50% des PV manquants)
+                health_recovery = min(50, (100 - hero.health) // 2)
+                new_health = min(hero.health + health_recovery, 100)
+            
                 cursor.execute('''
                     UPDATE characters 
-                    SET level = ?, experience = ?, health = 100,
-                        attack = attack + ?, defense = defense + ?
+                    SET experience = ?, health = ?
                     WHERE id = ?
-                ''', (new_level, new_xp, 5 * (new_level - current_level), 
-                      1 * (new_level - current_level), hero.id))
-        else:
-            # Pas de montée de niveau, restauration partielle des PV (50% des PV manquants)
-            health_recovery = min(50, (100 - hero.health) // 2)
-            new_health = min(hero.health + health_recovery, 100)
-            
-            cursor.execute('''
-                UPDATE characters 
-                SET experience = ?, health = ?
-                WHERE id = ?
-            ''', (new_xp, new_health, hero.id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+                ''', (new_xp, new_health, hero.id))
+            return level_up
+
+        level_up = run_write_transaction(apply_completion)
         
         # Recharger le héros pour obtenir les nouvelles statistiques
         hero = Character.get_by_id(hero.id)
@@ -323,37 +396,23 @@ def play_board_turn():
         game_status = "game_over"
         
         # Remettre un minimum de santé au personnage
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE characters SET health = 50 WHERE id = ?', (hero.id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        run_write_transaction(lambda cursor: cursor.execute(
+            'UPDATE characters SET health = 50 WHERE id = ?', (hero.id,)))
         
         hero = Character.get_by_id(hero.id)
     else:
         # Mettre à jour la santé du héros dans la base de données
         # même si celle-ci a été modifiée pendant le tour
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE characters SET health = ? WHERE id = ?', 
-                      (min(tableau_game.hero.health, 100), hero.id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        run_write_transaction(lambda cursor: cursor.execute(
+            'UPDATE characters SET health = ? WHERE id = ?',
+            (min(tableau_game.hero.health, 100), hero.id)))
         
         hero = Character.get_by_id(hero.id)
     
     return jsonify({
-        "character": {
-            "id": hero.id,
-            "name": hero.name,
-            "health": hero.health,
-            "attack": hero.attack,
-            "defense": hero.defense,
-            "level": hero.level
-        },
+        "character": hero.to_dict(Character.STATS_FIELDS),
         "board": {
+            "session_id": tableau_game.session_id,
             "length": tableau_game.length,
             "current_position": tableau_game.current_position,
             "status": game_status
@@ -361,170 +420,3 @@ def play_board_turn():
         "level_up": level_up,  # Nouvelle propriété pour indiquer si le niveau a augmenté
         "turn_result": turn_result
     }), 200
-
-# Fonctions utilitaires
-def fight_hero_vs_monster(hero, monster):
-    """Simule un combat entre un héros et un monstre."""
-    fight_data = {
-        "mode": "Quest",
-        "hero": {
-            "name": hero.name,
-            "original_health": hero.health,
-        },
-        "monster": {
-            "name": monster.name,
-            "original_health": monster.health,
-        },
-        "rounds": []
-    }
-
-    round = 1  # Réinitialiser le compteur de tours
-    
-    # Copier les attributs pour éviter de modifier les objets originaux
-    hero_health = hero.health
-    monster_health = monster.health
-
-    # Combattre jusqu'à ce qu'un participant soit vaincu
-    while monster_health > 0 and hero_health > 0:
-        round_data = {
-            "round": round,
-            "hero_health": hero_health,
-            "monster_health": monster_health,
-        }
-
-        # Le héros attaque le monstre
-        # Calcul amélioré des dégâts en tenant compte de la défense
-        damage_to_monster = max(hero.attack - monster.attack // 4, 0)  # Minimum 0
-        monster_health -= damage_to_monster
-        round_data["damage_to_monster"] = damage_to_monster
-
-        if monster_health <= 0:
-            round_data["winner"] = hero.name
-            fight_data["winner"] = hero.name
-            fight_data["rounds"].append(round_data)
-            break  # Monstre vaincu
-
-        # Le monstre riposte
-        damage_to_hero = max(monster.attack - hero.defense, 0)  # Minimum 0
-        hero_health -= damage_to_hero
-        round_data["damage_to_hero"] = damage_to_hero
-
-        if hero_health <= 0:
-            round_data["winner"] = monster.name
-            fight_data["winner"] = monster.name
-            fight_data["rounds"].append(round_data)
-            break  # Héros vaincu
-
-        fight_data["rounds"].append(round_data)
-        round += 1
-
-    return json.dumps(fight_data, indent=4)
-
-def get_opponent_for_quest(quest_id):
-    """Récupère l'adversaire en fonction de l'ID de la quête."""
-    if quest_id == 1:
-        return Monster(name="Monstre de la Forêt", health=50, attack=10)
-    elif quest_id == 2:
-        return Monster(name="Troll des Cavernes", health=80, attack=15)
-    elif quest_id == 3:
-        return Monster(name="Dragon", health=200, attack=40)
-    return Monster(name="Monstre Inconnu", health=30, attack=5)
-
-def fight_logic(player1, player2):
-    """Logique de combat améliorée entre deux personnages."""
-    round = 1
-    fight_data = {
-        "mode": "PVP",
-        "players": {
-            "player1": {
-                "name": player1.name,
-                "original_health": player1.health,
-                "id": player1.id
-            },
-            "player2": {
-                "name": player2.name,
-                "original_health": player2.health,
-                "id": player2.id
-            }
-        },
-        "rounds": []
-    }
-
-    # Copier les attributs pour éviter de modifier les objets originaux
-    player1_health = player1.health
-    player2_health = player2.health
-
-    while player1_health > 0 and player2_health > 0:
-        round_data = {
-            "round": round,
-            "player1_health": player1_health,
-            "player2_health": player2_health,
-        }
-
-        # Déterminer l'initiative: qui attaque en premier
-        # Ajout d'un élément de hasard pour plus de variété
-        initiative_modifier = random.randint(-2, 2)
-        player1_initiative = player1.attack + initiative_modifier
-        player2_initiative = player2.attack + initiative_modifier
-        
-        if player1_initiative >= player2_initiative:
-            round_data["initiative"] = player1.name
-
-            # Player 1 attaque Player 2
-            damage_to_player2 = max(player1.attack - player2.defense // 2, 0)
-            player2_health -= damage_to_player2
-            round_data["damage_to_player2"] = damage_to_player2
-
-            if player2_health <= 0:
-                round_data["winner"] = player1.name
-                fight_data["winner"] = player1.name
-                fight_data["rounds"].append(round_data)
-                break
-
-            # Player 2 riposte
-            damage_to_player1 = max(player2.attack - player1.defense // 2, 0)
-            player1_health -= damage_to_player1
-            round_data["damage_to_player1"] = damage_to_player1
-
-        else:
-            round_data["initiative"] = player2.name
-
-            # Player 2 attaque Player 1
-            damage_to_player1 = max(player2.attack - player1.defense // 2, 0)
-            player1_health -= damage_to_player1
-            round_data["damage_to_player1"] = damage_to_player1
-
-            if player1_health <= 0:
-                round_data["winner"] = player2.name
-                fight_data["winner"] = player2.name
-                fight_data["rounds"].append(round_data)
-                break
-
-            # Player 1 riposte
-            damage_to_player2 = max(player1.attack - player2.defense // 2, 0)
-            player2_health -= damage_to_player2
-            round_data["damage_to_player2"] = damage_to_player2
-
-        fight_data["rounds"].append(round_data)
-        round += 1
-
-        # Limiter le nombre de tours pour éviter les combats sans fin
-        if round > 20:
-            # Déterminer un gagnant basé sur les PV restants en pourcentage
-            p1_health_percent = player1_health / player1.health
-            p2_health_percent = player2_health / player2.health
-            
-            if p1_health_percent > p2_health_percent:
-                fight_data["winner"] = player1.name
-            else:
-                fight_data["winner"] = player2.name
-            break
-
-    # S'assurer qu'un gagnant est déterminé
-    if "winner" not in fight_data:
-        if player1_health <= 0:
-            fight_data["winner"] = player2.name
-        else:
-            fight_data["winner"] = player1.name
-
-    return json.dumps(fight_data, indent=4)
\ No newline at end of file
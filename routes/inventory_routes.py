@@ -1,10 +1,32 @@
+import os
+
 from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from init_db import get_db_connection
+from cache import make_etag, not_modified, with_etag
+from init_db import get_db_connection, run_write_transaction
 from models.game import Character, Item
+from models.catalog import catalog
+from models.inventory import (INVENTORY_MAX_PAGE_SIZE, INVENTORY_PAGE_SIZE, SORT_COLUMNS,
+                              SORT_ORDERS, InventoryError, InventoryService)
 
 inventory_bp = Blueprint('inventory', __name__)
 
+# Nombre maximal d'opérations dans un lot
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 100))
+
+
+class BatchAborted(Exception):
+    """Interrompt un lot atomique en conservant les résultats déjà calculés"""
+
+    def __init__(self, results):
+        super().__init__("Lot annulé")
+        self.results = results
+
+
+def character_stats(character_id):
+    """Statistiques actuelles d'un personnage pour les réponses d'inventaire"""
+    return Character.get_by_id(character_id).to_dict(Character.STATS_FIELDS + ('experience',))
+
 @inventory_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_inventory():
@@ -17,80 +39,77 @@ def get_inventory():
     sort_by = request.args.get('sort_by', 'item_name')
     order = request.args.get('order', 'asc')
     
-    valid_columns = {'item_name', 'item_type', 'item_quantity'}
-    valid_order = {'asc', 'desc'}
-    if sort_by not in valid_columns:
+    if sort_by not in SORT_COLUMNS:
         sort_by = 'item_name'
-    if order not in valid_order:
+    if order not in SORT_ORDERS:
         order = 'asc'
     
+    # Filtres appliqués en SQL
+    item_type = [name for name in request.args.get('type', '').split(',') if name]
+    consumable = request.args.get('consumable')
+    if consumable is not None:
+        consumable = consumable.lower() in ('1', 'true', 'yes')
+    source = request.args.get('source')
+    if source not in (None, 'inventory', 'character_items'):
+        return jsonify({"error": "Source d'objet invalide"}), 400
+    
+    try:
+        limit = int(request.args.get('limit', INVENTORY_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Limite invalide"}), 400
+    limit = max(1, min(limit, INVENTORY_MAX_PAGE_SIZE))
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Récupérer le nom du personnage actif
-    cursor.execute('SELECT name FROM characters WHERE id = ?', (user.active_character_id,))
+    # Récupérer le nom du personnage actif et la version de son inventaire
+    cursor.execute('SELECT name, version FROM characters WHERE id = ?', (user.active_character_id,))
     character = cursor.fetchone()
     
-    # Récupérer l'inventaire normal du personnage
-    query = f'''
-        SELECT inventory.id AS item_id, inventory.name AS item_name, 
-               item_types.type_name AS item_type, inventory.quantity AS item_quantity 
-        FROM inventory 
-        JOIN item_types ON inventory.type_id = item_types.id 
-        WHERE inventory.character_id = ?
-        ORDER BY {sort_by} {order}
-    '''
-    cursor.execute(query, (user.active_character_id,))
-    regular_items = cursor.fetchall()
-    
-    # Récupérer les objets spéciaux du personnage (équipements, récompenses de quête, etc.)
-    cursor.execute('''
-        SELECT id, name, type, effect FROM character_items
-        WHERE character_id = ?
-    ''', (user.active_character_id,))
-    special_items = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    etag = make_etag('inventory', user.active_character_id,
+                     character['version'] if character else None, request.query_string)
+    cached = not_modified(etag)
+    if cached:
+        cursor.close()
+        conn.close()
+        return cached
+    
+    try:
+        rows, next_cursor = InventoryService.list_page(
+            cursor, user.active_character_id, sort_by, order,
+            item_type=item_type, consumable=consumable, source=source,
+            after=request.args.get('cursor'), limit=limit
+        )
+        stats = InventoryService.stats(cursor, user.active_character_id)
+    except InventoryError as e:
+        return jsonify({"error": e.message}), e.status
+    finally:
+        cursor.close()
+        conn.close()
     
-    # Construire la liste d'objets complète
+    # Construire la liste d'objets de la page
     item_list = []
-    
-    # Ajouter les objets réguliers
-    for item in regular_items:
-        item_list.append({
+    for item in rows:
+        entry = {
             "id": item['item_id'],
             "name": item['item_name'],
             "type": item['item_type'],
-            "quantity": item['item_quantity'],
-            "source": "inventory",
-            "consumable": item['item_type'] in ['potion', 'plante']
-        })
-    
-    # Ajouter les objets spéciaux
-    for item in special_items:
-        item_list.append({
-            "id": item['id'],
-            "name": item['name'],
-            "type": item['type'],
-            "effect": item['effect'],
-            "source": "character_items",
-            "consumable": item['type'] in ['healing', 'potion', 'plante']
-        })
-    
-    # Calculer des statistiques sur l'inventaire
-    stats = {
-        "total_items": len(item_list),
-        "consumables": sum(1 for item in item_list if item.get('consumable', False)),
-        "weapons": sum(1 for item in item_list if item.get('type') in ['weapon', 'arme']),
-        "armor": sum(1 for item in item_list if item.get('type') in ['armor', 'armure'])
-    }
+            "source": item['source'],
+            "consumable": bool(item['consumable'])
+        }
+        if item['source'] == 'inventory':
+            entry["quantity"] = item['item_quantity']
+        else:
+            entry["effect"] = item['item_effect']
+        item_list.append(entry)
     
-    return jsonify({
+    return with_etag(jsonify({
         "character_name": character['name'] if character else "Personnage",
         "items": item_list,
-        "stats": stats
-    }), 200
+        "stats": stats,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }), etag), 200
 
 @inventory_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -104,65 +123,16 @@ def add_item():
     if not data:
         return jsonify({"error": "Aucune donnée fournie"}), 400
     
-    name = data.get('name')
-    type_id = data.get('type_id')
-    quantity = data.get('quantity', 1)
-    
-    if not name or not type_id:
-        return jsonify({"error": "Nom et type de l'objet requis"}), 400
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Vérifier que le type d'item existe
-    cursor.execute('SELECT * FROM item_types WHERE id = ?', (type_id,))
-    if not cursor.fetchone():
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "Type d'objet invalide"}), 400
-    
-    # Vérifier si l'objet existe déjà dans l'inventaire
-    cursor.execute('''
-        SELECT * FROM inventory 
-        WHERE character_id = ? AND name = ? AND type_id = ?
-    ''', (user.active_character_id, name, type_id))
-    
-    existing_item = cursor.fetchone()
-    
-    if existing_item:
-        # Mettre à jour la quantité de l'objet existant
-        new_quantity = existing_item['quantity'] + quantity
-        cursor.execute('''
-            UPDATE inventory 
-            SET quantity = ? 
-            WHERE id = ?
-        ''', (new_quantity, existing_item['id']))
-        item_id = existing_item['id']
-    else:
-        # Créer un nouvel objet
-        cursor.execute('''
-            INSERT INTO inventory (character_id, name, type_id, quantity) 
-            VALUES (?, ?, ?, ?)''',
-            (user.active_character_id, name, type_id, quantity))
-        item_id = cursor.lastrowid
-    
-    # Récupérer le nom du type d'objet
-    cursor.execute('SELECT type_name FROM item_types WHERE id = ?', (type_id,))
-    type_name = cursor.fetchone()['type_name']
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Créer la pile ou augmenter sa quantité en une seule requête
+    try:
+        item = run_write_transaction(
+            lambda cursor: InventoryService.add(cursor, user.active_character_id, data))
+    except InventoryError as e:
+        return jsonify({"error": e.message}), e.status
     
     return jsonify({
         "message": "Objet ajouté avec succès",
-        "item": {
-            "id": item_id,
-            "name": name,
-            "type": type_name,
-            "quantity": quantity if not existing_item else new_quantity,
-            "consumable": type_name in ['potion', 'plante']
-        }
+        "item": item
     }), 201
 
 @inventory_bp.route('/<int:item_id>/', methods=['GET'])
@@ -233,106 +203,16 @@ def update_item(item_id):
     if not data:
         return jsonify({"error": "Aucune donnée fournie"}), 400
     
-    source = data.get('source', 'inventory')
+    try:
+        item = run_write_transaction(
+            lambda cursor: InventoryService.update(cursor, user.active_character_id, item_id, data))
+    except InventoryError as e:
+        return jsonify({"error": e.message}), e.status
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if source == 'inventory':
-        name = data.get('name')
-        type_id = data.get('type_id')
-        quantity = data.get('quantity')
-        
-        if not name or not type_id or not quantity:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Tous les champs sont obligatoires"}), 400
-        
-        # Vérifier que l'objet appartient au personnage actif
-        cursor.execute('''
-            SELECT * FROM inventory 
-            WHERE id = ? AND character_id = ?
-        ''', (item_id, user.active_character_id))
-        
-        if not cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Objet non trouvé ou non autorisé"}), 404
-        
-        # Mettre à jour l'objet
-        cursor.execute('''
-            UPDATE inventory 
-            SET name = ?, type_id = ?, quantity = ? 
-            WHERE id = ?
-        ''', (name, type_id, quantity, item_id))
-        
-        # Récupérer le nom du type d'objet
-        cursor.execute('SELECT type_name FROM item_types WHERE id = ?', (type_id,))
-        type_name = cursor.fetchone()['type_name']
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "message": "Objet mis à jour avec succès",
-            "item": {
-                "id": item_id,
-                "name": name,
-                "type": type_name,
-                "quantity": quantity,
-                "source": "inventory",
-                "consumable": type_name in ['potion', 'plante']
-            }
-        }), 200
-    
-    elif source == 'character_items':
-        name = data.get('name')
-        item_type = data.get('type')
-        effect = data.get('effect')
-        
-        if not name or not item_type:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Nom et type sont obligatoires"}), 400
-        
-        # Vérifier que l'objet appartient au personnage actif
-        cursor.execute('''
-            SELECT * FROM character_items 
-            WHERE id = ? AND character_id = ?
-        ''', (item_id, user.active_character_id))
-        
-        if not cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Objet non trouvé ou non autorisé"}), 404
-        
-        # Mettre à jour l'objet spécial
-        cursor.execute('''
-            UPDATE character_items 
-            SET name = ?, type = ?, effect = ? 
-            WHERE id = ?
-        ''', (name, item_type, effect, item_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "message": "Objet mis à jour avec succès",
-            "item": {
-                "id": item_id,
-                "name": name,
-                "type": item_type,
-                "effect": effect,
-                "source": "character_items",
-                "consumable": item_type in ['healing', 'potion', 'plante']
-            }
-        }), 200
-    
-    cursor.close()
-    conn.close()
-    return jsonify({"error": "Source d'objet invalide"}), 400
+    return jsonify({
+        "message": "Objet mis à jour avec succès",
+        "item": item
+    }), 200
 
 @inventory_bp.route('/<int:item_id>/', methods=['DELETE'])
 @jwt_required()
@@ -344,45 +224,11 @@ def delete_item(item_id):
     
     source = request.args.get('source', 'inventory')
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if source == 'inventory':
-        # Vérifier que l'objet appartient au personnage actif
-        cursor.execute('''
-            SELECT * FROM inventory 
-            WHERE id = ? AND character_id = ?
-        ''', (item_id, user.active_character_id))
-        
-        if not cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Objet non trouvé ou non autorisé"}), 404
-        
-        cursor.execute('DELETE FROM inventory WHERE id = ?', (item_id,))
-    
-    elif source == 'character_items':
-        # Vérifier que l'objet appartient au personnage actif
-        cursor.execute('''
-            SELECT * FROM character_items 
-            WHERE id = ? AND character_id = ?
-        ''', (item_id, user.active_character_id))
-        
-        if not cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Objet non trouvé ou non autorisé"}), 404
-        
-        cursor.execute('DELETE FROM character_items WHERE id = ?', (item_id,))
-    
-    else:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "Source d'objet invalide"}), 400
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        run_write_transaction(
+            lambda cursor: InventoryService.delete(cursor, user.active_character_id, item_id, source))
+    except InventoryError as e:
+        return jsonify({"error": e.message}), e.status
     
     return jsonify({"message": "Objet supprimé avec succès"}), 200
 
@@ -396,152 +242,88 @@ def consume_item(item_id):
     
     source = request.json.get('source', 'inventory') if request.json else 'inventory'
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        effect_message, item_consumed, new_quantity = run_write_transaction(
+            lambda cursor: InventoryService.consume(cursor, user.active_character_id, item_id, source))
+    except InventoryError as e:
+        return jsonify({"error": e.message}), e.status
     
-    if source == 'inventory':
-        # Récupérer l'objet et vérifier qu'il appartient au personnage actif
-        cursor.execute('''
-            SELECT inventory.*, item_types.type_name 
-            FROM inventory 
-            JOIN item_types ON inventory.type_id = item_types.id 
-            WHERE inventory.id = ? AND inventory.character_id = ?
-        ''', (item_id, user.active_character_id))
-        
-        item = cursor.fetchone()
-        
-        if not item:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Objet non trouvé ou non autorisé"}), 404
-        
-        if item['type_name'] not in ['potion', 'plante']:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Cet objet ne peut pas être consommé"}), 400
-        
-        # Appliquer les effets de l'objet
-        effect_message = ""
-        if item['type_name'] == 'potion':
-            # Augmenter les points de vie du personnage
-            cursor.execute('''
-                UPDATE characters 
-                SET health = MIN(health + 20, 100) 
-                WHERE id = ?
-            ''', (user.active_character_id,))
-            effect_message = "Vous avez récupéré 20 points de vie !"
-        elif item['type_name'] == 'plante':
-            # Augmenter temporairement l'attaque
-            cursor.execute('''
-                UPDATE characters 
-                SET attack = attack + 5 
-                WHERE id = ?
-            ''', (user.active_character_id,))
-            effect_message = "Votre attaque a augmenté de 5 points !"
-        
-        # Réduire la quantité de l'objet
-        if item['quantity'] > 1:
-            cursor.execute('''
-                UPDATE inventory 
-                SET quantity = quantity - 1 
-                WHERE id = ?
-            ''', (item_id,))
-            new_quantity = item['quantity'] - 1
-            item_consumed = False
-        else:
-            cursor.execute('DELETE FROM inventory WHERE id = ?', (item_id,))
-            new_quantity = 0
-            item_consumed = True
-        
-    elif source == 'character_items':
-        # Récupérer l'objet spécial
-        cursor.execute('''
-            SELECT * FROM character_items
-            WHERE id = ? AND character_id = ?
-        ''', (item_id, user.active_character_id))
-        
-        item = cursor.fetchone()
-        
-        if not item:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Objet non trouvé ou non autorisé"}), 404
-        
-        if item['type'] not in ['healing', 'potion', 'plante']:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Cet objet ne peut pas être consommé"}), 400
-        
-        # Appliquer les effets de l'objet
-        effect_message = "Objet utilisé !"
-        if item['type'] == 'healing' or item['type'] == 'potion':
-            # Récupérer l'effet de l'objet (format "+X hp")
-            effect = item['effect']
-            heal_amount = 20  # Valeur par défaut
-            
-            if effect and '+' in effect and 'hp' in effect:
-                try:
-                    heal_amount = int(effect.split('+')[1].split('hp')[0].strip())
-                except (ValueError, IndexError):
-                    pass
-            
-            # Augmenter les points de vie du personnage
-            cursor.execute('''
-                UPDATE characters 
-                SET health = MIN(health + ?, 100) 
-                WHERE id = ?
-            ''', (heal_amount, user.active_character_id,))
-            effect_message = f"Vous avez récupéré {heal_amount} points de vie !"
-        
-        # Supprimer l'objet après utilisation
-        cursor.execute('DELETE FROM character_items WHERE id = ?', (item_id,))
-        new_quantity = 0
-        item_consumed = True
-    
-    else:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "Source d'objet invalide"}), 400
+    return jsonify({
+        "message": f"Objet consommé ! {effect_message}",
+        "item_consumed": item_consumed,
+        "remaining_quantity": new_quantity,
+        "character": character_stats(user.active_character_id)
+    }), 200
+
+@inventory_bp.route('/batch/', methods=['POST'])
+@jwt_required()
+def batch_inventory():
+    """
+    Applique une liste ordonnée d'opérations (add, update, delete, consume)
+    sur l'inventaire du personnage actif, dans une seule transaction.
+    Avec "atomic": false, les opérations en échec sont ignorées au lieu d'annuler le lot.
+    """
+    user = current_app.get_current_user()
     
-    conn.commit()
+    if not user or not user.active_character_id:
+        return jsonify({"error": "Aucun personnage actif sélectionné"}), 400
     
-    # Récupérer les nouvelles stats du personnage
-    cursor.execute('SELECT * FROM characters WHERE id = ?', (user.active_character_id,))
-    character = cursor.fetchone()
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Aucune donnée fournie"}), 400
     
-    cursor.close()
-    conn.close()
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "Aucune opération fournie"}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({"error": f"Un lot est limité à {BATCH_MAX_OPERATIONS} opérations"}), 400
+    
+    atomic = data.get('atomic', True)
+    character_id = user.active_character_id
+    
+    def apply_batch(cursor):
+        results = []
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            # Un point de sauvegarde par opération pour pouvoir l'annuler seule
+            cursor.execute('SAVEPOINT batch_operation')
+            try:
+                result = InventoryService.apply(cursor, character_id, operation)
+            except InventoryError as e:
+                cursor.execute('ROLLBACK TO SAVEPOINT batch_operation')
+                cursor.execute('RELEASE SAVEPOINT batch_operation')
+                results.append({"index": index, "op": op, "status": e.status, "error": e.message})
+                if atomic:
+                    raise BatchAborted(results)
+                continue
+            cursor.execute('RELEASE SAVEPOINT batch_operation')
+            results.append(dict({"index": index, "op": op, "status": 200}, **result))
+        return results
+    
+    try:
+        results = run_write_transaction(apply_batch)
+    except BatchAborted as e:
+        return jsonify({
+            "error": f"Lot annulé : l'opération {e.results[-1]['index']} a échoué",
+            "results": e.results
+        }), e.results[-1]['status']
     
     return jsonify({
-        "message": f"Objet consommé ! {effect_message}",
-        "item_consumed": item_consumed,
-        "remaining_quantity": new_quantity if 'new_quantity' in locals() else 0,
-        "character": {
-            "id": character['id'],
-            "name": character['name'],
-            "health": character['health'],
-            "attack": character['attack'],
-            "defense": character['defense'],
-            "level": character['level'],
-            "experience": character['experience']
-        }
+        "message": "Lot appliqué avec succès",
+        "applied": sum(1 for result in results if result["status"] == 200),
+        "failed": sum(1 for result in results if result["status"] != 200),
+        "results": results,
+        "character": character_stats(character_id)
     }), 200
 
 @inventory_bp.route('/types/', methods=['GET'])
 @jwt_required()
 def get_item_types():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM item_types')
-    types = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    snapshot = catalog.snapshot()
     
-    types_list = []
-    for type_info in types:
-        types_list.append({
-            "id": type_info['id'],
-            "name": type_info['type_name']
-        })
+    # Catalogue en mémoire : l'ETag est calculé au chargement
+    cached = not_modified(snapshot.item_types_etag)
+    if cached:
+        return cached
     
-    return jsonify({"item_types": types_list}), 200
\ No newline at end of file
+    return with_etag(jsonify({"item_types": snapshot.item_types}), snapshot.item_types_etag), 200